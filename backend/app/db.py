@@ -0,0 +1,84 @@
+import os
+import queue
+import sqlite3
+from contextlib import contextmanager
+
+# Directory for local SQLite stores (caches, queues, application data)
+DATA_DIR = os.getenv("LETTERBUDDY_DATA_DIR", "data")
+# Worker processes serving the app (see start.py); state that must agree
+# across them defaults to the SQLite stores in DATA_DIR when there are several
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+
+
+def data_path(filename: str) -> str:
+    """Resolve a file name inside the data directory"""
+    return os.path.join(DATA_DIR, filename)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """
+    Open a SQLite connection tuned for a small web service:
+    WAL journaling so readers never block the writer, and a busy
+    timeout so concurrent writers wait instead of failing.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=5000")
+    return conn
+
+
+def split_statements(script: str):
+    """Split a SQL script into statements (trigger bodies included) for use inside a transaction"""
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement.strip()
+            statement = ""
+
+
+class ConnectionPool:
+    """
+    Fixed set of connections to one SQLite file. Under WAL, reads on
+    different connections run in parallel; writers take BEGIN IMMEDIATE
+    and queue on the busy timeout. Each connection keeps its own cache of
+    prepared statements, so repeated queries are compiled once.
+    """
+
+    def __init__(self, path: str, size: int = 4):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put(connect(path))
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection, waiting for one to be returned if all are in use"""
+        conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection inside a write transaction, committed on success"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        for _ in range(self.size):
+            self._idle.get().close()
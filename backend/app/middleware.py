@@ -0,0 +1,184 @@
+import time
+from typing import Dict, Optional
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from app.services import http_cache, metrics
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Reject request bodies over a size limit with 413 as they stream in,
+    before the multipart parser spools them to disk. A declared
+    Content-Length over the limit is rejected without reading the body.
+    Limits can be raised for specific path prefixes (e.g. batch uploads).
+    """
+
+    def __init__(self, app, max_bytes: int, path_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+
+    def limit_for(self, path: str) -> int:
+        for prefix, limit in self.path_limits.items():
+            if path.startswith(prefix):
+                return limit
+        return self.max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.limit_for(scope["path"])
+        detail = f"Request body is too large (max {limit // (1024 * 1024)} MB)"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI re-raises HTTPExceptions from body parsing unchanged
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        async def tracked_send(message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except HTTPException as e:
+            if e.status_code != 413 or response_started:
+                raise
+            await JSONResponse({"detail": e.detail}, status_code=413)(scope, receive, send)
+
+
+class MetricsMiddleware:
+    """
+    Record the latency and status of every HTTP request, labelled by the
+    matched route template so /letters/1 and /letters/2 share a series.
+    Latency runs until the response body has been sent, so streamed
+    responses count their full duration. Unmatched paths share one label.
+    """
+
+    def __init__(self, app, skip_paths=("/metrics",)):
+        self.app = app
+        self.skip_paths = set(skip_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not metrics.METRICS_ENABLED or scope["path"] in self.skip_paths:
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+
+        async def tracked_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, tracked_send)
+        except Exception as e:
+            metrics.record_error("http", e)
+            raise
+        finally:
+            route = metrics.route_label(scope) or "unmatched"
+            method = scope["method"]
+            metrics.http_request_seconds.observe(time.perf_counter() - start, method, route)
+            metrics.http_requests.inc(method, route, str(status))
+
+
+class CompressionMiddleware:
+    """
+    Compress response bodies with brotli (when installed) or gzip, as the
+    client's Accept-Encoding allows. Only bodies sent in one piece and at
+    least min_bytes long are compressed. Streamed responses (Server-Sent
+    Events, NDJSON) pass through untouched so each event still goes out as
+    soon as it is ready.
+    """
+
+    def __init__(
+        self,
+        app,
+        min_bytes: int = http_cache.COMPRESSION_MIN_BYTES,
+        skip_types=("text/event-stream", "application/x-ndjson"),
+    ):
+        self.app = app
+        self.min_bytes = min_bytes
+        self.skip_types = tuple(skip_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not http_cache.COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = http_cache.negotiate_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                passthrough = (
+                    message["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or headers.get("content-type", "").startswith(self.skip_types)
+                )
+                if passthrough:
+                    if message["status"] == 304:
+                        # Same Vary and ETag as the compressed 200 it stands for
+                        not_modified = MutableHeaders(raw=message["headers"])
+                        not_modified.add_vary_header("Accept-Encoding")
+                        if "etag" in not_modified:
+                            not_modified["ETag"] = http_cache.encoded_etag(not_modified["etag"], encoding)
+                    await send(message)
+                else:
+                    # Held back until the body shows whether it is worth compressing
+                    start = message
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            passthrough = True
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start["headers"])
+            headers.add_vary_header("Accept-Encoding")
+            if message.get("more_body", False) or len(body) < self.min_bytes:
+                await send(start)
+                await send(message)
+                return
+
+            if len(body) >= http_cache.COMPRESSION_THREADPOOL_BYTES:
+                compressed = await run_in_threadpool(http_cache.compress, body, encoding)
+            else:
+                compressed = http_cache.compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            if "etag" in headers:
+                headers["ETag"] = http_cache.encoded_etag(headers["etag"], encoding)
+            metrics.compressed_bytes.inc(encoding, "before", amount=len(body))
+            metrics.compressed_bytes.inc(encoding, "after", amount=len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, compressing_send)
@@ -1,17 +1,54 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import binascii
+import io
+import logging
 import openai
+import json
 import os
-import base64
-from PIL import Image
-import io
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
+import time
+import zipfile
+from fastapi.concurrency import run_in_threadpool
+from app.services import metrics
+from app.services.analysis_history import GROUP_BY, HISTORY_MAX_GROUPS, analysis_history
+from app.services.analysis_cache import analysis_cache
+from app.services.analysis_stream import AnalysisStreamParser
+from app.services.completion_parser import AnalysisCompletion, parse_analysis, parse_practice
+from app.services.image_preprocessing import preprocess_image, ImagePreprocessingError, PreprocessedImage
+from app.services.http_cache import REVALIDATE, STATIC_CACHE_CONTROL, content_etag, etag_matches, not_modified, version_etag
+from app.services.image_quality import ImageQualityError
+from app.services.segmentation import HandwritingMetrics, load_grayscale, measure_batch, measure_each, measure_image
+from app.services.uploads import (
+    IMAGE_TYPES,
+    SNIFF_BYTES,
+    UPLOAD_MAX_BYTES,
+    ZIP_TYPE,
+    UnsupportedUploadError,
+    UploadTooLargeError,
+    encode_data_url,
+    read_upload,
+    sniff_type,
+    upload_slots,
+)
+from app.services.job_queue import job_queue, QueueFullError, TERMINAL_STATUSES
+from app.services.model_router import ModelChoice, model_router
+from app.services.practice_corpus import PRACTICE_MAX_SENTENCES, practice_corpus
+from app.services.progress import SECONDS_PER_DAY, progress_store
+from app.services.prompts import ANALYSIS_PROMPT, PRACTICE_PROMPT, PromptBudgetExceeded, estimate_image_tokens, prompt_registry
+from app.services.rate_limiter import RateLimitExceeded, retry_after_header, upstream_limiter
+from app.services.resilience import BREAKER_COOLDOWN, RETRYABLE_ERRORS, CircuitOpenError, upstream_resilience
+from app.services.single_flight import Broadcast, analysis_flights, practice_flights
+from app.services.openai_client import (
+    get_openai_client,
+    ANALYZE_TIMEOUT,
+    PRACTICE_SENTENCES_TIMEOUT,
+)
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Pydantic models for request/response
 class HandwritingAnalysisRequest(BaseModel):
@@ -25,6 +62,19 @@ class HandwritingAnalysisResponse(BaseModel):
     confidence_score: float
     analysis: str
     letters_to_improve: List[str]  # New field for letters that need improvement
+    source: str = "model"  # "local" when measured from the image because the vision model was unavailable
+
+class HandwritingMeasurements(BaseModel):
+    line_count: int
+    glyph_count: int
+    letter_height: float
+    height_variation: Optional[float] = None
+    slant_degrees: float
+    slant_variation: Optional[float] = None
+    baseline_deviation: float
+    letter_spacing: Optional[float] = None
+    spacing_variation: Optional[float] = None
+    word_spacing: Optional[float] = None
 
 class HandwritingFeedback(BaseModel):
     letter_formation: str
@@ -32,11 +82,23 @@ class HandwritingFeedback(BaseModel):
     consistency: str
     overall_score: int
     improvement_tips: List[str]
+    measurements: Optional[HandwritingMeasurements] = None  # Set when measured from the image
+
+class FeedbackRequest(HandwritingAnalysisResponse):
+    image_data: str  # Base64 encoded image (or data URL) the analysis was made from
+
+class FeedbackBatchItem(BaseModel):
+    index: int  # Position of the image in the upload
+    filename: Optional[str] = None
+    status: str  # "ok" or "error"
+    feedback: Optional[HandwritingFeedback] = None
+    error: Optional[str] = None
 
 class PracticeSentenceRequest(BaseModel):
     target_letter: str
     difficulty: str = "beginner"  # beginner, intermediate, advanced
-    sentence_count: int = 5
+    sentence_count: int = Field(5, ge=1, le=PRACTICE_MAX_SENTENCES)
+    user_id: int = 1  # Demo user ID
 
 class PracticeSentenceResponse(BaseModel):
     target_letter: str
@@ -45,293 +107,1105 @@ class PracticeSentenceResponse(BaseModel):
     difficulty: str
     practice_tips: List[str]
 
+class LetterProgress(BaseModel):
+    letter: str
+    improve_count: int  # Analyses that flagged this letter
+    recent_rate: float  # Rolling share of recent analyses that flagged it
+    last_flagged_at: float
+
+class HandwritingProgressResponse(BaseModel):
+    user_id: int
+    analysis_count: int
+    average_quality: Optional[float] = None  # Quality labels scored 0 (poor) to 1 (excellent)
+    recent_quality: Optional[float] = None
+    average_confidence: Optional[float] = None
+    recent_confidence: Optional[float] = None
+    current_streak: int  # Consecutive days with at least one analysis
+    longest_streak: int
+    first_analyzed_at: Optional[float] = None
+    last_analyzed_at: Optional[float] = None
+    letters_to_improve: List[str]
+    letters: List[LetterProgress]
+
+class HistoryGroup(BaseModel):
+    key: Optional[int] = None  # Day start (Unix seconds) or user ID of the group
+    analysis_count: int
+    average_confidence: Optional[float] = None
+    average_quality: Optional[float] = None  # Quality labels scored 0 (poor) to 1 (excellent)
+    quality_counts: Dict[str, int]
+    letter_counts: Dict[str, int]  # Analyses that flagged each letter for improvement
+
+class HistoryRollingPoint(BaseModel):
+    day: int  # Day start, Unix seconds
+    analysis_count: int  # Analyses in the window ending on this day
+    average_confidence: Optional[float] = None
+    average_quality: Optional[float] = None
+
+class HistoryStatsResponse(HistoryGroup):
+    groups: List[HistoryGroup]
+    rolling: List[HistoryRollingPoint]
+
+class AnalysisJobResponse(BaseModel):
+    job_id: str
+    status: str
+    created_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Optional[HandwritingAnalysisResponse] = None
+    error: Optional[str] = None
+
+DEFAULT_SUGGESTIONS = [
+    "Practice letter formation",
+    "Work on consistent spacing",
+    "Focus on readability"
+]
+
+# Batch analysis limits
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "60"))
+BATCH_MAX_FILE_BYTES = int(os.getenv("BATCH_MAX_FILE_BYTES", str(20 * 1024 * 1024)))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+# Whole batch request body, zip archives included
+BATCH_MAX_REQUEST_BYTES = int(os.getenv("BATCH_MAX_REQUEST_BYTES", str(BATCH_MAX_FILES * BATCH_MAX_FILE_BYTES)))
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".bmp", ".tif", ".tiff", ".heic")
+
+async def prepare_image(image_data: bytes) -> PreprocessedImage:
+    """
+    Downscale, crop and re-encode an upload before sending it upstream.
+    CPU-bound, so it runs in the threadpool to keep the event loop free.
+    Unusable photos (blank, blurry, too dark, wrong size) are rejected with
+    a 422 before any vision call is made.
+    """
+    try:
+        with metrics.stage("preprocess"):
+            processed = await run_in_threadpool(preprocess_image, image_data)
+    except ImageQualityError as e:
+        metrics.record_error("preprocess", e)
+        raise HTTPException(status_code=422, detail=str(e))
+    except ImagePreprocessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metrics.payload_bytes.observe(processed.processed_bytes, "processed")
+    return processed
+
+async def read_image_upload(image: UploadFile, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    """
+    Read an image upload, checking its size and sniffing its real format
+    """
+    try:
+        with metrics.stage("upload_read"):
+            data, _ = await read_upload(image, max_bytes)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except UnsupportedUploadError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    metrics.payload_bytes.observe(len(data), "upload")
+    return data
+
+async def ingest_image(image: UploadFile) -> PreprocessedImage:
+    """
+    Read and preprocess an upload. Only UPLOAD_CONCURRENCY raw uploads are
+    held and decoded at once, and only the small preprocessed image is kept
+    while waiting on the vision model.
+    """
+    async with upload_slots:
+        image_data = await read_image_upload(image)
+        return await prepare_image(image_data)
+
+def build_analysis_messages(processed: PreprocessedImage, detail: str = "high"):
+    """
+    Build the chat messages for a vision analysis of a preprocessed image,
+    sent at the given image detail ("low": one 512px tile, "high": tiled)
+    """
+    with metrics.stage("base64"):
+        data_url = encode_data_url(processed.data, processed.mime_type)
+    metrics.payload_bytes.observe(len(data_url), "data_url")
+
+    # The system message and text come first and are the same for every image
+    return ANALYSIS_PROMPT.messages(
+        ANALYSIS_PROMPT.render(),
+        images=[{"type": "image_url", "image_url": {"url": data_url, "detail": detail}}],
+    )
+
+def analysis_token_estimate(processed: PreprocessedImage, choice: ModelChoice) -> Tuple[int, int]:
+    """
+    (prompt tokens, prompt tokens + completion budget) of an analysis call,
+    counted locally. Raises PromptBudgetExceeded over ANALYSIS_TOKEN_BUDGET.
+    """
+    image_tokens = estimate_image_tokens(processed.width, processed.height, choice.detail or "high")
+    prompt_tokens = ANALYSIS_PROMPT.estimate(ANALYSIS_PROMPT.render(), image_tokens)
+    return prompt_tokens, ANALYSIS_PROMPT.check_budget(prompt_tokens, choice.max_tokens)
+
+def over_budget(e: PromptBudgetExceeded) -> HTTPException:
+    return HTTPException(status_code=400, detail=str(e))
 
-try:
-    openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-except:
-    openai_client = None
+def rate_limited(e: RateLimitExceeded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": retry_after_header(e.retry_after)})
+
+def analysis_response(completion: AnalysisCompletion, analysis_text: str) -> HandwritingAnalysisResponse:
+    """
+    Build the API response from a parsed completion, filling in defaults for missing sections
+    """
+    return HandwritingAnalysisResponse(
+        detected_letters=completion.detected_letters or [],
+        handwriting_quality=completion.handwriting_quality or "Good",
+        # If no suggestions were parsed, use fallback
+        suggestions=(completion.suggestions or DEFAULT_SUGGESTIONS)[:5],  # Limit to 5 suggestions
+        confidence_score=completion.confidence_score if completion.confidence_score is not None else 0.85,
+        # Structured (JSON) completions carry the prose in their own field
+        analysis=(completion.analysis or analysis_text) if completion.structured else analysis_text,
+        letters_to_improve=completion.letters_to_improve or []
+    )
+
+def parse_analysis_completion(analysis_text: str) -> HandwritingAnalysisResponse:
+    """
+    Parse the structured vision model output into an analysis response
+    """
+    return analysis_response(parse_analysis(analysis_text), analysis_text)
+
+def analysis_key(processed: PreprocessedImage) -> str:
+    """Cache key of an image's analysis; also identifies the photo in a user's progress"""
+    return analysis_cache.make_key(processed.data, ANALYSIS_PROMPT.key)
+
+async def analyze_preprocessed_image(
+    processed: PreprocessedImage, user_id: Optional[int] = None, cache_key: Optional[str] = None
+) -> HandwritingAnalysisResponse:
+    """
+    Run the vision analysis for a preprocessed image, using the result cache.
+    On a miss the user's own budgets are checked before joining or starting
+    the shared call (user_id None: global budgets only).
+    """
+    if not get_openai_client():
+        raise HTTPException(
+            status_code=500, 
+            detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
+        )
+    
+    # Identical photos (after preprocessing) reuse the stored analysis
+    cache_key = cache_key or analysis_key(processed)
+    cached_result = await analysis_cache.get(cache_key)
+    if cached_result is None:
+        try:
+            _, tokens = analysis_token_estimate(processed, model_router.analysis(processed))
+            user_charges = await upstream_limiter.admit_user("analyze", user_id, tokens)
+            try:
+                # ...and share one upstream call while it is still in flight (double submits, a class uploading the same sheet)
+                cached_result = await analysis_flights.do(cache_key, lambda: run_vision_analysis(processed, cache_key))
+            except RateLimitExceeded:
+                await upstream_limiter.refund(user_charges)
+                raise
+        except RateLimitExceeded as e:
+            metrics.errors.inc("analyze", f"RateLimitExceeded:{e.reason}")
+            raise rate_limited(e)
+        except PromptBudgetExceeded as e:
+            metrics.record_error("analyze", e)
+            raise over_budget(e)
+    return HandwritingAnalysisResponse(**cached_result)
+
+async def run_vision_analysis(processed: PreprocessedImage, cache_key: str) -> dict:
+    """
+    Vision model analysis of an image that missed the cache, on the model
+    picked by the router; a small-model answer that is not confident enough
+    is redone once on the large model.
+    Shared by every coalesced caller, so it runs against the global budgets
+    only (each caller's own were taken by admit_user) and returns the result
+    as a dict for every caller to build its own response. RateLimitExceeded
+    is left for each caller to turn into its 429.
+    """
+    choice = model_router.analysis(processed)
+    try:
+        completion, analysis_text = await call_vision_model(processed, choice)
+        escalation = model_router.escalate_analysis(choice, completion.confidence_score, completion.detected_letters)
+        if escalation is not None:
+            model_router.record_escalation("analyze", choice)
+            completion, analysis_text = await call_vision_model(processed, escalation)
+    except PromptBudgetExceeded as e:
+        metrics.record_error("analyze", e)
+        raise over_budget(e)
+    except (CircuitOpenError, *RETRYABLE_ERRORS) as e:
+        metrics.record_error("analyze", e)
+        return (await local_analysis(processed, e)).model_dump()
+
+    result = analysis_response(completion, analysis_text).model_dump()
+    await analysis_cache.set(cache_key, result)
+    return result
+
+async def call_vision_model(processed: PreprocessedImage, choice: ModelChoice):
+    """
+    One vision model call (with retries and hedging) made as choice says,
+    against the global budgets. Returns the parsed completion and its raw text.
+    """
+    prompt_tokens, tokens = analysis_token_estimate(processed, choice)
+    messages = build_analysis_messages(processed, choice.detail)
+    
+    async def call_upstream():
+        # Every attempt (retry or hedge) takes its own limiter slot
+        admission_started = time.perf_counter()
+        async with upstream_limiter.limit("analyze", None, tokens) as lease:
+            metrics.stage_seconds.observe(time.perf_counter() - admission_started, "upstream_admission")
+            response = await get_openai_client().chat.completions.create(
+                model=choice.model,
+                messages=messages,
+                max_tokens=choice.max_tokens,
+                temperature=0.3,
+                timeout=ANALYZE_TIMEOUT
+            )
+            await lease.settle(response.usage)
+            metrics.record_usage("analyze", response.usage)
+            ANALYSIS_PROMPT.record(prompt_tokens, response.usage)
+            return response
+    
+    # Call OpenAI Vision API
+    started = time.perf_counter()
+    with metrics.stage("upstream"):
+        response = await upstream_resilience.call("analyze", call_upstream, deadline=ANALYZE_TIMEOUT)
+    model_router.record("analyze", choice, time.perf_counter() - started, response.usage)
+
+    # Parse the response
+    analysis_text = response.choices[0].message.content
+    with metrics.stage("parse"):
+        completion = parse_analysis(analysis_text)
+    return completion, analysis_text
+
+async def local_analysis(processed: PreprocessedImage, error: Exception) -> HandwritingAnalysisResponse:
+    """
+    Fallback when the vision model is unreachable or its breaker is open:
+    feedback measured from the image by local segmentation. It detects no
+    letters, so it is neither cached nor counted towards progress.
+    """
+    upstream_resilience.record_fallback("analyze")
+    retry_after = error.retry_after if isinstance(error, CircuitOpenError) else BREAKER_COOLDOWN
+    try:
+        with metrics.stage("local_measure"):
+            measured = await run_in_threadpool(measure_image, processed.data)
+    except (ImageQualityError, ImagePreprocessingError):
+        raise HTTPException(
+            status_code=503,
+            detail="The handwriting analysis service is temporarily unavailable, please retry shortly",
+            headers={"Retry-After": retry_after_header(retry_after)},
+        )
+    
+    feedback = measured_feedback(measured)
+    quality = score_label(feedback.overall_score / 10)
+    return HandwritingAnalysisResponse(
+        detected_letters=[],
+        # Same labels as the vision prompt
+        handwriting_quality="Needs Improvement" if quality == "Needs Practice" else quality,
+        suggestions=feedback.improvement_tips[:5],
+        confidence_score=0.0,
+        analysis=(
+            "The handwriting analysis service is unavailable right now, so this feedback was measured "
+            f"from your photo instead. Letter formation: {feedback.letter_formation}. "
+            f"Spacing: {feedback.spacing}. Consistency: {feedback.consistency}."
+        ),
+        letters_to_improve=[],
+        source="local",
+    )
+
+async def record_progress(user_id: int, result: HandwritingAnalysisResponse, cache_key: str):
+    """
+    Fold an analysis into the user's progress. The same photo (cache_key)
+    counts once per user, whether its result came from the model, the cache
+    or a coalesced call, so re-uploads and double submits do not inflate it.
+    A failed write is logged rather than raised so the user still gets their analysis.
+    """
+    if result.source != "model":
+        return
+    try:
+        await run_in_threadpool(progress_store.record, user_id, result.model_dump(), analysis_key=cache_key)
+    except Exception as e:
+        metrics.record_error("progress", e)
+        logger.exception("Could not record handwriting progress for user %s", user_id)
 
 @router.post("/analyze", response_model=HandwritingAnalysisResponse)
-async def analyze_handwriting(image: UploadFile = File(...)):
+async def analyze_handwriting(image: UploadFile = File(...), user_id: int = Form(1)):
     """
     Analyze handwritten text in an uploaded image using OpenAI Vision API
     """
-    if not openai_client:
+    if not get_openai_client():
         raise HTTPException(
             status_code=500, 
             detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
         )
     
     try:
-        # Validate image file
-        if not image.content_type.startswith("image/"):
-            raise HTTPException(status_code=400, detail="File must be an image")
-        
-        # Read and process image
-        image_data = await image.read()
-        
-        # Convert to base64 for OpenAI API
-        image_base64 = base64.b64encode(image_data).decode('utf-8')
-        
-        # Prepare the prompt for handwriting analysis
-        system_prompt = """
-        You are a handwriting analysis expert. Analyze the handwritten text in the image and provide a structured response in the following format:
-
-        DETECTED_LETTERS: [List all letters found in the image, separated by commas]
-        QUALITY: [Excellent/Good/Fair/Needs Improvement]
-        CONFIDENCE: [0.0-1.0 score]
-        SUGGESTIONS: [List 3-5 specific improvement suggestions]
-        LETTERS_TO_IMPROVE: [List specific letters that need improvement, separated by commas]
-        ANALYSIS: [Detailed analysis of handwriting quality, spacing, consistency, and readability]
-
-        Focus on:
-        - Letter formation and clarity
-        - Spacing between letters and words
-        - Consistency of handwriting style
-        - Readability and neatness
-        
-        For LETTERS_TO_IMPROVE, identify specific letters that:
-        - Have poor formation or are hard to read
-        - Are inconsistent in size or style
-        - Have spacing or alignment issues
-        - Could benefit from practice
+        # Read, validate and process image
+        processed = await ingest_image(image)
         
-        Provide constructive, encouraging feedback suitable for learning.
-        """
+        cache_key = analysis_key(processed)
+        result = await analyze_preprocessed_image(processed, user_id, cache_key)
+        await record_progress(user_id, result, cache_key)
+        return result
         
-        # Call OpenAI Vision API
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": "Please analyze this handwritten text and provide detailed feedback on the handwriting quality, detected letters, and suggestions for improvement."
-                        },
-                        {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": f"data:image/jpeg;base64,{image_base64}"
-                            }
-                        }
-                    ]
-                }
-            ],
-            max_tokens=1000,
-            temperature=0.3
+    except HTTPException:
+        raise
+    except Exception as e:
+        metrics.record_error("analyze", e)
+        raise HTTPException(status_code=500, detail=f"Error analyzing handwriting: {str(e)}")
+
+# Streamed section -> HandwritingAnalysisResponse field
+STREAM_SECTION_FIELDS = {
+    "DETECTED_LETTERS": "detected_letters",
+    "QUALITY": "handwriting_quality",
+    "CONFIDENCE": "confidence_score",
+    "SUGGESTIONS": "suggestions",
+    "LETTERS_TO_IMPROVE": "letters_to_improve",
+}
+
+def section_event(section: str, parser: AnalysisStreamParser) -> str:
+    """SSE message for one completed section, with the same defaults as the full response"""
+    if section == "ANALYSIS":
+        return sse_event("analysis", {"value": parser.completion.analysis})
+    field = STREAM_SECTION_FIELDS[section]
+    value = getattr(analysis_response(parser.completion, parser.text), field)
+    return sse_event(field, {"value": value})
+
+@router.post("/analyze/stream")
+async def analyze_handwriting_stream(image: UploadFile = File(...), user_id: int = Form(1)):
+    """
+    Analyze handwriting and stream each result field as a Server-Sent Event
+    as soon as the model has produced it, followed by the full result.
+    """
+    if not get_openai_client():
+        raise HTTPException(
+            status_code=500, 
+            detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
         )
+    
+    try:
+        processed = await ingest_image(image)
         
-        # Parse the response
-        analysis_text = response.choices[0].message.content
-        
-        # Parse the structured response
-        detected_letters = []
-        handwriting_quality = "Good"
-        suggestions = []
-        confidence_score = 0.85
-        letters_to_improve = []
-        
-        # Extract detected letters
-        if "DETECTED_LETTERS:" in analysis_text:
-            letters_section = analysis_text.split("DETECTED_LETTERS:")[1].split("\n")[0]
-            # Extract letters from the section
-            for char in letters_section:
-                if char.isalpha():
-                    detected_letters.append(char.upper())
-            detected_letters = sorted(list(set(detected_letters)))
-        
-        # Extract quality assessment
-        if "QUALITY:" in analysis_text:
-            quality_section = analysis_text.split("QUALITY:")[1].split("\n")[0].strip()
-            if quality_section in ["Excellent", "Good", "Fair", "Needs Improvement"]:
-                handwriting_quality = quality_section
-        
-        # Extract confidence score
-        if "CONFIDENCE:" in analysis_text:
+        cache_key = analysis_key(processed)
+        cached_result = await analysis_cache.get(cache_key)
+        broadcast = None
+        if cached_result is None:
+            # Fields already streamed cannot be taken back, so there is no escalation: use the large model
+            choice = model_router.analysis(processed, allow_small=False)
+            _, tokens = analysis_token_estimate(processed, choice)
+            user_charges = await upstream_limiter.admit_user("analyze", user_id, tokens)
             try:
-                confidence_section = analysis_text.split("CONFIDENCE:")[1].split("\n")[0].strip()
-                confidence_score = float(confidence_section)
-            except ValueError:
-                confidence_score = 0.85
+                # Follow a stream of the same image already running (double submits)...
+                broadcast = analysis_flights.follow(cache_key)
+                if broadcast is None:
+                    # ...or a plain analysis of it, which finishes sooner than a new stream
+                    cached_result = await analysis_flights.join(cache_key)
+                if broadcast is None and cached_result is None:
+                    broadcast = Broadcast()
+                    analysis_flights.start(
+                        cache_key, lambda: stream_vision_analysis(processed, choice, cache_key, broadcast), broadcast
+                    )
+                if broadcast is not None:
+                    # Respond once the upstream stream is open, so failing to open it surfaces as an HTTP error
+                    await asyncio.shield(broadcast.ready)
+            except RateLimitExceeded:
+                await upstream_limiter.refund(user_charges)
+                raise
+    except RateLimitExceeded as e:
+        metrics.errors.inc("analyze_stream", f"RateLimitExceeded:{e.reason}")
+        raise rate_limited(e)
+    except PromptBudgetExceeded as e:
+        metrics.record_error("analyze", e)
+        raise over_budget(e)
+    except HTTPException:
+        raise
+    except Exception as e:
+        metrics.record_error("analyze", e)
+        raise HTTPException(status_code=500, detail=f"Error analyzing handwriting: {str(e)}")
+    
+    async def events():
+        if broadcast is None:
+            for message in result_events(cached_result):
+                yield message
+            result = cached_result
+        else:
+            async for message in broadcast.subscribe():
+                yield message
+            result = broadcast.result
+        if result is not None:
+            await record_progress(user_id, HandwritingAnalysisResponse(**result), cache_key)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def result_events(result: dict) -> List[str]:
+    """SSE messages replaying a finished result: each field, then the full result"""
+    messages = [sse_event(field, {"value": result[field]}) for field in STREAM_SECTION_FIELDS.values()]
+    messages.append(sse_event("analysis", {"value": result["analysis"]}))
+    messages.append(sse_event("result", result))
+    return messages
+
+async def stream_vision_analysis(processed: PreprocessedImage, choice: ModelChoice, cache_key: str, broadcast: Broadcast) -> dict:
+    """
+    Streamed vision analysis shared by every caller following broadcast.
+    Publishes each field as an SSE message as soon as the model has produced
+    it, then the full result, which is also returned for plain analyses that
+    join it. Like run_vision_analysis it runs against the global budgets only.
+    """
+    prompt_tokens, tokens = analysis_token_estimate(processed, choice)
+    messages = build_analysis_messages(processed, choice.detail)
+    
+    async def open_stream():
+        # The lease is held until the stream has been read to the end
+        lease = await upstream_limiter.acquire("analyze", None, tokens)
+        try:
+            upstream = await get_openai_client().chat.completions.create(
+                model=choice.model,
+                messages=messages,
+                max_tokens=choice.max_tokens,
+                temperature=0.3,
+                timeout=ANALYZE_TIMEOUT,
+                stream=True,
+                # The last chunk carries the usage, for settling the lease
+                stream_options={"include_usage": True}
+            )
+        except BaseException as e:
+            lease.release()
+            if isinstance(e, openai.RateLimitError):
+                raise await upstream_limiter.upstream_limited(e)
+            raise
+        return lease, upstream
+    
+    # Only opening is retried: a stream that fails halfway cannot be replayed
+    stream_started = time.perf_counter()
+    try:
+        try:
+            lease, upstream = await upstream_resilience.call(
+                "analyze", open_stream, hedge=False, deadline=ANALYZE_TIMEOUT
+            )
+        except (CircuitOpenError, *RETRYABLE_ERRORS) as e:
+            metrics.record_error("analyze_stream", e)
+            result = (await local_analysis(processed, e)).model_dump()
+            broadcast.open()
+            for message in result_events(result):
+                broadcast.publish(message)
+            broadcast.close(result)
+            return result
+    except BaseException as e:
+        broadcast.fail(e)
+        raise
+    broadcast.open()
+    
+    parser = AnalysisStreamParser()
+    usage = None
+    try:
+        async for chunk in upstream:
+            if getattr(chunk, "usage", None) is not None:
+                usage = chunk.usage
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for section in parser.feed(chunk.choices[0].delta.content):
+                broadcast.publish(section_event(section, parser))
+        for section in parser.finish():
+            broadcast.publish(section_event(section, parser))
         
-        # Extract suggestions
-        if "SUGGESTIONS:" in analysis_text:
-            suggestions_section = analysis_text.split("SUGGESTIONS:")[1].split("LETTERS_TO_IMPROVE:")[0] if "LETTERS_TO_IMPROVE:" in analysis_text else analysis_text.split("SUGGESTIONS:")[1]
-            # Parse suggestions (assuming they're separated by newlines or commas)
-            suggestions_text = suggestions_section.strip()
-            if suggestions_text:
-                # Split by newlines and clean up
-                raw_suggestions = [s.strip() for s in suggestions_text.split('\n') if s.strip()]
-                # Clean up suggestions and remove numbering/bullets
-                for suggestion in raw_suggestions:
-                    # Remove common prefixes like "- ", "* ", "1. ", etc.
-                    clean_suggestion = suggestion.lstrip('- *0123456789. ')
-                    if clean_suggestion and len(clean_suggestion) > 10:  # Only add meaningful suggestions
-                        suggestions.append(clean_suggestion)
+        # Full parse at the end also covers JSON completions, which have no sections to stream
+        result = parse_analysis_completion(parser.text).model_dump()
+        await lease.settle(usage)
+        metrics.record_usage("analyze", usage)
+        ANALYSIS_PROMPT.record(prompt_tokens, usage)
+        model_router.record("analyze", choice, time.perf_counter() - stream_started, usage)
+        await analysis_cache.set(cache_key, result)
+        broadcast.publish(sse_event("result", result))
+        broadcast.close(result)
+        return result
+    except Exception as e:
+        metrics.record_error("analyze_stream", e)
+        broadcast.publish(sse_event("error", {"detail": f"Error analyzing handwriting: {str(e)}"}))
+        raise
+    finally:
+        # Followers must not wait forever, whatever stopped the stream
+        broadcast.close()
+        # Free the slot first: closing can be cancelled or fail
+        lease.release()
+        await upstream.close()
+
+def expand_batch_upload(filename: str, content_type: str, data: bytes):
+    """
+    Turn one uploaded file into (filename, bytes, error) items.
+    Zip archives are expanded into their image members.
+    content_type is the sniffed type, not the one the client declared.
+    """
+    if content_type != ZIP_TYPE:
+        if len(data) > BATCH_MAX_FILE_BYTES:
+            return [(filename, None, "File is too large")]
+        return [(filename, data, None)]
+
+    items = []
+    try:
+        with zipfile.ZipFile(io.BytesIO(data)) as archive:
+            for member in archive.infolist():
+                name = member.filename
+                if member.is_dir() or not name.lower().endswith(IMAGE_EXTENSIONS) or "__MACOSX" in name:
+                    continue
+                # Check the declared size before inflating to avoid zip bombs
+                if member.file_size > BATCH_MAX_FILE_BYTES:
+                    items.append((name, None, "File is too large"))
+                    continue
+                data = archive.read(member)
+                if sniff_type(data[:SNIFF_BYTES]) not in IMAGE_TYPES:
+                    items.append((name, None, "File must be a JPEG, PNG, WebP, GIF, BMP or TIFF image"))
+                    continue
+                items.append((name, data, None))
+    except zipfile.BadZipFile:
+        return [(filename, None, "Invalid zip archive")]
+    return items
+
+@router.post("/analyze/batch")
+async def analyze_handwriting_batch(images: List[UploadFile] = File(...), user_id: int = Form(1)):
+    """
+    Analyze many handwriting images (or zip archives of images) in one request.
+    Results are streamed back as NDJSON, one line per image as soon as it finishes.
+    """
+    if not get_openai_client():
+        raise HTTPException(
+            status_code=500, 
+            detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
+        )
+    
+    # Read everything up front: uploads are closed once the endpoint returns
+    items = []
+    for upload in images:
+        try:
+            data, content_type = await read_upload(
+                upload, BATCH_MAX_REQUEST_BYTES, accept=IMAGE_TYPES + (ZIP_TYPE,)
+            )
+        except (UploadTooLargeError, UnsupportedUploadError) as e:
+            items.append((upload.filename, None, str(e)))
+            continue
+        items.extend(await run_in_threadpool(expand_batch_upload, upload.filename, content_type, data))
+    
+    if not items:
+        raise HTTPException(status_code=400, detail="No images found in upload")
+    if len(items) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many images (max {BATCH_MAX_FILES})")
+    
+    # Decoding shares the process-wide upload slots; upstream calls have their own per-batch limit
+    upstream_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def analyze_item(index: int, filename: str, data: Optional[bytes], error: Optional[str]):
+        item = {"index": index, "filename": filename}
+        if error:
+            return {**item, "status": "error", "error": error}
+        try:
+            async with upload_slots:
+                processed = await prepare_image(data)
+            cache_key = analysis_key(processed)
+            async with upstream_slots:
+                result = await analyze_preprocessed_image(processed, user_id, cache_key)
+            await record_progress(user_id, result, cache_key)
+            return {**item, "status": "ok", "result": result.model_dump()}
+        except HTTPException as e:
+            return {**item, "status": "error", "error": e.detail}
+        except Exception as e:
+            metrics.record_error("analyze_batch", e)
+            return {**item, "status": "error", "error": f"Error analyzing handwriting: {str(e)}"}
+    
+    async def stream_results():
+        tasks = [asyncio.create_task(analyze_item(index, *item)) for index, item in enumerate(items)]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield json.dumps(await finished) + "\n"
+        finally:
+            # Stop outstanding work if the client goes away
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+async def run_analysis_job(image_data: bytes) -> dict:
+    """
+    Job queue handler: run the regular analysis pipeline for a queued upload
+    """
+    processed = await prepare_image(image_data)
+    result = await analyze_preprocessed_image(processed)
+    return result.model_dump()
+
+def job_response(job: dict) -> AnalysisJobResponse:
+    return AnalysisJobResponse(
+        job_id=job["id"],
+        status=job["status"],
+        created_at=job["created_at"],
+        started_at=job["started_at"],
+        finished_at=job["finished_at"],
+        result=job["result"],
+        error=job["error"]
+    )
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@router.post("/jobs", response_model=AnalysisJobResponse, status_code=202)
+async def create_analysis_job(image: UploadFile = File(...)):
+    """
+    Queue a handwriting analysis and return immediately with a job id.
+    Poll GET /handwriting/jobs/{job_id} or subscribe to /handwriting/jobs/{job_id}/events.
+    """
+    if not get_openai_client():
+        raise HTTPException(
+            status_code=500, 
+            detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
+        )
+    
+    image_data = await read_image_upload(image)
+    try:
+        job = await run_in_threadpool(job_queue.submit, image_data)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return job_response(job)
+
+@router.get("/jobs/stats")
+async def get_job_stats():
+    """
+    Get queue depth, worker count and recent queue/run latency
+    """
+    return await run_in_threadpool(job_queue.stats)
+
+@router.get("/jobs/{job_id}", response_model=AnalysisJobResponse)
+async def get_analysis_job(job_id: str, request: Request, response: Response):
+    """
+    Get the status (and result, once finished) of an analysis job.
+    Polls that send the ETag back in If-None-Match get a 304 until the job changes.
+    """
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # A job only changes when it is claimed (again) or finishes
+    etag = version_etag("job", job["id"], job["status"], job["attempts"], job["started_at"], job["finished_at"])
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    return job_response(job)
+
+@router.get("/jobs/{job_id}/events")
+async def stream_analysis_job(job_id: str):
+    """
+    Stream job status changes as Server-Sent Events until the job finishes
+    """
+    job = await run_in_threadpool(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def events():
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                yield sse_event("status", job_response(current).model_dump())
+            if current["status"] in TERMINAL_STATUSES:
+                return
+            await job_queue.wait_for_change(job_id, timeout=1.0)
+            current = await run_in_threadpool(job_queue.get, job_id)
+            if current is None:
+                # Deleted while streaming (past its retention window)
+                yield sse_event("error", {"detail": "Job not found or expired"})
+                return
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/progress", response_model=HandwritingProgressResponse)
+async def get_handwriting_progress(user_id: int = 1):
+    """
+    Get a user's handwriting progress: counts, average and recent quality and
+    confidence, streaks, and the letters that most need practice. Aggregates
+    are maintained as analyses are stored, so this does not read the history.
+    """
+    return await run_in_threadpool(progress_store.get, user_id)
+
+@router.get("/history/stats", response_model=HistoryStatsResponse)
+async def get_history_stats(
+    user_id: Optional[int] = None,
+    days: Optional[int] = None,
+    group_by: Optional[str] = None,
+    window_days: int = 7,
+    limit: int = 100,
+):
+    """
+    Statistics over stored analyses for dashboards and teacher views: how
+    often each letter was flagged, the quality distribution and average
+    confidence and quality, for one user or everyone over the last days
+    days. group_by=day or group_by=user splits them per day (newest first)
+    or per user (busiest first); rolling has window_days averages per day.
+    """
+    if group_by is not None and group_by not in GROUP_BY:
+        raise HTTPException(status_code=400, detail=f"group_by must be one of: {', '.join(GROUP_BY)}")
+    if window_days < 1 or not 1 <= limit <= HISTORY_MAX_GROUPS:
+        raise HTTPException(status_code=400, detail=f"window_days must be at least 1 and limit between 1 and {HISTORY_MAX_GROUPS}")
+    since = None if days is None else time.time() - days * SECONDS_PER_DAY
+    
+    def run():
+        analysis_history.sync()
+        return analysis_history.stats(user_id, since, None, group_by, window_days, limit)
+    
+    return await run_in_threadpool(run)
+
+@router.get("/upstream/stats")
+async def get_upstream_stats():
+    """
+    Get limiter counters (in flight, queued, rejections, budgets), per-route
+    retries, hedges, fallbacks, latency percentiles and circuit breaker state,
+    how many calls were saved by coalescing identical concurrent requests,
+    and the calls, escalations, latency and tokens of each model routing choice
+    """
+    return {
+        # Counting the tracked buckets is a SQLite query when they are shared by workers
+        "limiter": await run_in_threadpool(upstream_limiter.stats),
+        "resilience": upstream_resilience.stats(),
+        "coalescing": {"analyze": analysis_flights.stats(), "practice": practice_flights.stats()},
+        "routing": model_router.stats(),
+    }
+
+@router.get("/prompts")
+async def get_prompt_stats():
+    """
+    Get the version and key of each prompt template (analysis cache entries
+    are keyed on the analysis prompt's key), its token budget, and the
+    prompt tokens estimated locally vs reported by OpenAI, with the share
+    served from OpenAI's prompt cache
+    """
+    return prompt_registry.stats()
+
+@metrics.registry.collector
+def upstream_gauges():
+    """Gauges read from the limiter, breakers, cache, coalescing, model router and job queue at scrape time"""
+    limiter = upstream_limiter.stats()
+    yield "letterbuddy_upstream_in_flight", "OpenAI calls in flight", {}, limiter["in_flight"]
+    yield "letterbuddy_upstream_waiting", "OpenAI calls waiting for a slot", {}, limiter["waiting"]
+    for reason, count in limiter["rejected"].items():
+        yield "letterbuddy_upstream_rejected", "Calls rejected by the limiter", {"reason": reason}, count
+    for route, calls in upstream_resilience.stats().items():
+        labels = {"route": route}
+        yield "letterbuddy_upstream_breaker_open", "1 while the route's circuit breaker is open", labels, int(calls["breaker"]["state"] == "open")
+        yield "letterbuddy_upstream_retries", "Upstream retries", labels, calls["retries"]
+        yield "letterbuddy_upstream_fallbacks", "Requests answered by a local fallback", labels, calls["fallbacks"]
+    for route, flights in (("analyze", analysis_flights), ("practice", practice_flights)):
+        yield "letterbuddy_upstream_calls_saved", "Upstream calls saved by coalescing", {"route": route}, flights.stats()["saved"]
+    for decision in model_router.stats()["decisions"]:
+        labels = {key: decision[key] or "" for key in ("route", "model", "detail", "reason")}
+        yield "letterbuddy_routing_calls", "Upstream calls per model routing choice", labels, decision["calls"]
+        yield "letterbuddy_routing_escalations", "Answers redone on the large model", labels, decision["escalated"]
+    cache = analysis_cache.stats()
+    yield "letterbuddy_analysis_cache_hits", "Analysis cache hits", {}, cache["hits"]
+    yield "letterbuddy_analysis_cache_misses", "Analysis cache misses", {}, cache["misses"]
+    jobs = job_queue.stats()
+    yield "letterbuddy_job_queue_depth", "Queued analysis jobs", {}, jobs["depth"]
+    yield "letterbuddy_job_queue_running", "Running analysis jobs", {}, jobs["running"]
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """
+    Get hit/miss counters and size of the analysis result cache
+    """
+    return analysis_cache.stats()
+
+# (good, poor) bounds for each measured metric; values in between score linearly
+FEEDBACK_METRIC_BOUNDS = {
+    "height_variation": (0.15, 0.45),
+    "baseline_deviation": (0.05, 0.25),
+    "spacing_variation": (0.12, 0.4),
+    "slant_variation": (6.0, 18.0),
+}
+
+FEEDBACK_METRIC_TIPS = {
+    "height_variation": "Focus on consistent letter size",
+    "baseline_deviation": "Use lined paper and rest every letter on the line",
+    "spacing_variation": "Work on even spacing between letters",
+    "slant_variation": "Keep all your letters leaning the same way",
+}
+
+def metric_score(metrics: HandwritingMetrics, name: str) -> Optional[float]:
+    """0-1 score for one measurement (1 is good), or None if it could not be measured"""
+    value = getattr(metrics, name)
+    if value != value:  # NaN: too few glyphs to measure
+        return None
+    good, poor = FEEDBACK_METRIC_BOUNDS[name]
+    return min(max((poor - value) / (poor - good), 0.0), 1.0)
+
+def score_label(score: Optional[float]) -> str:
+    if score is None:
+        return "Not enough writing to measure"
+    if score >= 0.85:
+        return "Excellent"
+    if score >= 0.6:
+        return "Good"
+    if score >= 0.35:
+        return "Fair"
+    return "Needs Practice"
+
+def measured_feedback(metrics: HandwritingMetrics) -> HandwritingFeedback:
+    """
+    Turn local segmentation measurements into feedback with the measured values
+    """
+    scores = {name: metric_score(metrics, name) for name in FEEDBACK_METRIC_BOUNDS}
+    measured = [score for score in scores.values() if score is not None]
+
+    formation_scores = [scores[n] for n in ("height_variation", "baseline_deviation") if scores[n] is not None]
+    formation = sum(formation_scores) / len(formation_scores) if formation_scores else None
+    letter_formation = score_label(formation)
+    if scores["height_variation"] is not None:
+        letter_formation += (
+            f" (letter size varies {metrics.height_variation:.0%}, "
+            f"baseline drift {metrics.baseline_deviation:.0%} of letter height)"
+        )
+
+    spacing = score_label(scores["spacing_variation"])
+    if scores["spacing_variation"] is not None:
+        spacing += (
+            f" (letter gaps {metrics.letter_spacing:.2f}x letter height, "
+            f"varying by {metrics.spacing_variation:.2f})"
+        )
+
+    consistency = score_label(scores["slant_variation"])
+    if scores["slant_variation"] is not None:
+        consistency += (
+            f" (slant {metrics.slant_degrees:+.0f} degrees, varying by {metrics.slant_variation:.0f})"
+        )
+
+    # Weakest measurements first
+    tips = [
+        FEEDBACK_METRIC_TIPS[name]
+        for name, score in sorted(scores.items(), key=lambda item: item[1] if item[1] is not None else 1.0)
+        if score is not None and score < 0.6
+    ]
+    tips = tips or ["Great work! Keep practicing to make it automatic"]
+    tips.append("Take your time with each stroke")
+
+    return HandwritingFeedback(
+        letter_formation=letter_formation,
+        spacing=spacing,
+        consistency=consistency,
+        overall_score=max(1, round(10 * sum(measured) / len(measured))) if measured else 1,
+        improvement_tips=tips,
+        measurements=HandwritingMeasurements(**metrics.to_dict()),
+    )
+
+def load_feedback_image(image_data: bytes):
+    """Decode an upload for segmentation, mapping failures to HTTP errors"""
+    try:
+        return load_grayscale(image_data)
+    except ImageQualityError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except ImagePreprocessingError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def measure_feedback(images) -> List[HandwritingFeedback]:
+    try:
+        return [measured_feedback(metrics) for metrics in measure_batch(images)]
+    except ImageQualityError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+def decode_image_data(image_data: str, max_bytes: int = UPLOAD_MAX_BYTES) -> bytes:
+    """Decode a base64 image or data URL, checking its size before decoding"""
+    encoded = image_data.partition(",")[2] if image_data.startswith("data:") else image_data
+    if len(encoded) * 3 // 4 > max_bytes:
+        raise HTTPException(status_code=413, detail=f"File is too large (max {max_bytes // (1024 * 1024)} MB)")
+    try:
+        return binascii.a2b_base64(encoded)
+    except binascii.Error:
+        raise HTTPException(status_code=400, detail="image_data is not valid base64")
+
+@router.post("/feedback", response_model=HandwritingFeedback)
+async def get_handwriting_feedback(request: FeedbackRequest):
+    """
+    Feedback for an analysis, scored from measurements of the image it was
+    made from; the analysis adds the letters the model flagged to the tips
+    """
+    try:
+        image_data = decode_image_data(request.image_data)
         
-        # If no suggestions were parsed, use fallback
-        if not suggestions:
-            suggestions = [
-                "Practice letter formation",
-                "Work on consistent spacing",
-                "Focus on readability"
-            ]
+        def run():
+            return measure_feedback([load_feedback_image(image_data)])[0]
         
-        # Extract letters to improve
-        if "LETTERS_TO_IMPROVE:" in analysis_text:
-            letters_to_improve_section = analysis_text.split("LETTERS_TO_IMPROVE:")[1].split("\n")[0].strip()
-            if letters_to_improve_section:
-                letters_to_improve = [l.upper() for l in letters_to_improve_section.split(',') if l.strip()]
-                letters_to_improve = sorted(list(set(letters_to_improve)))
+        feedback = await run_in_threadpool(run)
+        if request.letters_to_improve:
+            feedback.improvement_tips.insert(0, f"Practice the letters {', '.join(request.letters_to_improve)}")
+        return feedback
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error generating feedback: {str(e)}")
+
+@router.post("/feedback/image", response_model=HandwritingFeedback)
+async def get_measured_feedback(image: UploadFile = File(...)):
+    """
+    Feedback measured locally from the handwriting image (letter size, slant,
+    baseline and spacing), without calling OpenAI
+    """
+    try:
+        image_data = await read_image_upload(image)
         
-        # Generate structured response
-        return HandwritingAnalysisResponse(
-            detected_letters=detected_letters,
-            handwriting_quality=handwriting_quality,
-            suggestions=suggestions[:5],  # Limit to 5 suggestions
-            confidence_score=confidence_score,
-            analysis=analysis_text,
-            letters_to_improve=letters_to_improve # Include the new field
-        )
+        def run():
+            return measure_feedback([load_feedback_image(image_data)])[0]
         
+        return await run_in_threadpool(run)
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error analyzing handwriting: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error generating feedback: {str(e)}")
 
-@router.post("/feedback", response_model=HandwritingFeedback)
-async def get_handwriting_feedback(analysis: HandwritingAnalysisResponse):
+@router.post("/feedback/batch", response_model=List[FeedbackBatchItem])
+async def get_measured_feedback_batch(images: List[UploadFile] = File(...)):
     """
-    Generate detailed feedback based on handwriting analysis
+    Measured feedback for several images, binarized together as one vectorized batch.
+    Each image gets its own item, so one unreadable image does not fail the others.
     """
+    if len(images) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Too many images (max {BATCH_MAX_FILES})")
     try:
-        # Generate feedback based on the analysis
-        letter_count = len(analysis.detected_letters)
-        
-        if letter_count >= 10:
-            quality = "Excellent"
-            score = 9
-        elif letter_count >= 5:
-            quality = "Good"
-            score = 7
-        elif letter_count >= 3:
-            quality = "Fair"
-            score = 5
-        else:
-            quality = "Needs Practice"
-            score = 3
+        items = [FeedbackBatchItem(index=index, filename=upload.filename, status="ok") for index, upload in enumerate(images)]
+        uploads = []
+        for item, upload in zip(items, images):
+            try:
+                uploads.append((item, await read_image_upload(upload)))
+            except HTTPException as e:
+                item.status, item.error = "error", e.detail
         
-        return HandwritingFeedback(
-            letter_formation=quality,
-            spacing="Good" if score >= 7 else "Needs Improvement",
-            consistency="Consistent" if score >= 7 else "Inconsistent",
-            overall_score=score,
-            improvement_tips=[
-                "Practice writing each letter multiple times",
-                "Focus on consistent letter size",
-                "Work on spacing between letters and words",
-                "Use lined paper for better alignment",
-                "Take your time with each stroke"
-            ]
-        )
+        def run():
+            decoded = []
+            for item, data in uploads:
+                try:
+                    decoded.append((item, load_grayscale(data)))
+                except (ImageQualityError, ImagePreprocessingError) as e:
+                    item.status, item.error = "error", str(e)
+            for (item, _), measured in zip(decoded, measure_each([image for _, image in decoded])):
+                if isinstance(measured, ImageQualityError):
+                    item.status, item.error = "error", str(measured)
+                else:
+                    item.feedback = measured_feedback(measured)
+            return items
         
+        return await run_in_threadpool(run)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error generating feedback: {str(e)}")
 
-@router.post("/practice-sentences", response_model=PracticeSentenceResponse)
-async def generate_practice_sentences(request: PracticeSentenceRequest):
+async def request_practice_sentences(target_letter: str, difficulty: str, sentence_count: int, user_id: Optional[int] = None):
     """
-    Generate practice sentences with frequent occurrences of a target letter using OpenAI
+    Ask OpenAI for practice sentences and tips for a target letter.
+    Returns (sentences, practice_tips); either list may be empty if parsing fails.
+    The user's own budgets are checked before joining or starting the shared
+    call; background pool refills pass no user_id and only count against global budgets.
     """
-    print(f"Received practice sentences request: {request}")
-    
-    if not openai_client:
-        print("OpenAI client not available")
+    if not get_openai_client():
         raise HTTPException(
             status_code=500, 
             detail="OpenAI API key not configured. Please set OPENAI_API_KEY environment variable."
         )
     
+    try:
+        choice = model_router.practice(difficulty.lower(), sentence_count)
+        prompt_tokens = PRACTICE_PROMPT.estimate(practice_user_message(target_letter, difficulty, sentence_count))
+        tokens = PRACTICE_PROMPT.check_budget(prompt_tokens, choice.max_tokens)
+        user_charges = await upstream_limiter.admit_user("practice", user_id, tokens)
+        try:
+            # A class asking for the same letter at once shares one generation call
+            key = (target_letter.upper(), difficulty.lower(), sentence_count)
+            return await practice_flights.do(
+                key, lambda: generate_with_openai(target_letter, difficulty, sentence_count)
+            )
+        except RateLimitExceeded:
+            await upstream_limiter.refund(user_charges)
+            raise
+    except RateLimitExceeded as e:
+        metrics.errors.inc("practice", f"RateLimitExceeded:{e.reason}")
+        raise rate_limited(e)
+    except PromptBudgetExceeded as e:
+        metrics.record_error("practice", e)
+        raise over_budget(e)
+
+def practice_user_message(target_letter: str, difficulty: str, sentence_count: int) -> str:
+    return PRACTICE_PROMPT.render(sentence_count=sentence_count, target_letter=target_letter, difficulty=difficulty)
+
+async def generate_with_openai(target_letter: str, difficulty: str, sentence_count: int):
+    """
+    One practice sentence generation call, shared by every coalesced caller
+    and so made against the global budgets only; see request_practice_sentences.
+    """
+    user_message = practice_user_message(target_letter, difficulty, sentence_count)
+    prompt_tokens = PRACTICE_PROMPT.estimate(user_message)
+    messages = PRACTICE_PROMPT.messages(user_message)
+    
+    async def call_model(choice: ModelChoice):
+        tokens = PRACTICE_PROMPT.check_budget(prompt_tokens, choice.max_tokens)
+        
+        async def call_upstream():
+            async with upstream_limiter.limit("practice", None, tokens) as lease:
+                response = await get_openai_client().chat.completions.create(
+                    model=choice.model,
+                    messages=messages,
+                    max_tokens=choice.max_tokens,
+                    temperature=0.7,
+                    timeout=PRACTICE_SENTENCES_TIMEOUT
+                )
+                await lease.settle(response.usage)
+                metrics.record_usage("practice", response.usage)
+                PRACTICE_PROMPT.record(prompt_tokens, response.usage)
+                return response
+        
+        started = time.perf_counter()
+        response = await upstream_resilience.call("practice", call_upstream, deadline=PRACTICE_SENTENCES_TIMEOUT)
+        model_router.record("practice", choice, time.perf_counter() - started, response.usage)
+        # Parse the response
+        return parse_practice(response.choices[0].message.content)
+    
+    # Call OpenAI API, redoing a small-model answer with too few sentences on the large model
+    choice = model_router.practice(difficulty.lower(), sentence_count)
+    try:
+        completion = await call_model(choice)
+        escalation = model_router.escalate_practice(choice, len(completion.sentences), sentence_count)
+        if escalation is not None:
+            model_router.record_escalation("practice", choice)
+            completion = await call_model(escalation)
+    except PromptBudgetExceeded as e:
+        metrics.record_error("practice", e)
+        raise over_budget(e)
+    except (CircuitOpenError, *RETRYABLE_ERRORS) as e:
+        metrics.record_error("practice", e)
+        # Callers fall back to the sentence pool or their built-in sentences
+        upstream_resilience.record_fallback("practice")
+        return [], []
+    
+    return completion.sentences, completion.tips
+
+@router.post("/practice-sentences", response_model=PracticeSentenceResponse)
+async def generate_practice_sentences(request: PracticeSentenceRequest):
+    """
+    Generate practice sentences with frequent occurrences of a target letter.
+    Served from the precomputed sentence pool when possible, falling back to OpenAI.
+    """
     try:
         # Validate target letter
         if not request.target_letter:
-            print(f"Missing target letter")
             raise HTTPException(status_code=400, detail="Target letter is required")
         
         # Trim whitespace and validate
         cleaned_letter = request.target_letter.strip()
         if len(cleaned_letter) != 1:
-            print(f"Invalid target letter: '{request.target_letter}' (length: {len(request.target_letter)})")
             raise HTTPException(status_code=400, detail="Target letter must be a single character")
         
         target_letter = cleaned_letter.upper()
-        print(f"Processing request for target letter: {target_letter}, difficulty: {request.difficulty}")
-        
-        # Create prompt for OpenAI
-        system_prompt = f"""
-        You are a handwriting practice expert. Generate {request.sentence_count} practice sentences that contain the letter '{target_letter}' very frequently.
-        
-        Requirements:
-        - Each sentence should contain the letter '{target_letter}' at least 3-5 times
-        - Sentences should be natural, meaningful, and engaging
-        - Vary the difficulty based on the requested level: {request.difficulty}
-        - Make sentences appropriate for handwriting practice
-        - Include both uppercase and lowercase versions of '{target_letter}' when possible
-        
-        Difficulty levels:
-        - beginner: Simple, short sentences with basic vocabulary
-        - intermediate: Medium-length sentences with varied vocabulary
-        - advanced: Longer, more complex sentences with sophisticated vocabulary
+        # "Beginner" and "beginner" share one pool
+        difficulty = request.difficulty.strip().lower()
         
-        Format your response as:
-        SENTENCES:
-        [Sentence 1]
-        [Sentence 2]
-        [Sentence 3]
-        [Sentence 4]
-        [Sentence 5]
-        
-        TIPS:
-        [Tip 1]
-        [Tip 2]
-        [Tip 3]
-        """
-        
-        # Call OpenAI API
-        response = openai_client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {
-                    "role": "system",
-                    "content": system_prompt
-                },
-                {
-                    "role": "user",
-                    "content": f"Generate {request.sentence_count} practice sentences for the letter '{target_letter}' at {request.difficulty} difficulty level."
-                }
-            ],
-            max_tokens=500,
-            temperature=0.7
-        )
-        
-        # Parse the response
-        content = response.choices[0].message.content
-        
-        # Extract sentences
-        sentences = []
-        if "SENTENCES:" in content:
-            sentences_section = content.split("SENTENCES:")[1].split("TIPS:")[0].strip()
-            sentences = [s.strip() for s in sentences_section.split('\n') if s.strip() and not s.startswith('[') and not s.startswith('-')]
-        
-        # Extract practice tips
-        practice_tips = []
-        if "TIPS:" in content:
-            tips_section = content.split("TIPS:")[1].strip()
-            practice_tips = [tip.strip() for tip in tips_section.split('\n') if tip.strip() and not tip.startswith('[') and not tip.startswith('-')]
+        # Serve from the local pool and top it up in the background when it runs low
+        pooled = await run_in_threadpool(practice_corpus.pick, target_letter, difficulty, request.sentence_count)
+        if pooled:
+            sentences, practice_tips = pooled
+            await practice_corpus.schedule_refill(target_letter, difficulty, request_practice_sentences)
+        else:
+            sentences, practice_tips = await request_practice_sentences(
+                target_letter, difficulty, request.sentence_count, request.user_id
+            )
+            await run_in_threadpool(practice_corpus.add, target_letter, difficulty, sentences, practice_tips)
         
         # If parsing failed, generate fallback content
         if not sentences:
@@ -352,44 +1226,65 @@ async def generate_practice_sentences(request: PracticeSentenceRequest):
                 f"Take your time with each stroke of the letter {target_letter}"
             ]
         
+        # Only count the sentences actually returned
+        sentences = sentences[:request.sentence_count]
+        
         # Count total occurrences of the target letter
         total_letter_count = sum(sentence.upper().count(target_letter) for sentence in sentences)
         
         return PracticeSentenceResponse(
             target_letter=target_letter,
-            sentences=sentences[:request.sentence_count],
+            sentences=sentences,
             total_letter_count=total_letter_count,
-            difficulty=request.difficulty,
+            difficulty=difficulty,
             practice_tips=practice_tips[:5]
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"Error in generate_practice_sentences: {str(e)}")
-        print(f"Error type: {type(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        metrics.record_error("practice", e)
+        logger.exception("Error generating practice sentences")
         raise HTTPException(status_code=500, detail=f"Error generating practice sentences: {str(e)}")
 
-@router.get("/demo")
-async def get_demo_analysis():
+@router.get("/practice-sentences/stats")
+async def get_practice_sentence_stats():
     """
-    Get a demo handwriting analysis response for testing
+    Get pool sizes and how many requests were served locally vs from OpenAI
     """
-    return HandwritingAnalysisResponse(
-        detected_letters=["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "P", "Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z"],
-        handwriting_quality="Good",
-        suggestions=[
-            "Practice letter 'A' formation with consistent angles",
-            "Work on maintaining even spacing between letters",
-            "Focus on consistent letter height and alignment",
-            "Improve line smoothness for better appearance"
-        ],
-        confidence_score=0.85,
-        letters_to_improve=["A", "E", "R", "S"],
-        analysis="""DETECTED_LETTERS: A, B, C, D, E, F, G, H, I, J, K, L, M, N, O, P, Q, R, S, T, U, V, W, X, Y, Z
+    return await run_in_threadpool(practice_corpus.stats)
+
+DEMO_ANALYSIS = HandwritingAnalysisResponse(
+    detected_letters=["A", "B", "C", "D", "E", "F", "G", "H", "I", "J", "K", "L", "M", "N", "O", "P", "Q", "R", "S", "T", "U", "V", "W", "X", "Y", "Z"],
+    handwriting_quality="Good",
+    suggestions=[
+        "Practice letter 'A' formation with consistent angles",
+        "Work on maintaining even spacing between letters",
+        "Focus on consistent letter height and alignment",
+        "Improve line smoothness for better appearance"
+    ],
+    confidence_score=0.85,
+    letters_to_improve=["A", "E", "R", "S"],
+    analysis="""DETECTED_LETTERS: A, B, C, D, E, F, G, H, I, J, K, L, M, N, O, P, Q, R, S, T, U, V, W, X, Y, Z
 QUALITY: Good
 CONFIDENCE: 0.85
 SUGGESTIONS: Practice letter 'A' formation with consistent angles, Work on maintaining even spacing between letters, Focus on consistent letter height and alignment, Improve line smoothness for better appearance
 LETTERS_TO_IMPROVE: A, E, R, S
 ANALYSIS: This is a demo analysis showing detected letters A through Z. The handwriting demonstrates good potential with clear letter formation and readable text. There's room for improvement in consistency and spacing, but overall the writing is neat and legible. The uppercase letters are well-formed with distinct shapes, though some could benefit from more consistent sizing and alignment."""
+)
+# Serialized once: every request sends the same bytes
+DEMO_ANALYSIS_BODY = JSONResponse(DEMO_ANALYSIS.model_dump()).body
+DEMO_ANALYSIS_ETAG = content_etag(DEMO_ANALYSIS_BODY)
+
+@router.get("/demo", response_model=HandwritingAnalysisResponse)
+async def get_demo_analysis(request: Request):
+    """
+    Get a demo handwriting analysis response for testing
+    """
+    if etag_matches(request.headers.get("if-none-match"), DEMO_ANALYSIS_ETAG):
+        return not_modified(DEMO_ANALYSIS_ETAG, STATIC_CACHE_CONTROL)
+    return Response(
+        DEMO_ANALYSIS_BODY,
+        media_type="application/json",
+        headers={"ETag": DEMO_ANALYSIS_ETAG, "Cache-Control": STATIC_CACHE_CONTROL},
     )
@@ -1,7 +1,10 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import List, Optional
 from enum import Enum
+from app.services.http_cache import REVALIDATE, etag_matches, not_modified, version_etag
+from app.services.repository import letter_repository, DEMO_USER
 
 router = APIRouter()
 
@@ -33,40 +36,77 @@ class LetterResponse(BaseModel):
     status: LetterStatus
     user_id: int
 
-# Demo data
-demo_letters = [
-    {
-        "id": 1,
-        "title": "Thank You Letter",
-        "content": "Dear John, Thank you for your help...",
-        "recipient": "John Doe",
-        "letter_type": LetterType.THANK_YOU,
-        "status": LetterStatus.SENT,
-        "user_id": 1
-    }
-]
-
 @router.get("/", response_model=List[LetterResponse])
-async def get_letters():
-    """Get all letters for the current user (demo version)"""
-    return demo_letters
+async def get_letters(
+    request: Request,
+    response: Response,
+    user_id: int = DEMO_USER["id"],
+    after: Optional[int] = Query(None, description="Last letter id of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """
+    Get the current user's letters in id order, one page at a time.
+    When more letters follow, the X-Next-Cursor header holds the value to pass as `after`.
+    The ETag changes with any change to the user's letters; sending it back in
+    If-None-Match gets a 304 without the page being read or serialized.
+    """
+    # Read before the page, so a concurrent write can only make the ETag older than the body
+    version = await run_in_threadpool(letter_repository.version, user_id)
+    etag = version_etag("letters", user_id, version, after, limit)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(etag)
+    letters = await run_in_threadpool(letter_repository.list_for_user, user_id, after, limit)
+    if len(letters) == limit:
+        response.headers["X-Next-Cursor"] = str(letters[-1]["id"])
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = REVALIDATE
+    return letters
 
 @router.post("/", response_model=LetterResponse)
 async def create_letter(letter: LetterCreate):
-    """Create a new letter (demo version)"""
-    new_letter = {
-        "id": len(demo_letters) + 1,
-        **letter.dict(),
-        "status": LetterStatus.DRAFT,
-        "user_id": 1  # Demo user ID
-    }
-    demo_letters.append(new_letter)
-    return new_letter
+    """Create a new letter for the current user"""
+    return await run_in_threadpool(
+        letter_repository.create,
+        DEMO_USER["id"],
+        letter.title,
+        letter.content,
+        letter.recipient,
+        letter.letter_type.value,
+        LetterStatus.DRAFT.value,
+    )
+
+# Declared before /{letter_id} so "search" is not parsed as an id
+@router.get("/search", response_model=List[LetterResponse])
+async def search_letters(
+    response: Response,
+    q: str = Query(..., min_length=1, description="Words to find in titles and content; partial words match"),
+    letter_type: Optional[LetterType] = None,
+    status: Optional[LetterStatus] = None,
+    user_id: int = DEMO_USER["id"],
+    offset: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+):
+    """
+    Search the current user's letters, best matches first (title matches rank highest).
+    When more results follow, the X-Next-Offset header holds the value to pass as `offset`.
+    """
+    letters = await run_in_threadpool(
+        letter_repository.search,
+        user_id,
+        q,
+        letter_type.value if letter_type else None,
+        status.value if status else None,
+        limit,
+        offset,
+    )
+    if len(letters) == limit:
+        response.headers["X-Next-Offset"] = str(offset + limit)
+    return letters
 
 @router.get("/{letter_id}", response_model=LetterResponse)
 async def get_letter(letter_id: int):
-    """Get a specific letter by ID (demo version)"""
-    for letter in demo_letters:
-        if letter["id"] == letter_id:
-            return letter
-    return {"error": "Letter not found"}
+    """Get a specific letter by ID"""
+    letter = await run_in_threadpool(letter_repository.get, letter_id)
+    if letter is None:
+        raise HTTPException(status_code=404, detail="Letter not found")
+    return letter
@@ -1,6 +1,8 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
+from app.services.repository import user_repository, DEMO_USER
 
 router = APIRouter()
 
@@ -12,31 +14,28 @@ class UserResponse(BaseModel):
     last_name: str
     is_active: bool
 
-# Demo data
-demo_users = [
-    {
-        "id": 1,
-        "email": "demo@example.com",
-        "first_name": "Demo",
-        "last_name": "User",
-        "is_active": True
-    }
-]
-
 @router.get("/", response_model=List[UserResponse])
-async def get_users():
-    """Get all users (demo version)"""
-    return demo_users
-
-@router.get("/{user_id}", response_model=UserResponse)
-async def get_user(user_id: int):
-    """Get a specific user by ID (demo version)"""
-    for user in demo_users:
-        if user["id"] == user_id:
-            return user
-    return {"error": "User not found"}
+async def get_users(
+    response: Response,
+    after: Optional[int] = Query(None, description="Last user id of the previous page"),
+    limit: int = Query(50, ge=1, le=200),
+):
+    """Get users in id order, one page at a time (see X-Next-Cursor)"""
+    users = await run_in_threadpool(user_repository.list, after, limit)
+    if len(users) == limit:
+        response.headers["X-Next-Cursor"] = str(users[-1]["id"])
+    return users
 
+# Declared before /{user_id} so "me" is not parsed as an id
 @router.get("/me", response_model=UserResponse)
 async def get_current_user():
-    """Get current user info (demo version)"""
-    return demo_users[0]  # Return first demo user
+    """Get current user info (demo user until authentication exists)"""
+    return await get_user(DEMO_USER["id"])
+
+@router.get("/{user_id}", response_model=UserResponse)
+async def get_user(user_id: int):
+    """Get a specific user by ID"""
+    user = await run_in_threadpool(user_repository.get, user_id)
+    if user is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from app.db import WEB_CONCURRENCY, connect, data_path
+
+# Analysis result cache settings; with several workers the cache is shared through SQLite
+ANALYSIS_CACHE_BACKEND = os.getenv(
+    "ANALYSIS_CACHE_BACKEND", "sqlite" if WEB_CONCURRENCY > 1 else "memory"
+)  # memory, sqlite or none
+ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv("ANALYSIS_CACHE_MAX_ENTRIES", "1024"))
+ANALYSIS_CACHE_TTL = float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+ANALYSIS_CACHE_PATH = os.getenv("ANALYSIS_CACHE_PATH", data_path("analysis_cache.db"))
+
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry expiry"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """
+    On-disk LRU cache that survives restarts and is shared between workers.
+    Writes can wait on another worker's lock, so calls run in the thread pool.
+    """
+
+    name = "sqlite"
+    blocking = True
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS analysis_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_used ON analysis_cache (last_used)"
+        )
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM analysis_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE analysis_cache SET last_used = ? WHERE key = ?", (now, key))
+        return json.loads(row["value"])
+
+    def set(self, key: str, value: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO analysis_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), now + self.ttl, now),
+                )
+                self._conn.execute("DELETE FROM analysis_cache WHERE expires_at <= ?", (now,))
+                # Evict least recently used entries above the size bound
+                self._conn.execute(
+                    """
+                    DELETE FROM analysis_cache WHERE key IN (
+                        SELECT key FROM analysis_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.max_entries,),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM analysis_cache").fetchone()[0]
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache of handwriting analysis results.
+    Keys combine a hash of the preprocessed image with the prompt version,
+    so changing the prompt naturally invalidates old results.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(image_data: bytes, prompt_version: str) -> str:
+        digest = hashlib.sha256(image_data).hexdigest()
+        return f"{prompt_version}:{digest}"
+
+    async def _call(self, method, *args):
+        if self.backend.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def get(self, key: str) -> Optional[dict]:
+        if self.backend is None:
+            return None
+        value = await self._call(self.backend.get, key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: dict):
+        if self.backend is not None:
+            await self._call(self.backend.set, key, value)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name if self.backend else "none",
+            "entries": len(self.backend) if self.backend else 0,
+            "max_entries": ANALYSIS_CACHE_MAX_ENTRIES,
+            "ttl_seconds": ANALYSIS_CACHE_TTL,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+def create_analysis_cache() -> AnalysisCache:
+    """Build the analysis cache for the configured backend"""
+    if ANALYSIS_CACHE_BACKEND == "sqlite":
+        backend = SQLiteCacheBackend(ANALYSIS_CACHE_PATH, ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_TTL)
+    elif ANALYSIS_CACHE_BACKEND == "memory":
+        backend = MemoryCacheBackend(ANALYSIS_CACHE_MAX_ENTRIES, ANALYSIS_CACHE_TTL)
+    else:
+        backend = None
+    return AnalysisCache(backend)
+
+
+analysis_cache = create_analysis_cache()
@@ -0,0 +1,278 @@
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional
+import numpy as np
+from app.db import ConnectionPool
+from app.services.progress import SECONDS_PER_DAY, quality_score
+from app.services.repository import database
+
+# Rows read from handwriting_analyses per query when catching up with new analyses
+HISTORY_SYNC_BATCH = int(os.getenv("HISTORY_SYNC_BATCH", "50000"))
+# Most groups returned by one aggregation query
+HISTORY_MAX_GROUPS = int(os.getenv("HISTORY_MAX_GROUPS", "1000"))
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+# handwriting_quality labels, stored as their index; anything else is QUALITY_UNKNOWN
+QUALITY_LABELS = ("Excellent", "Good", "Fair", "Needs Improvement", "Poor")
+QUALITY_CODES = {label.lower(): code for code, label in enumerate(QUALITY_LABELS)}
+QUALITY_UNKNOWN = 255
+# Score per code, with 0 for unknown labels (which are not counted in quality averages)
+QUALITY_SCORE_TABLE = np.array([quality_score(label) for label in QUALITY_LABELS] + [0.0])
+# Which of the 8 bits of each byte value are set, lowest first
+BYTE_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little").astype(np.int64)
+
+# One array per column: 17 bytes per analysis
+COLUMNS = (
+    ("user_id", np.uint32),
+    ("created_at", np.uint32),  # Unix seconds
+    ("letters", np.uint32),  # letters_to_improve as a bit mask, bit 0 = A
+    ("quality", np.uint8),
+    ("confidence", np.float32),
+)
+
+GROUP_BY = ("day", "user")
+
+
+def letter_mask(letters: Iterable[str]) -> int:
+    """letters_to_improve as a 26-bit mask; anything but A-Z is left out"""
+    mask = 0
+    for letter in letters:
+        letter = letter.strip().upper()
+        if len(letter) == 1 and letter in LETTERS:
+            mask |= 1 << LETTERS.index(letter)
+    return mask
+
+
+def quality_code(label: str) -> int:
+    return QUALITY_CODES.get(label.strip().lower(), QUALITY_UNKNOWN)
+
+
+def group_index(keys: np.ndarray):
+    """
+    (distinct keys in order, each element's index among them), like
+    np.unique(keys, return_inverse=True) but without sorting when the keys
+    (user IDs, day numbers) span a range not much larger than their count
+    """
+    if not len(keys):
+        return keys, np.zeros(0, dtype=np.intp)
+    low = int(keys.min())
+    span = int(keys.max()) - low + 1
+    if span > 4 * len(keys) + 1024:
+        return np.unique(keys, return_inverse=True)
+    offsets = (keys - low).astype(np.intp)
+    present = np.bincount(offsets, minlength=span) > 0
+    return np.flatnonzero(present) + low, (np.cumsum(present) - 1)[offsets]
+
+
+def letter_counts(masks: np.ndarray, inverse: np.ndarray, groups: int) -> np.ndarray:
+    """
+    (groups, 26) counts of analyses flagging each letter. Counts each
+    group's byte values of the masks (4 passes instead of 26), then
+    expands byte values into their bits.
+    """
+    counts = np.empty((groups, 32), dtype=np.int64)
+    # Little-endian byte order regardless of the platform's
+    mask_bytes = masks.astype("<u4", copy=False).view(np.uint8).reshape(-1, 4)
+    for byte in range(4):
+        values = mask_bytes[:, byte]
+        index = values if groups == 1 else inverse * 256 + values
+        table = np.bincount(index, minlength=groups * 256).reshape(groups, 256)
+        counts[:, 8 * byte:8 * byte + 8] = table @ BYTE_BITS
+    return counts[:, :len(LETTERS)]
+
+
+def quality_counts(codes: np.ndarray, inverse: np.ndarray, groups: int) -> np.ndarray:
+    """(groups, labels + 1) counts of each quality label, the last column for unknown labels"""
+    slots = len(QUALITY_LABELS) + 1
+    codes = np.minimum(codes, len(QUALITY_LABELS))
+    return np.bincount(inverse * slots + codes, minlength=groups * slots).reshape(groups, slots)
+
+
+def window_sums(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum of each element and the window - 1 before it"""
+    sums = np.cumsum(values, dtype=np.float64)
+    sums[window:] -= sums[:-window].copy()
+    return sums
+
+
+def rate(numerator, denominator) -> Optional[float]:
+    return round(float(numerator) / float(denominator), 4) if denominator else None
+
+
+class AnalysisHistory:
+    """
+    Columnar, in-memory copy of handwriting_analyses for statistics over
+    many analyses (dashboards, teacher views): letters_to_improve as 26-bit
+    masks, quality as a small-int label code and confidence as float32, in
+    growable NumPy arrays. Queries are vectorized over the arrays; before
+    each one, analyses stored since the last query (by this or any other
+    worker) are read from the database.
+    """
+
+    def __init__(self, pool: ConnectionPool, capacity: int = 1024):
+        self._pool = pool
+        self._lock = threading.Lock()
+        self._size = 0
+        self._last_id = 0
+        self._columns = {name: np.empty(capacity, dtype=dtype) for name, dtype in COLUMNS}
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def nbytes(self) -> int:
+        return sum(column[:self._size].nbytes for column in self._columns.values())
+
+    def append(self, user_id, created_at, letters, quality, confidence) -> None:
+        """Append analyses given as equal-length arrays per column"""
+        with self._lock:
+            self._append(dict(user_id=user_id, created_at=created_at, letters=letters, quality=quality, confidence=confidence))
+
+    def _append(self, values: Dict[str, np.ndarray]) -> None:
+        end = self._size + len(values["user_id"])
+        capacity = len(self._columns["user_id"])
+        if end > capacity:
+            # Grow by doubling; readers keep the arrays they already sliced
+            capacity = max(end, capacity * 2)
+            for name, column in self._columns.items():
+                grown = np.empty(capacity, dtype=column.dtype)
+                grown[:self._size] = column[:self._size]
+                self._columns[name] = grown
+        for name, column in self._columns.items():
+            column[self._size:end] = values[name]
+        self._size = end
+
+    def sync(self) -> None:
+        """Load analyses stored since the last sync"""
+        while True:
+            with self._pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, user_id, created_at, handwriting_quality, confidence_score, letters_to_improve "
+                    "FROM handwriting_analyses WHERE id > ? ORDER BY id LIMIT ?",
+                    (self._last_id, HISTORY_SYNC_BATCH),
+                ).fetchall()
+            if not rows:
+                return
+            ids = [row["id"] for row in rows]
+            values = {
+                "user_id": [row["user_id"] for row in rows],
+                "created_at": [int(row["created_at"]) for row in rows],
+                "letters": [letter_mask(json.loads(row["letters_to_improve"])) for row in rows],
+                "quality": [quality_code(row["handwriting_quality"]) for row in rows],
+                "confidence": [row["confidence_score"] for row in rows],
+            }
+            with self._lock:
+                # Another thread may have loaded some of the same rows meanwhile
+                start = next((i for i, row_id in enumerate(ids) if row_id > self._last_id), len(ids))
+                if start < len(ids):
+                    self._append({name: column[start:] for name, column in values.items()})
+                    self._last_id = ids[-1]
+            if len(rows) < HISTORY_SYNC_BATCH:
+                return
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """The filled part of each column, as views that later appends do not change"""
+        with self._lock:
+            return {name: column[:self._size] for name, column in self._columns.items()}
+
+    def stats(
+        self,
+        user_id: Optional[int] = None,
+        since: Optional[float] = None,
+        until: Optional[float] = None,
+        group_by: Optional[str] = None,
+        window_days: int = 7,
+        limit: int = HISTORY_MAX_GROUPS,
+    ) -> dict:
+        """
+        Letter frequencies, quality distribution and average confidence and
+        quality over the analyses of one user (or everyone) between since and
+        until; optionally per day or per user, and as rolling window_days
+        averages for each day with analyses in the period.
+        """
+        if group_by is not None and group_by not in GROUP_BY:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY)}")
+        columns = self.columns()
+        selected = np.ones(len(columns["user_id"]), dtype=bool)
+        if user_id is not None:
+            selected &= columns["user_id"] == user_id
+        if since is not None:
+            selected &= columns["created_at"] >= since
+        if until is not None:
+            selected &= columns["created_at"] < until
+        if not selected.all():
+            columns = {name: column[selected] for name, column in columns.items()}
+
+        days = columns["created_at"] // SECONDS_PER_DAY
+        result = self.summarize(columns, np.zeros(len(days), dtype=np.intp), 1)[0]
+        result["groups"] = []
+        if group_by is not None:
+            keys = days if group_by == "day" else columns["user_id"]
+            group_keys, inverse = group_index(keys)
+            groups = self.summarize(columns, inverse, len(group_keys))
+            for key, group in zip(group_keys.tolist(), groups):
+                group["key"] = key * SECONDS_PER_DAY if group_by == "day" else key
+            if group_by == "user":
+                # The busiest users first
+                groups.sort(key=lambda group: group["analysis_count"], reverse=True)
+            else:
+                groups = groups[::-1]
+            result["groups"] = groups[:limit]
+        result["rolling"] = self.rolling(columns, days, window_days)[-limit:]
+        return result
+
+    @staticmethod
+    def summarize(columns: Dict[str, np.ndarray], inverse: np.ndarray, groups: int) -> List[dict]:
+        """Aggregates for each group of analyses; inverse is each analysis' group index"""
+        counts = np.bincount(inverse, minlength=groups)
+        confidence_sums = np.bincount(inverse, weights=columns["confidence"], minlength=groups)
+        qualities = quality_counts(columns["quality"], inverse, groups)
+        quality_sums = qualities @ QUALITY_SCORE_TABLE
+        letters = letter_counts(columns["letters"], inverse, groups)
+
+        summaries = []
+        for group in range(groups):
+            known = qualities[group, :-1].sum()
+            summaries.append({
+                "analysis_count": int(counts[group]),
+                "average_confidence": rate(confidence_sums[group], counts[group]),
+                "average_quality": rate(quality_sums[group], known),
+                "quality_counts": {
+                    label: int(count) for label, count in zip(QUALITY_LABELS, qualities[group]) if count
+                },
+                "letter_counts": {
+                    letter: int(count) for letter, count in zip(LETTERS, letters[group]) if count
+                },
+            })
+        return summaries
+
+    @staticmethod
+    def rolling(columns: Dict[str, np.ndarray], days: np.ndarray, window_days: int) -> List[dict]:
+        """Averages over the window_days days up to each day that has analyses"""
+        if not len(days):
+            return []
+        first = int(days.min())
+        offsets = (days - first).astype(np.intp)
+        span = int(offsets.max()) + 1
+        # Per-day quality label counts give the analysis counts and quality sums too
+        daily = quality_counts(columns["quality"], offsets, span)
+        window = max(1, window_days)
+        counts = window_sums(daily.sum(axis=1), window)
+        quality_totals = window_sums(daily[:, :-1].sum(axis=1), window)
+        quality = window_sums(daily @ QUALITY_SCORE_TABLE, window)
+        confidence = window_sums(np.bincount(offsets, weights=columns["confidence"], minlength=span), window)
+
+        active = np.flatnonzero(daily.sum(axis=1))
+        return [
+            {
+                "day": (first + day) * SECONDS_PER_DAY,
+                "analysis_count": int(counts[day]),
+                "average_confidence": rate(confidence[day], counts[day]),
+                "average_quality": rate(quality[day], quality_totals[day]),
+            }
+            for day in active.tolist()
+        ]
+
+
+analysis_history = AnalysisHistory(database)
@@ -0,0 +1,81 @@
+from app.services.completion_parser import (
+    ANALYSIS_HEADERS,
+    AnalysisCompletion,
+    match_header_line,
+    parse_analysis_section,
+)
+
+# Sections that may span several lines and only end when the next header starts
+MULTILINE_SECTIONS = ("SUGGESTIONS", "ANALYSIS")
+
+
+class AnalysisStreamParser:
+    """
+    Incremental parser for streamed analysis completions.
+    Feed it text deltas as they arrive; it reports each section header as
+    soon as that section is complete and keeps the parsed values in
+    self.completion, using the same normalization as the full parser.
+    Only the current partial line is buffered between deltas.
+    """
+
+    def __init__(self):
+        self.completion = AnalysisCompletion()
+        self._chunks = []
+        self._pending = ""
+        self._open_section = None
+        self._open_lines = []
+        self._done = set()
+
+    @property
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+    def feed(self, delta: str):
+        self._chunks.append(delta)
+        self._pending += delta
+        if "\n" not in delta:
+            return []
+
+        *lines, self._pending = self._pending.split("\n")
+        completed = []
+        for line in lines:
+            completed.extend(self._process_line(line))
+        return completed
+
+    def finish(self):
+        """Flush the last (unterminated) line and any open multi-line section"""
+        completed = []
+        if self._pending:
+            completed.extend(self._process_line(self._pending))
+            self._pending = ""
+        completed.extend(self._close_open_section())
+        return completed
+
+    def _process_line(self, line: str):
+        header, rest = match_header_line(line, ANALYSIS_HEADERS)
+        if header is None or header in self._done or header == self._open_section:
+            if self._open_section:
+                self._open_lines.append(line)
+                # A single-line section written below its header ends with that line
+                if self._open_section not in MULTILINE_SECTIONS and line.strip():
+                    return self._close_open_section()
+            return []
+
+        completed = self._close_open_section()
+        if header in MULTILINE_SECTIONS or not rest:
+            self._open_section = header
+            self._open_lines = [rest] if rest else []
+        else:
+            self._done.add(header)
+            parse_analysis_section(header, rest, self.completion)
+            completed.append(header)
+        return completed
+
+    def _close_open_section(self):
+        if not self._open_section:
+            return []
+        header = self._open_section
+        self._done.add(header)
+        self._open_section = None
+        parse_analysis_section(header, "\n".join(self._open_lines).strip(), self.completion)
+        return [header]
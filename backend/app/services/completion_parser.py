@@ -0,0 +1,218 @@
+import json
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+ANALYSIS_HEADERS = ("DETECTED_LETTERS", "QUALITY", "CONFIDENCE", "SUGGESTIONS", "LETTERS_TO_IMPROVE", "ANALYSIS")
+PRACTICE_HEADERS = ("SENTENCES", "TIPS")
+QUALITY_LEVELS = ("Excellent", "Good", "Fair", "Needs Improvement")
+
+
+# Markdown that may surround a header: "**QUALITY:**", "## QUALITY:", "- QUALITY:"
+HEADER_DECORATION = " \t#>*-"
+HEADER_TAIL_RE = re.compile(r"[ \t*]*:[ \t*]*")
+# List markers only: "-", "*", "•", "1.", "2)" followed by whitespace
+LIST_MARKER_RE = re.compile(r"^[ \t]*(?:[-*•]+|\d{1,2}[.)])[ \t]+", re.MULTILINE)
+# A letter standing alone in a comma-separated list, optionally quoted
+SINGLE_LETTER_RE = re.compile(r"(?:^|,)[ \t'\"]*([A-Z])[ \t'\"]*(?=,|$)")
+NUMBER_RE = re.compile(r"\d+(?:\.\d+)?")
+JSON_FENCE_RE = re.compile(r"^```(?:json)?\s*(.*?)\s*```$", re.DOTALL)
+
+
+@dataclass
+class AnalysisCompletion:
+    detected_letters: Optional[List[str]] = None
+    handwriting_quality: Optional[str] = None
+    confidence_score: Optional[float] = None
+    suggestions: Optional[List[str]] = None
+    letters_to_improve: Optional[List[str]] = None
+    analysis: Optional[str] = None
+    structured: bool = False
+
+
+@dataclass
+class PracticeCompletion:
+    sentences: List[str] = field(default_factory=list)
+    tips: List[str] = field(default_factory=list)
+    structured: bool = False
+
+
+def find_header(text: str, header: str):
+    """
+    Locate the first line that starts with `header:` (allowing markdown decoration).
+    Returns (line start, body start) or None. Candidates are found with str.find,
+    so the cost barely grows with the length of the completion.
+    """
+    start = text.find(header)
+    while start != -1:
+        line_start = text.rfind("\n", 0, start) + 1
+        if line_start == start or not text[line_start:start].strip(HEADER_DECORATION):
+            tail = HEADER_TAIL_RE.match(text, start + len(header))
+            if tail:
+                return line_start, tail.end()
+        start = text.find(header, start + len(header))
+    return None
+
+
+def match_header_line(line: str, headers):
+    """Return (header, rest of line) if a single line starts a section, else (None, None)"""
+    stripped = line.lstrip(HEADER_DECORATION)
+    for header in headers:
+        if stripped.startswith(header):
+            rest = stripped[len(header):].lstrip(" \t*")
+            if rest.startswith(":"):
+                return header, rest[1:].strip(" \t*")
+    return None, None
+
+
+def split_sections(text: str, headers) -> dict:
+    """
+    Tokenize a completion into {header: section text} in one pass over the headers.
+    A section runs until the next header line; the first occurrence of a header wins.
+    """
+    found = []
+    for header in headers:
+        position = find_header(text, header)
+        if position:
+            found.append((position[0], position[1], header))
+    found.sort()
+
+    sections = {}
+    for index, (_, body_start, header) in enumerate(found):
+        end = found[index + 1][0] if index + 1 < len(found) else len(text)
+        sections[header] = text[body_start:end].strip()
+    return sections
+
+
+def parse_json_object(text: str) -> Optional[dict]:
+    """Return the completion as a dict if the model answered in JSON, else None"""
+    stripped = text.strip()
+    fenced = JSON_FENCE_RE.match(stripped)
+    if fenced:
+        stripped = fenced.group(1)
+    if not stripped.startswith("{"):
+        return None
+    try:
+        value = json.loads(stripped)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict) else None
+
+
+def parse_list_items(value) -> List[str]:
+    """One item per line (or per element when the model returned a JSON list)"""
+    text = "\n".join(str(item) for item in value) if isinstance(value, list) else str(value)
+    # Strip bullets and list numbers from every line in one pass, without touching digits in the content
+    text = LIST_MARKER_RE.sub("", text)
+    items = []
+    for line in text.split("\n"):
+        item = line.strip(" \t*")
+        # Skip template placeholders such as "[Sentence 1]"
+        if item and not (item[0] == "[" and item[-1] == "]"):
+            items.append(item)
+    return items
+
+
+def parse_detected_letters(value) -> List[str]:
+    """Every alphabetic character, upper-cased, unique and sorted"""
+    text = "".join(value) if isinstance(value, list) else str(value)
+    return sorted(set(filter(str.isalpha, text.upper())))
+
+
+def parse_letter_list(value) -> List[str]:
+    """Comma-separated single letters, upper-cased, unique and sorted"""
+    text = ",".join(str(item) for item in value) if isinstance(value, list) else str(value)
+    return sorted(set(SINGLE_LETTER_RE.findall(text.upper())))
+
+
+def parse_quality(value) -> Optional[str]:
+    text = str(value).strip().strip(".").lower()
+    for level in QUALITY_LEVELS:
+        if text == level.lower():
+            return level
+    return None
+
+
+def parse_confidence(value) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        score = float(value)
+    else:
+        match = NUMBER_RE.search(str(value))
+        if not match:
+            return None
+        score = float(match.group())
+    # Accept percentages ("85%" or "85") as well as 0-1 scores
+    if 1.0 < score <= 100.0:
+        score /= 100
+    return score if 0.0 <= score <= 1.0 else None
+
+
+def parse_analysis_section(header: str, value, completion: AnalysisCompletion):
+    """Normalize one analysis section into the completion"""
+    if header == "DETECTED_LETTERS":
+        completion.detected_letters = parse_detected_letters(value)
+    elif header == "QUALITY":
+        completion.handwriting_quality = parse_quality(value)
+    elif header == "CONFIDENCE":
+        completion.confidence_score = parse_confidence(value)
+    elif header == "SUGGESTIONS":
+        # Only keep meaningful suggestions
+        completion.suggestions = [item for item in parse_list_items(value) if len(item) > 10]
+    elif header == "LETTERS_TO_IMPROVE":
+        completion.letters_to_improve = parse_letter_list(value)
+    elif header == "ANALYSIS":
+        completion.analysis = str(value).strip()
+
+
+# JSON keys accepted for each analysis section
+ANALYSIS_JSON_KEYS = {
+    "DETECTED_LETTERS": ("detected_letters",),
+    "QUALITY": ("handwriting_quality", "quality"),
+    "CONFIDENCE": ("confidence_score", "confidence"),
+    "SUGGESTIONS": ("suggestions",),
+    "LETTERS_TO_IMPROVE": ("letters_to_improve",),
+    "ANALYSIS": ("analysis",),
+}
+
+
+def parse_analysis(text: str) -> AnalysisCompletion:
+    """Parse a handwriting analysis completion (sectioned text or JSON)"""
+    completion = AnalysisCompletion()
+    if not text:
+        return completion
+
+    data = parse_json_object(text)
+    if data is not None:
+        completion.structured = True
+        for header, keys in ANALYSIS_JSON_KEYS.items():
+            for key in keys:
+                if data.get(key) is not None:
+                    parse_analysis_section(header, data[key], completion)
+                    break
+        return completion
+
+    for header, value in split_sections(text, ANALYSIS_HEADERS).items():
+        # Single-line sections only use their first line
+        if header not in ("SUGGESTIONS", "ANALYSIS"):
+            value = value.split("\n", 1)[0]
+        parse_analysis_section(header, value, completion)
+    return completion
+
+
+def parse_practice(text: str) -> PracticeCompletion:
+    """Parse a practice sentence completion (sectioned text or JSON)"""
+    completion = PracticeCompletion()
+    if not text:
+        return completion
+
+    data = parse_json_object(text)
+    if data is not None:
+        completion.structured = True
+        completion.sentences = parse_list_items(data.get("sentences") or [])
+        completion.tips = parse_list_items(data.get("tips") or data.get("practice_tips") or [])
+        return completion
+
+    sections = split_sections(text, PRACTICE_HEADERS)
+    completion.sentences = parse_list_items(sections.get("SENTENCES", ""))
+    completion.tips = parse_list_items(sections.get("TIPS", ""))
+    return completion
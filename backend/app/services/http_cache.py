@@ -0,0 +1,102 @@
+import gzip
+import hashlib
+import os
+from typing import Optional
+from fastapi import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: without it, responses are only gzipped
+    brotli = None
+
+# Response compression settings
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Smaller bodies are sent as they are: they fit in a packet anyway
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", "1024"))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+# Bodies at least this large are compressed in the threadpool instead of on the event loop
+COMPRESSION_THREADPOOL_BYTES = int(os.getenv("COMPRESSION_THREADPOOL_BYTES", str(256 * 1024)))
+
+# Bump when the JSON of a version-tagged resource changes shape, so old ETags stop matching
+ETAG_FORMAT_VERSION = "1"
+# Cache-Control for resources that change at any time: store, but revalidate on every use
+REVALIDATE = "no-cache"
+# Cache-Control for fixed resources (the demo analysis)
+STATIC_CACHE_CONTROL = os.getenv("STATIC_CACHE_CONTROL", "public, max-age=3600")
+
+
+def supported_encodings():
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """The best encoding the client accepts (brotli before gzip), or None"""
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in supported_encodings():
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    # mtime=0 so the same body always compresses to the same bytes
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+
+def content_etag(body: bytes) -> str:
+    """Strong ETag for a body"""
+    return f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def version_etag(*parts) -> str:
+    """Strong ETag for a resource identified and versioned by parts, without serializing it"""
+    key = ":".join(str(part) for part in (ETAG_FORMAT_VERSION, *parts))
+    return f'"{hashlib.blake2b(key.encode(), digest_size=16).hexdigest()}"'
+
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """
+    A compressed body is a different representation, so a strong ETag gets
+    the encoding as a suffix ("abc" -> "abc-gzip"); weak ETags are kept
+    """
+    if etag.startswith('"') and etag.endswith('"'):
+        return f'{etag[:-1]}-{encoding}"'
+    return etag
+
+
+def opaque_tag(etag: str) -> str:
+    """An ETag without its weakness prefix or encoding suffix, for If-None-Match comparison"""
+    etag = etag.strip()
+    if etag.startswith("W/"):
+        etag = etag[2:]
+    for encoding in ("br", "gzip"):
+        suffix = f'-{encoding}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match uses weak comparison, so any encoding of the same resource matches"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = opaque_tag(etag)
+    return any(opaque_tag(candidate) == target for candidate in if_none_match.split(","))
+
+
+def not_modified(etag: str, cache_control: str = REVALIDATE) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
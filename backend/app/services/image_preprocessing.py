@@ -0,0 +1,128 @@
+import io
+import os
+from dataclasses import dataclass
+from typing import Optional
+from PIL import Image, ImageOps
+from app.services.image_quality import (
+    QUALITY_GATE_ENABLED,
+    ImageQualityError,
+    QualityReport,
+    assess_image,
+    check_dimensions,
+)
+
+# Preprocessing settings for images sent to the vision model
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", "1568"))
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()  # JPEG or WEBP
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_GRAYSCALE = os.getenv("IMAGE_GRAYSCALE", "true").lower() == "true"
+IMAGE_AUTOCROP = os.getenv("IMAGE_AUTOCROP", "true").lower() == "true"
+IMAGE_CROP_PADDING = int(os.getenv("IMAGE_CROP_PADDING", "24"))
+# Pixels darker than this (0-255, after autocontrast) count as ink when cropping
+IMAGE_INK_THRESHOLD = int(os.getenv("IMAGE_INK_THRESHOLD", "128"))
+
+MIME_TYPES = {
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+}
+
+
+class ImagePreprocessingError(ValueError):
+    """Raised when an uploaded file cannot be decoded as an image"""
+
+
+@dataclass
+class PreprocessedImage:
+    data: bytes
+    mime_type: str
+    width: int
+    height: int
+    original_bytes: int
+    processed_bytes: int
+    # Quality gate scores of the photo (None when the gate is disabled)
+    quality: Optional[QualityReport] = None
+
+
+def find_ink_box(gray: Image.Image):
+    """Bounding box of the ink in a grayscale image, with padding (None if blank)"""
+    # Ink is dark on light paper: map ink to white so getbbox() finds it
+    mask = ImageOps.autocontrast(gray).point(lambda p: 255 if p < IMAGE_INK_THRESHOLD else 0)
+    bbox = mask.getbbox()
+    if not bbox:
+        return None
+
+    left, top, right, bottom = bbox
+    left = max(left - IMAGE_CROP_PADDING, 0)
+    top = max(top - IMAGE_CROP_PADDING, 0)
+    right = min(right + IMAGE_CROP_PADDING, gray.width)
+    bottom = min(bottom + IMAGE_CROP_PADDING, gray.height)
+    return (left, top, right, bottom)
+
+
+def preprocess_image(image_data: bytes) -> PreprocessedImage:
+    """
+    Normalize an uploaded photo before sending it to the vision model:
+    fix EXIF orientation, convert to grayscale, crop to the ink region,
+    cap the longest side and re-encode as JPEG/WebP.
+    Raises ImageQualityError for images that are not worth analyzing.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+    except Exception as e:
+        raise ImagePreprocessingError(f"Could not read image: {str(e)}")
+
+    # Reject oversized images from the header alone, before decoding any pixels
+    if QUALITY_GATE_ENABLED:
+        problems = check_dimensions(image.width, image.height)
+        if problems:
+            raise ImageQualityError(
+                QualityReport(width=image.width, height=image.height, problems=problems)
+            )
+
+    try:
+        # JPEGs can be decoded at 1/2, 1/4 or 1/8 scale (and straight to grayscale),
+        # which skips most of the decoding work for large photos. The box keeps
+        # both sides at least IMAGE_MAX_DIMENSION so cropping still has detail to spare.
+        image.draft("L" if IMAGE_GRAYSCALE else "RGB", (IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION))
+        image.load()
+    except Exception as e:
+        raise ImagePreprocessingError(f"Could not read image: {str(e)}")
+
+    # Phone photos are often stored sideways with an EXIF rotation flag
+    image = ImageOps.exif_transpose(image)
+
+    if IMAGE_GRAYSCALE:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+
+    gray = None
+    report = None
+    if QUALITY_GATE_ENABLED:
+        gray = image if image.mode == "L" else image.convert("L")
+        report = assess_image(gray)
+        if not report.passed:
+            raise ImageQualityError(report)
+
+    if IMAGE_AUTOCROP:
+        gray = gray or (image if image.mode == "L" else image.convert("L"))
+        ink_box = find_ink_box(gray)
+        if ink_box:
+            image = image.crop(ink_box)
+
+    image.thumbnail((IMAGE_MAX_DIMENSION, IMAGE_MAX_DIMENSION), Image.LANCZOS)
+
+    output_format = IMAGE_OUTPUT_FORMAT if IMAGE_OUTPUT_FORMAT in MIME_TYPES else "JPEG"
+    buffer = io.BytesIO()
+    image.save(buffer, format=output_format, quality=IMAGE_QUALITY, optimize=True)
+    processed = buffer.getvalue()
+
+    return PreprocessedImage(
+        data=processed,
+        mime_type=MIME_TYPES[output_format],
+        width=image.width,
+        height=image.height,
+        original_bytes=len(image_data),
+        processed_bytes=len(processed),
+        quality=report,
+    )
@@ -0,0 +1,120 @@
+import os
+from dataclasses import dataclass, field
+from typing import List
+import numpy as np
+from PIL import Image
+
+# Quality gate thresholds (tunable per deployment)
+QUALITY_GATE_ENABLED = os.getenv("QUALITY_GATE_ENABLED", "true").lower() == "true"
+QUALITY_MAX_PIXELS = int(os.getenv("QUALITY_MAX_PIXELS", str(50_000_000)))
+QUALITY_MIN_DIMENSION = int(os.getenv("QUALITY_MIN_DIMENSION", "64"))
+# Gray level of the paper (median pixel); darker photos are rejected
+QUALITY_MIN_BRIGHTNESS = float(os.getenv("QUALITY_MIN_BRIGHTNESS", "60"))
+# Gray-level gap between the paper and the darkest strokes
+QUALITY_MIN_CONTRAST = float(os.getenv("QUALITY_MIN_CONTRAST", "40"))
+# Share of pixels that look like ink
+QUALITY_MIN_INK_COVERAGE = float(os.getenv("QUALITY_MIN_INK_COVERAGE", "0.002"))
+QUALITY_MAX_INK_COVERAGE = float(os.getenv("QUALITY_MAX_INK_COVERAGE", "0.6"))
+# Variance of the Laplacian; low values mean a blurry photo
+QUALITY_MIN_SHARPNESS = float(os.getenv("QUALITY_MIN_SHARPNESS", "60"))
+# Images are scored on a thumbnail of this size so cost does not depend on the photo
+QUALITY_ANALYSIS_SIZE = int(os.getenv("QUALITY_ANALYSIS_SIZE", "512"))
+
+
+BLANK_IMAGE_MESSAGE = (
+    "No handwriting found: the page looks blank or the writing is too faint. "
+    "Write with a dark pen and make sure the text fills most of the photo."
+)
+
+
+@dataclass
+class QualityReport:
+    width: int
+    height: int
+    brightness: float = 0.0
+    contrast: float = 0.0
+    ink_coverage: float = 0.0
+    sharpness: float = 0.0
+    problems: List[str] = field(default_factory=list)
+
+    @property
+    def passed(self) -> bool:
+        return not self.problems
+
+
+class ImageQualityError(ValueError):
+    """Raised when an image is not worth sending to the vision model"""
+
+    def __init__(self, report: QualityReport):
+        self.report = report
+        super().__init__(" ".join(report.problems))
+
+
+def check_dimensions(width: int, height: int) -> List[str]:
+    """Cheap size checks that run before the image is decoded"""
+    problems = []
+    if width * height > QUALITY_MAX_PIXELS:
+        problems.append(
+            f"Image is too large ({width}x{height}). Please upload a photo under "
+            f"{QUALITY_MAX_PIXELS // 1_000_000} megapixels."
+        )
+    if min(width, height) < QUALITY_MIN_DIMENSION:
+        problems.append(
+            f"Image is too small ({width}x{height}). Please upload a photo at least "
+            f"{QUALITY_MIN_DIMENSION} pixels on each side."
+        )
+    return problems
+
+
+def laplacian_variance(pixels: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian, a standard focus measure"""
+    center = pixels[1:-1, 1:-1]
+    laplacian = (
+        pixels[:-2, 1:-1] + pixels[2:, 1:-1] + pixels[1:-1, :-2] + pixels[1:-1, 2:] - 4 * center
+    )
+    return float(laplacian.var())
+
+
+def assess_image(gray: Image.Image) -> QualityReport:
+    """
+    Score a grayscale image for contrast, ink coverage and sharpness.
+    Returns a report whose problems list is empty when the image looks usable.
+    """
+    report = QualityReport(width=gray.width, height=gray.height)
+    report.problems.extend(check_dimensions(gray.width, gray.height))
+    if report.problems:
+        return report
+
+    # Integer box reduction is several times cheaper than a resampling thumbnail
+    factor = max(gray.width, gray.height) // QUALITY_ANALYSIS_SIZE
+    small = gray.reduce(factor) if factor > 1 else gray
+
+    # Percentiles from Pillow's 256-bin histogram are much cheaper than sorting the pixels
+    cdf = np.cumsum(small.histogram())
+    total = cdf[-1]
+    ink = int(np.searchsorted(cdf, 0.001 * total))
+    paper = int(np.searchsorted(cdf, 0.5 * total))
+    report.brightness = float(paper)
+    report.contrast = float(paper - ink)
+
+    # Ink is anything closer to the darkest strokes than to the paper
+    ink_threshold = (ink + paper) // 2
+    report.ink_coverage = float(cdf[ink_threshold] / total) if report.contrast else 0.0
+    report.sharpness = laplacian_variance(np.asarray(small, dtype=np.float32))
+
+    if report.brightness < QUALITY_MIN_BRIGHTNESS:
+        report.problems.append(
+            "The photo is too dark to read. Take it in good light on plain white paper."
+        )
+    elif report.contrast < QUALITY_MIN_CONTRAST or report.ink_coverage < QUALITY_MIN_INK_COVERAGE:
+        report.problems.append(BLANK_IMAGE_MESSAGE)
+    elif report.ink_coverage > QUALITY_MAX_INK_COVERAGE:
+        report.problems.append(
+            "Too much of the photo is dark to pick out the writing. "
+            "Photograph just the handwriting on a plain light background."
+        )
+    elif report.sharpness < QUALITY_MIN_SHARPNESS:
+        report.problems.append(
+            "The photo is too blurry. Hold the camera steady, tap to focus and try again."
+        )
+    return report
@@ -0,0 +1,277 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from app.db import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+# Background analysis job settings
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", data_path("jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_MAX_DEPTH = int(os.getenv("JOB_QUEUE_MAX_DEPTH", "100"))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+JOB_RETENTION = float(os.getenv("JOB_RETENTION", str(24 * 3600)))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# A running job not renewed for this long is assumed to belong to a dead worker and is requeued;
+# live workers renew their jobs every third of it
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "180"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+TERMINAL_STATUSES = (COMPLETED, FAILED)
+
+
+class QueueFullError(Exception):
+    """Raised when the queue is at capacity; clients should retry later"""
+
+
+class JobQueue:
+    """
+    Persistent job queue backed by SQLite.
+    Jobs are claimed atomically, so workers in several processes can share
+    one queue, and queued or interrupted jobs are picked up again after a restart.
+    Workers make their SQLite calls in the thread pool: claiming can wait on
+    another process's write lock and reads the job's image.
+    """
+
+    def __init__(self, path: str):
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+        self._changed = {}
+        self._workers = []
+        self._active = set()
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                image BLOB,
+                result TEXT,
+                error TEXT,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                renewed_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "renewed_at" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN renewed_at REAL")
+
+    def submit(self, image_data: bytes) -> dict:
+        """Queue a new analysis job, enforcing the maximum queue depth"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                depth = self._conn.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()[0]
+                if depth >= JOB_QUEUE_MAX_DEPTH:
+                    raise QueueFullError(f"Job queue is full ({depth} queued)")
+                self._conn.execute(
+                    "INSERT INTO jobs (id, status, image, created_at) VALUES (?, ?, ?, ?)",
+                    (job_id, QUEUED, image_data, now),
+                )
+                # Drop finished jobs past their retention window
+                self._conn.execute(
+                    "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?",
+                    (COMPLETED, FAILED, now - JOB_RETENTION),
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        self._wakeup.set()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, status, result, error, attempts, created_at, started_at, finished_at FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def claim(self):
+        """Atomically move the oldest queued job to running; returns (id, image) or None"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                """
+                UPDATE jobs SET status = ?, started_at = ?, renewed_at = ?, attempts = attempts + 1
+                WHERE id = (SELECT id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1)
+                RETURNING id, image
+                """,
+                (RUNNING, now, now, QUEUED),
+            ).fetchone()
+        return (row["id"], row["image"]) if row else None
+
+    def renew(self, job_id: str):
+        """Extend the lease of a job this worker is still running"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET renewed_at = ? WHERE id = ? AND status = ?", (time.time(), job_id, RUNNING)
+            )
+
+    def complete(self, job_id: str, result: dict):
+        self._finish(job_id, COMPLETED, json.dumps(result), None)
+
+    def fail(self, job_id: str, error: str):
+        self._finish(job_id, FAILED, None, error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[str], error: Optional[str]):
+        with self._lock:
+            # The image is no longer needed once the job has finished
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, image = NULL, finished_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+        self._notify(job_id)
+
+    def recover(self):
+        """Requeue running jobs whose lease expired (their worker stopped or crashed)"""
+        now = time.time()
+        expired = now - JOB_LEASE_SECONDS
+        with self._lock:
+            # Jobs claimed before leases were renewed have no renewed_at
+            self._conn.execute(
+                "UPDATE jobs SET status = ? WHERE status = ? AND COALESCE(renewed_at, started_at) < ? AND attempts < ?",
+                (QUEUED, RUNNING, expired, JOB_MAX_ATTEMPTS),
+            )
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, image = NULL, finished_at = ? "
+                "WHERE status = ? AND COALESCE(renewed_at, started_at) < ?",
+                (FAILED, "Job was interrupted too many times", now, RUNNING, expired),
+            )
+
+    def _notify(self, job_id: str):
+        event = self._changed.pop(job_id, None)
+        if event:
+            event.set()
+
+    async def wait_for_change(self, job_id: str, timeout: float):
+        """Wait until a job changes in this process, or the timeout passes (for jobs run elsewhere)"""
+        event = self._changed.setdefault(job_id, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM jobs WHERE status = ?", (QUEUED,)
+            ).fetchone()[0]
+            latency = self._conn.execute(
+                """
+                SELECT AVG(started_at - created_at), AVG(finished_at - started_at), AVG(finished_at - created_at)
+                FROM (SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY finished_at DESC LIMIT 100)
+                """,
+                (COMPLETED, FAILED),
+            ).fetchone()
+        wait_avg, run_avg, total_avg = latency
+        return {
+            "depth": counts.get(QUEUED, 0),
+            "max_depth": JOB_QUEUE_MAX_DEPTH,
+            "running": counts.get(RUNNING, 0),
+            "completed": counts.get(COMPLETED, 0),
+            "failed": counts.get(FAILED, 0),
+            "workers": len(self._workers),
+            "oldest_queued_age_seconds": round(time.time() - oldest, 3) if oldest else 0.0,
+            "avg_queue_wait_seconds": round(wait_avg or 0.0, 3),
+            "avg_run_seconds": round(run_avg or 0.0, 3),
+            "avg_total_seconds": round(total_avg or 0.0, 3),
+        }
+
+    async def start(self, handler, workers: int = JOB_WORKERS):
+        """Start worker tasks that run handler(image_data) -> result dict for each job"""
+        await run_in_threadpool(self.recover)
+        self._wakeup = asyncio.Event()
+        for _ in range(workers):
+            self._workers.append(asyncio.create_task(self._worker(handler)))
+
+    async def stop(self):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        # Hand jobs interrupted by the shutdown back to the queue
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET status = ?, attempts = attempts - 1 WHERE id = ? AND status = ?",
+                [(QUEUED, job_id, RUNNING) for job_id in self._active],
+            )
+        self._active.clear()
+
+    async def _worker(self, handler):
+        while True:
+            try:
+                claimed = await run_in_threadpool(self.claim)
+                if claimed is None:
+                    await run_in_threadpool(self.recover)
+            except Exception:
+                # The database was locked or failed; try again on the next poll
+                logger.exception("Job queue poll failed")
+                claimed = None
+            if claimed is None:
+                # Sleep until a local submit, or poll for jobs queued by other processes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            job_id, image_data = claimed
+            self._active.add(job_id)
+            self._notify(job_id)
+            await self._run(handler, job_id, image_data)
+            self._active.discard(job_id)
+
+    async def _run(self, handler, job_id: str, image_data: bytes):
+        """Run one claimed job, renewing its lease until it finishes, and store the outcome"""
+        renewing = asyncio.create_task(self._renew_lease(job_id))
+        try:
+            result = await handler(image_data)
+            outcome = (self.complete, job_id, result)
+        except asyncio.CancelledError:
+            # stop() requeues the job; after a crash recover() does once the lease expires
+            raise
+        except Exception as e:
+            outcome = (self.fail, job_id, getattr(e, "detail", None) or str(e))
+        finally:
+            renewing.cancel()
+        try:
+            await run_in_threadpool(*outcome)
+        except Exception:
+            # Left running; recover() requeues it once the lease expires
+            logger.exception("Could not store the outcome of job %s", job_id)
+
+    async def _renew_lease(self, job_id: str):
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            try:
+                await run_in_threadpool(self.renew, job_id)
+            except Exception:
+                logger.exception("Could not renew the lease of job %s", job_id)
+
+
+job_queue = JobQueue(JOB_QUEUE_PATH)
@@ -0,0 +1,164 @@
+import math
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+# Search tuning
+# Newest matches ranked per query; broader queries rank only the most recent letters
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES", "1000"))
+SEARCH_DF_CACHE_SIZE = int(os.getenv("SEARCH_DF_CACHE_SIZE", "10000"))
+SEARCH_DF_TTL = float(os.getenv("SEARCH_DF_TTL", "300"))
+
+# Longest prefix with its own FTS5 prefix index (must match prefix= in the schema)
+MAX_INDEXED_PREFIX = 6
+# BM25 parameters and column weights, as in FTS5's bm25(): titles count ten times as much
+BM25_K1 = 1.2
+BM25_B = 0.75
+TITLE_WEIGHT = 10.0
+CONTENT_WEIGHT = 1.0
+
+WORD_RE = re.compile(r"\w+")
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics, like the unicode61 tokenizer with remove_diacritics"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def tokenize(text: str) -> List[str]:
+    return WORD_RE.findall(fold(text))
+
+
+@dataclass
+class SearchQuery:
+    """
+    Parsed search words: every word must match, and the last one matches
+    as a prefix so results update while the user is typing.
+    """
+    terms: List[str]
+    prefix: Optional[str]
+
+    @classmethod
+    def parse(cls, text: str) -> Optional["SearchQuery"]:
+        words = tokenize(text)
+        if not words:
+            return None
+        # Repeated words add nothing to an AND query
+        terms = list(dict.fromkeys(words[:-1]))
+        return cls(terms=[term for term in terms if term != words[-1]], prefix=words[-1])
+
+    def match_expression(self) -> str:
+        """
+        FTS5 expression for the words. Long prefixes are cut to the longest
+        indexed prefix so they stay index lookups; rank() re-checks the rest.
+        """
+        phrases = [f'"{term}"' for term in self.terms]
+        phrases.append(f'"{self.prefix[:MAX_INDEXED_PREFIX]}"*')
+        return "{title content} : (" + " ".join(phrases) + ")"
+
+    def phrase_keys(self) -> List[str]:
+        return self.terms + [self.prefix + "*"]
+
+    def __post_init__(self):
+        # Whole words starting with any query word; finditer runs in C over the text
+        words = sorted(set(self.terms + [self.prefix]), key=len, reverse=True)
+        self._pattern = re.compile(r"\b(?:" + "|".join(map(re.escape, words)) + r")\w*")
+
+    def frequencies(self, text: str) -> Dict[str, int]:
+        """Occurrences of each query word in already folded text"""
+        counts = dict.fromkeys(self.phrase_keys(), 0)
+        prefix_key = self.prefix + "*"
+        for word in self._pattern.findall(text):
+            if word in counts:
+                counts[word] += 1
+            if word.startswith(self.prefix):
+                counts[prefix_key] += 1
+        return counts
+
+
+class DocumentFrequencies:
+    """
+    Cached number of letters containing each search word, for BM25's IDF.
+    Counting walks the word's whole posting list, so each count is reused
+    for SEARCH_DF_TTL seconds instead of being recomputed on every query
+    (which is what makes FTS5's own bm25() slow for common words).
+    """
+
+    def __init__(self, max_entries: int = SEARCH_DF_CACHE_SIZE, ttl: float = SEARCH_DF_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, conn, key: str) -> int:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        phrase = f'"{key[:-1][:MAX_INDEXED_PREFIX]}"*' if key.endswith("*") else f'"{key}"'
+        count = conn.execute(
+            "SELECT COUNT(*) FROM letters_fts WHERE letters_fts MATCH ?",
+            ("{title content} : " + phrase,),
+        ).fetchone()[0]
+
+        with self._lock:
+            self._entries[key] = (count, now + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return count
+
+
+def rank(query: SearchQuery, candidates: List[dict], total_letters: int, frequencies: Dict[str, int]) -> List[dict]:
+    """
+    Keep the candidates that really contain every word and order them by
+    BM25 over title and content, newest first among equal scores.
+    """
+    scored = []
+    for letter in candidates:
+        title = fold(letter["title"])
+        content = fold(letter["content"])
+        title_counts = query.frequencies(title)
+        content_counts = query.frequencies(content)
+        if any(title_counts[key] + content_counts[key] == 0 for key in title_counts):
+            continue
+        # Lengths in characters: only their ratio to the average matters
+        scored.append((letter, title_counts, content_counts, len(title) or 1, len(content) or 1))
+    if not scored:
+        return []
+
+    average_title = sum(item[3] for item in scored) / len(scored) or 1
+    average_content = sum(item[4] for item in scored) / len(scored) or 1
+
+    def column_score(count: int, length: int, average: float) -> float:
+        return count * (BM25_K1 + 1) / (count + BM25_K1 * (1 - BM25_B + BM25_B * length / average))
+
+    idf = {}
+    for key, df in frequencies.items():
+        idf[key] = max(math.log((total_letters - df + 0.5) / (df + 0.5)), 1e-6)
+
+    results = []
+    for letter, title_counts, content_counts, title_length, content_length in scored:
+        score = 0.0
+        for key in title_counts:
+            score += idf[key] * (
+                TITLE_WEIGHT * column_score(title_counts[key], title_length, average_title)
+                + CONTENT_WEIGHT * column_score(content_counts[key], content_length, average_content)
+            )
+        results.append((score, letter["id"], letter))
+    results.sort(key=lambda item: (item[0], item[1]), reverse=True)
+    return [letter for _, _, letter in results]
+
+
+document_frequencies = DocumentFrequencies()
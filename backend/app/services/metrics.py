@@ -0,0 +1,237 @@
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Set to false to stop recording (the /metrics endpoint then reports nothing new)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Bucket upper bounds in seconds: sub-millisecond stages up to slow vision calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Bucket upper bounds in bytes: small processed images up to full-size uploads
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Metric:
+    """A named metric family with a fixed set of label names"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return self.header() + [
+            f"{self.name}{format_labels(self.label_names, labels)} {format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Histogram(Metric):
+    """
+    Fixed-bucket histogram. An observation is one bisect and two additions,
+    so it is cheap enough to record on every request; cumulative bucket
+    counts are only built when /metrics is scraped.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+        # Per label set: [count per bucket (last is +Inf)], sum
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    @contextmanager
+    def time(self, *labels: str):
+        """Observe the wall time of a block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = [(labels, list(counts), total[0]) for labels, (counts, total) in self._series.items()]
+        lines = self.header()
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, labels)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """
+    Metric families plus collectors that read gauges (queue depth, breaker
+    state, ...) from existing stats at scrape time, rendered in the
+    Prometheus text exposition format. Values are per process.
+    """
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, labels, buckets))
+
+    def collector(self, collect: Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]):
+        """Register collect() yielding (name, help, labels, value) gauge samples"""
+        self._collectors.append(collect)
+        return collect
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        gauges: Dict[str, Tuple[str, List[str]]] = {}
+        for collect in self._collectors:
+            try:
+                samples = list(collect())
+            except Exception:
+                logger.exception("Metrics collector %s failed", getattr(collect, "__name__", collect))
+                continue
+            for name, help_text, labels, value in samples:
+                label_text = format_labels(tuple(labels), tuple(str(v) for v in labels.values()))
+                gauges.setdefault(name, (help_text, []))[1].append(f"{name}{label_text} {format_value(value)}")
+        for name, (help_text, samples) in gauges.items():
+            lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} gauge", *samples])
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.counter(
+    "letterbuddy_http_requests_total", "HTTP requests by route template and status", ("method", "route", "status")
+)
+http_request_seconds = registry.histogram(
+    "letterbuddy_http_request_duration_seconds", "HTTP request latency by route template", ("method", "route")
+)
+stage_seconds = registry.histogram(
+    "letterbuddy_handwriting_stage_duration_seconds",
+    "Time spent in each stage of the handwriting analysis pipeline",
+    ("stage",),
+)
+payload_bytes = registry.histogram(
+    "letterbuddy_handwriting_payload_bytes",
+    "Image sizes: raw upload, preprocessed image and base64 data URL sent upstream",
+    ("kind",),
+    buckets=SIZE_BUCKETS,
+)
+compressed_bytes = registry.counter(
+    "letterbuddy_http_compressed_bytes_total",
+    "Body bytes of compressed responses before and after compression",
+    ("encoding", "stage"),
+)
+upstream_tokens = registry.counter(
+    "letterbuddy_upstream_tokens_total", "Tokens reported by OpenAI usage", ("route", "kind")
+)
+errors = registry.counter(
+    "letterbuddy_errors_total", "Errors by where they happened and their class", ("source", "error")
+)
+
+
+def stage(name: str):
+    """Time one stage of the analysis pipeline: `with stage("preprocess"): ...`"""
+    return stage_seconds.time(name)
+
+
+def record_usage(route: str, usage):
+    """Count the tokens of an OpenAI response's usage (None for streams without usage)"""
+    if usage is None:
+        return
+    for kind in ("prompt_tokens", "completion_tokens"):
+        count = getattr(usage, kind, None)
+        if count:
+            upstream_tokens.inc(route, kind.replace("_tokens", ""), amount=count)
+    # Prompt tokens OpenAI served from its prompt cache (also counted in prompt)
+    cached = getattr(getattr(usage, "prompt_tokens_details", None), "cached_tokens", None)
+    if cached:
+        upstream_tokens.inc(route, "cached_prompt", amount=cached)
+
+
+def record_error(source: str, error: BaseException):
+    errors.inc(source, type(error).__name__)
+
+
+def route_label(scope) -> Optional[str]:
+    """The matched route template (/letters/{letter_id}), so labels stay bounded"""
+    # Routes from included routers are matched through a context that knows their prefix
+    route = scope.get("fastapi", {}).get("effective_route_context") or scope.get("route")
+    return getattr(route, "path", None)
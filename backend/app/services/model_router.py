@@ -0,0 +1,165 @@
+import os
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+from app.services.image_preprocessing import PreprocessedImage
+
+# Model tiers: the small model takes easy requests, the large one the rest and escalations
+OPENAI_MODEL_LARGE = os.getenv("OPENAI_MODEL_LARGE", "gpt-4o")
+OPENAI_MODEL_SMALL = os.getenv("OPENAI_MODEL_SMALL", "gpt-4o-mini")
+# Set to false to send every call to the large model at high detail, as before routing
+MODEL_ROUTING_ENABLED = os.getenv("MODEL_ROUTING_ENABLED", "true").lower() == "true"
+# Photos at least this sharp and contrasty (quality gate scores) count as clean
+ROUTING_CLEAN_SHARPNESS = float(os.getenv("ROUTING_CLEAN_SHARPNESS", "300"))
+ROUTING_CLEAN_CONTRAST = float(os.getenv("ROUTING_CLEAN_CONTRAST", "100"))
+# Images no larger than this are sent at low detail: OpenAI would scale them to 512px anyway
+ROUTING_LOW_DETAIL_MAX_SIDE = int(os.getenv("ROUTING_LOW_DETAIL_MAX_SIDE", "512"))
+# Small-model analyses less confident than this are redone by the large model
+ROUTING_ESCALATE_CONFIDENCE = float(os.getenv("ROUTING_ESCALATE_CONFIDENCE", "0.6"))
+# When the large model's recent p95 latency (seconds) is over this, photos that are
+# not clean also try the small model first (0 disables)
+ROUTING_LARGE_LATENCY_SLO = float(os.getenv("ROUTING_LARGE_LATENCY_SLO", "0"))
+
+# Completion budgets
+ANALYSIS_MAX_TOKENS = int(os.getenv("ANALYSIS_MAX_TOKENS", "1000"))
+ANALYSIS_SMALL_MAX_TOKENS = int(os.getenv("ANALYSIS_SMALL_MAX_TOKENS", "700"))
+# Tokens per practice sentence by difficulty, plus room for the tips
+PRACTICE_SENTENCE_TOKENS = {"beginner": 25, "intermediate": 35, "advanced": 50}
+PRACTICE_TIPS_TOKENS = 120
+
+LATENCY_WINDOW = 200
+
+
+@dataclass(frozen=True)
+class ModelChoice:
+    """How one upstream call is made, and why"""
+    model: str
+    max_tokens: int
+    reason: str
+    detail: Optional[str] = None  # Image detail for vision calls: "low" or "high"
+
+    @property
+    def is_small(self) -> bool:
+        return self.model == OPENAI_MODEL_SMALL and self.model != OPENAI_MODEL_LARGE
+
+
+class ChoiceOutcomes:
+    """Counters, latencies and token usage for one (route, model, detail, reason)"""
+
+    def __init__(self):
+        self.calls = 0
+        self.escalated = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+
+class ModelRouter:
+    """
+    Picks the model, image detail and completion budget for each upstream
+    call, and records what each choice cost so the thresholds can be tuned:
+    - analysis: clean photos (sharp, good contrast) go to the small model,
+      others to the large one; small images are sent at low detail. A
+      small-model answer with low confidence is redone by the large model.
+    - practice sentences: beginner and intermediate go to the small model,
+      advanced to the large one; the budget scales with the sentence count.
+      Small-model answers with too few sentences are redone by the large model.
+    """
+
+    def __init__(self, enabled: bool = MODEL_ROUTING_ENABLED):
+        self.enabled = enabled
+        self._outcomes: Dict[Tuple[str, str, Optional[str], str], ChoiceOutcomes] = {}
+        self._model_latencies: Dict[str, deque] = {}
+
+    def analysis(self, processed: PreprocessedImage, allow_small: bool = True) -> ModelChoice:
+        """Choose how to analyze an image; allow_small=False when an answer cannot be escalated"""
+        detail = "low" if self.enabled and max(processed.width, processed.height) <= ROUTING_LOW_DETAIL_MAX_SIDE else "high"
+        if not self.enabled:
+            return ModelChoice(OPENAI_MODEL_LARGE, ANALYSIS_MAX_TOKENS, "routing disabled", detail)
+        if not allow_small:
+            return ModelChoice(OPENAI_MODEL_LARGE, ANALYSIS_MAX_TOKENS, "no escalation possible", detail)
+
+        quality = processed.quality
+        if quality is not None and quality.sharpness >= ROUTING_CLEAN_SHARPNESS and quality.contrast >= ROUTING_CLEAN_CONTRAST:
+            return ModelChoice(OPENAI_MODEL_SMALL, ANALYSIS_SMALL_MAX_TOKENS, "clean image", detail)
+        if self.large_model_slow():
+            return ModelChoice(OPENAI_MODEL_SMALL, ANALYSIS_SMALL_MAX_TOKENS, "large model slow", detail)
+        return ModelChoice(OPENAI_MODEL_LARGE, ANALYSIS_MAX_TOKENS, "unclear image", detail)
+
+    def escalate_analysis(self, choice: ModelChoice, confidence: Optional[float], detected_letters) -> Optional[ModelChoice]:
+        """
+        The large-model choice to redo a small-model analysis with when it
+        found no letters or reported (or left out) a low confidence
+        """
+        if not choice.is_small:
+            return None
+        if not detected_letters:
+            return ModelChoice(OPENAI_MODEL_LARGE, ANALYSIS_MAX_TOKENS, "escalated: no letters", "high")
+        if confidence is None or confidence < ROUTING_ESCALATE_CONFIDENCE:
+            return ModelChoice(OPENAI_MODEL_LARGE, ANALYSIS_MAX_TOKENS, "escalated: low confidence", "high")
+        return None
+
+    def practice(self, difficulty: str, sentence_count: int) -> ModelChoice:
+        max_tokens = sentence_count * PRACTICE_SENTENCE_TOKENS.get(difficulty, 50) + PRACTICE_TIPS_TOKENS
+        if not self.enabled:
+            return ModelChoice(OPENAI_MODEL_LARGE, 500, "routing disabled")
+        if difficulty == "advanced":
+            return ModelChoice(OPENAI_MODEL_LARGE, max_tokens, "advanced vocabulary")
+        return ModelChoice(OPENAI_MODEL_SMALL, max_tokens, f"{difficulty} sentences")
+
+    def escalate_practice(self, choice: ModelChoice, sentences: int, sentence_count: int) -> Optional[ModelChoice]:
+        if not choice.is_small or sentences >= sentence_count:
+            return None
+        return ModelChoice(OPENAI_MODEL_LARGE, choice.max_tokens, "escalated: too few sentences")
+
+    def large_model_slow(self) -> bool:
+        latencies = self._model_latencies.get(OPENAI_MODEL_LARGE)
+        if not ROUTING_LARGE_LATENCY_SLO or not latencies or len(latencies) < 20:
+            return False
+        ordered = sorted(latencies)
+        return ordered[int(len(ordered) * 0.95)] > ROUTING_LARGE_LATENCY_SLO
+
+    def record(self, route: str, choice: ModelChoice, seconds: float, usage=None):
+        """Record the latency and token usage of a call made with choice"""
+        key = (route, choice.model, choice.detail, choice.reason)
+        outcomes = self._outcomes.get(key)
+        if outcomes is None:
+            outcomes = self._outcomes[key] = ChoiceOutcomes()
+        outcomes.calls += 1
+        outcomes.latencies.append(seconds)
+        if usage is not None:
+            outcomes.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+            outcomes.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        self._model_latencies.setdefault(choice.model, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def record_escalation(self, route: str, choice: ModelChoice):
+        """Count a recorded call whose answer was not good enough and was redone"""
+        key = (route, choice.model, choice.detail, choice.reason)
+        if key in self._outcomes:
+            self._outcomes[key].escalated += 1
+
+    def stats(self) -> dict:
+        decisions = []
+        for (route, model, detail, reason), outcomes in self._outcomes.items():
+            ordered = sorted(outcomes.latencies)
+            decisions.append({
+                "route": route,
+                "model": model,
+                "detail": detail,
+                "reason": reason,
+                "calls": outcomes.calls,
+                "escalated": outcomes.escalated,
+                "avg_prompt_tokens": round(outcomes.prompt_tokens / outcomes.calls, 1),
+                "avg_completion_tokens": round(outcomes.completion_tokens / outcomes.calls, 1),
+                "p50_seconds": round(ordered[len(ordered) // 2], 3) if ordered else None,
+                "p95_seconds": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3) if ordered else None,
+            })
+        return {
+            "enabled": self.enabled,
+            "models": {"large": OPENAI_MODEL_LARGE, "small": OPENAI_MODEL_SMALL},
+            "escalate_below_confidence": ROUTING_ESCALATE_CONFIDENCE,
+            "decisions": decisions,
+        }
+
+
+model_router = ModelRouter()
@@ -0,0 +1,61 @@
+import os
+import httpx
+import openai
+
+# Connection pool and timeout settings for upstream OpenAI calls
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("OPENAI_MAX_KEEPALIVE_CONNECTIONS", "10"))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+
+# Per-call timeouts (seconds)
+ANALYZE_TIMEOUT = float(os.getenv("OPENAI_ANALYZE_TIMEOUT", "60"))
+PRACTICE_SENTENCES_TIMEOUT = float(os.getenv("OPENAI_PRACTICE_SENTENCES_TIMEOUT", "30"))
+
+
+def create_openai_client():
+    """
+    Build an async OpenAI client sharing one bounded HTTP connection pool.
+    Returns None when no API key is configured.
+    """
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        return None
+
+    http_client = openai.DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        timeout=httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+    return openai.AsyncOpenAI(
+        api_key=api_key,
+        base_url=os.getenv("OPENAI_BASE_URL") or None,
+        http_client=http_client,
+        # Retries, with backoff, hedging and a circuit breaker, happen in app.services.resilience
+        max_retries=0,
+    )
+
+
+_openai_client = None
+
+
+def get_openai_client():
+    """
+    The shared client, built on first use rather than at import, so every
+    worker process builds its own pool inside its own event loop.
+    Returns None when no API key is configured.
+    """
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = create_openai_client()
+    return _openai_client
+
+
+async def close_openai_client():
+    """Close the shared HTTP connection pool on shutdown"""
+    global _openai_client
+    if _openai_client:
+        await _openai_client.close()
+        _openai_client = None
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import os
+import string
+import threading
+from fastapi.concurrency import run_in_threadpool
+from app.db import connect, data_path
+
+logger = logging.getLogger(__name__)
+
+# Practice sentence pool settings
+PRACTICE_CORPUS_PATH = os.getenv("PRACTICE_CORPUS_PATH", data_path("practice_corpus.db"))
+PRACTICE_POOL_TARGET = int(os.getenv("PRACTICE_POOL_TARGET", "40"))
+PRACTICE_POOL_LOW_WATER = int(os.getenv("PRACTICE_POOL_LOW_WATER", "15"))
+PRACTICE_REFILL_BATCH = int(os.getenv("PRACTICE_REFILL_BATCH", "10"))
+# Most sentences one request may ask for
+PRACTICE_MAX_SENTENCES = int(os.getenv("PRACTICE_MAX_SENTENCES", "20"))
+# A pooled sentence must contain the target letter at least this many times
+MIN_LETTER_OCCURRENCES = int(os.getenv("PRACTICE_MIN_LETTER_OCCURRENCES", "3"))
+
+LETTERS = string.ascii_uppercase
+DIFFICULTIES = ["beginner", "intermediate", "advanced"]
+
+
+class PracticeCorpus:
+    """
+    Local pool of generated practice sentences and tips per (letter, difficulty).
+    Requests are answered from the pool; OpenAI is only used to fill it.
+    Methods block on SQLite, so async callers run them in the thread pool.
+    """
+
+    def __init__(self, path: str):
+        self._conn = connect(path)
+        self._lock = threading.Lock()
+        self._refilling = set()
+        self._tasks = set()
+        self.served_from_pool = 0
+        self.live_requests = 0
+        self.refills = 0
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS practice_sentences (
+                letter TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                sentence TEXT NOT NULL,
+                letter_count INTEGER NOT NULL,
+                PRIMARY KEY (letter, difficulty, sentence)
+            );
+            CREATE TABLE IF NOT EXISTS practice_tips (
+                letter TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                tip TEXT NOT NULL,
+                PRIMARY KEY (letter, difficulty, tip)
+            );
+            """
+        )
+
+    @staticmethod
+    def is_poolable(letter: str, difficulty: str) -> bool:
+        return letter in LETTERS and difficulty in DIFFICULTIES
+
+    def add(self, letter: str, difficulty: str, sentences, tips) -> int:
+        """Store generated content, keeping only sentences that use the letter often enough"""
+        if not self.is_poolable(letter, difficulty):
+            return 0
+
+        rows = []
+        for sentence in sentences:
+            letter_count = sentence.upper().count(letter)
+            if letter_count >= MIN_LETTER_OCCURRENCES:
+                rows.append((letter, difficulty, sentence, letter_count))
+
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO practice_sentences (letter, difficulty, sentence, letter_count) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO practice_tips (letter, difficulty, tip) VALUES (?, ?, ?)",
+                [(letter, difficulty, tip) for tip in tips],
+            )
+            self._conn.execute("COMMIT")
+            return self._conn.total_changes - before
+
+    def size(self, letter: str, difficulty: str) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM practice_sentences WHERE letter = ? AND difficulty = ?",
+                (letter, difficulty),
+            ).fetchone()[0]
+
+    def pick(self, letter: str, difficulty: str, count: int):
+        """
+        Pick random pooled sentences and tips.
+        Returns (sentences, tips), or None when the pool cannot satisfy the request.
+        """
+        if not self.is_poolable(letter, difficulty):
+            self.live_requests += 1
+            return None
+
+        with self._lock:
+            sentences = [
+                row[0] for row in self._conn.execute(
+                    """
+                    SELECT sentence FROM practice_sentences
+                    WHERE letter = ? AND difficulty = ? AND letter_count >= ?
+                    ORDER BY RANDOM() LIMIT ?
+                    """,
+                    (letter, difficulty, MIN_LETTER_OCCURRENCES, count),
+                )
+            ]
+            tips = [
+                row[0] for row in self._conn.execute(
+                    "SELECT tip FROM practice_tips WHERE letter = ? AND difficulty = ? ORDER BY RANDOM() LIMIT 5",
+                    (letter, difficulty),
+                )
+            ]
+
+        if len(sentences) < count:
+            self.live_requests += 1
+            return None
+
+        self.served_from_pool += 1
+        return sentences, tips
+
+    async def refill(self, letter: str, difficulty: str, generate):
+        """Top up one pool to the target size using generate(letter, difficulty, count)"""
+        key = (letter, difficulty)
+        if key in self._refilling:
+            return
+        self._refilling.add(key)
+        try:
+            attempts = 0
+            while await run_in_threadpool(self.size, letter, difficulty) < PRACTICE_POOL_TARGET and attempts < 5:
+                attempts += 1
+                sentences, tips = await generate(letter, difficulty, PRACTICE_REFILL_BATCH)
+                self.refills += 1
+                await run_in_threadpool(self.add, letter, difficulty, sentences, tips)
+        finally:
+            self._refilling.discard(key)
+
+    async def schedule_refill(self, letter: str, difficulty: str, generate):
+        """Start a background refill when a pool drops below the low-water mark"""
+        if (letter, difficulty) in self._refilling:
+            return
+        if await run_in_threadpool(self.size, letter, difficulty) >= PRACTICE_POOL_LOW_WATER:
+            return
+
+        task = asyncio.create_task(self._refill_quietly(letter, difficulty, generate))
+        # Keep a reference so the task is not garbage collected mid-flight
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill_quietly(self, letter: str, difficulty: str, generate):
+        try:
+            await self.refill(letter, difficulty, generate)
+        except Exception:
+            logger.exception("Background refill failed for %s/%s", letter, difficulty)
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT letter, difficulty, COUNT(*) FROM practice_sentences GROUP BY letter, difficulty"
+            ).fetchall()
+        return {
+            "pools": {f"{letter}/{difficulty}": count for letter, difficulty, count in rows},
+            "pool_target": PRACTICE_POOL_TARGET,
+            "low_water": PRACTICE_POOL_LOW_WATER,
+            "served_from_pool": self.served_from_pool,
+            "live_requests": self.live_requests,
+            "refill_calls": self.refills,
+        }
+
+
+async def warm_up(corpus: PracticeCorpus, generate, letters=LETTERS, difficulties=DIFFICULTIES, concurrency: int = 4):
+    """Fill every (letter, difficulty) pool up to the target size"""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fill(letter, difficulty):
+        async with semaphore:
+            try:
+                await corpus.refill(letter, difficulty, generate)
+            except Exception:
+                logger.exception("Warm-up failed for %s/%s", letter, difficulty)
+            logger.info("%s/%s: %d sentences", letter, difficulty, await run_in_threadpool(corpus.size, letter, difficulty))
+
+    await asyncio.gather(*(fill(letter, difficulty) for letter in letters for difficulty in difficulties))
+
+
+practice_corpus = PracticeCorpus(PRACTICE_CORPUS_PATH)
@@ -0,0 +1,289 @@
+import json
+import os
+import time
+from typing import Optional
+from app.db import ConnectionPool
+from app.services.repository import database
+
+# Handwriting progress settings
+# Weight of the newest analysis in the rolling averages
+PROGRESS_EWMA_ALPHA = float(os.getenv("PROGRESS_EWMA_ALPHA", "0.2"))
+# Letters reported as needing work once their rolling flag rate reaches this
+PROGRESS_LETTER_THRESHOLD = float(os.getenv("PROGRESS_LETTER_THRESHOLD", "0.15"))
+PROGRESS_MAX_LETTERS = int(os.getenv("PROGRESS_MAX_LETTERS", "5"))
+
+# handwriting_quality labels from the analysis prompt, as scores in [0, 1]
+QUALITY_SCORES = {
+    "excellent": 1.0,
+    "good": 0.75,
+    "fair": 0.5,
+    "needs improvement": 0.25,
+    "poor": 0.0,
+}
+
+SECONDS_PER_DAY = 86400
+
+# Every analysis is kept in handwriting_analyses. The other two tables are
+# aggregates updated in the same transaction as each insert, so reading a
+# user's progress is a primary-key lookup however long the history gets.
+# analysis_key is the analysis cache key (prompt + image hash): a user's
+# re-uploads of the same photo are stored once.
+PROGRESS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS handwriting_analyses (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    handwriting_quality TEXT NOT NULL,
+    quality_score REAL,
+    confidence_score REAL NOT NULL,
+    letters_to_improve TEXT NOT NULL,
+    result TEXT NOT NULL,
+    analysis_key TEXT
+);
+CREATE INDEX IF NOT EXISTS handwriting_analyses_user_id ON handwriting_analyses (user_id, id);
+CREATE TABLE IF NOT EXISTS handwriting_progress (
+    user_id INTEGER PRIMARY KEY,
+    analysis_count INTEGER NOT NULL,
+    quality_count INTEGER NOT NULL,
+    quality_sum REAL NOT NULL,
+    quality_recent REAL,
+    confidence_sum REAL NOT NULL,
+    confidence_recent REAL NOT NULL,
+    current_streak INTEGER NOT NULL,
+    longest_streak INTEGER NOT NULL,
+    last_day INTEGER NOT NULL,
+    first_at REAL NOT NULL,
+    last_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS handwriting_letter_progress (
+    user_id INTEGER NOT NULL,
+    letter TEXT NOT NULL,
+    improve_count INTEGER NOT NULL,
+    flag_rate REAL NOT NULL,
+    flagged_at_analysis INTEGER NOT NULL,
+    last_flagged_at REAL NOT NULL,
+    PRIMARY KEY (user_id, letter)
+) WITHOUT ROWID;
+"""
+# Run after adding analysis_key to databases created before it existed
+PROGRESS_INDEXES = """
+CREATE UNIQUE INDEX IF NOT EXISTS handwriting_analyses_user_key
+    ON handwriting_analyses (user_id, analysis_key) WHERE analysis_key IS NOT NULL;
+"""
+
+
+def quality_score(label: str) -> Optional[float]:
+    return QUALITY_SCORES.get(label.strip().lower())
+
+
+def ewma(previous: Optional[float], value: float, alpha: float = PROGRESS_EWMA_ALPHA) -> float:
+    return value if previous is None else previous + alpha * (value - previous)
+
+
+def decayed_flag_rate(rate: float, flagged_at: int, analysis_count: int, alpha: float = PROGRESS_EWMA_ALPHA) -> float:
+    """
+    A letter's rolling flag rate as of the user's latest analysis.
+    Analyses that did not flag the letter each shrink the rate by (1 - alpha);
+    they are applied here in one step instead of touching every letter on write.
+    """
+    return rate * (1 - alpha) ** (analysis_count - flagged_at)
+
+
+class ProgressStore:
+    """
+    Per-user handwriting history with incrementally maintained aggregates:
+    analysis counts, cumulative and rolling quality/confidence averages,
+    daily streaks and per-letter improvement counts.
+    """
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+        with pool.connection() as conn:
+            conn.executescript(PROGRESS_SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(handwriting_analyses)")}
+            if "analysis_key" not in columns:
+                conn.execute("ALTER TABLE handwriting_analyses ADD COLUMN analysis_key TEXT")
+            conn.executescript(PROGRESS_INDEXES)
+        self._merge_letter_case()
+
+    def _merge_letter_case(self):
+        """
+        Letters used to be stored as the model wrote them, so "b" and "B"
+        could be separate rows; fold each into its upper-case row
+        """
+        with self._pool.transaction() as conn:
+            rows = conn.execute(
+                "SELECT * FROM handwriting_letter_progress WHERE letter != UPPER(letter)"
+            ).fetchall()
+            for row in rows:
+                letter = row["letter"].upper()
+                other = conn.execute(
+                    "SELECT * FROM handwriting_letter_progress WHERE user_id = ? AND letter = ?",
+                    (row["user_id"], letter),
+                ).fetchone()
+                # The most recently flagged row carries the rolling rate
+                latest = row if other is None or row["flagged_at_analysis"] > other["flagged_at_analysis"] else other
+                conn.execute(
+                    "INSERT OR REPLACE INTO handwriting_letter_progress "
+                    "(user_id, letter, improve_count, flag_rate, flagged_at_analysis, last_flagged_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (row["user_id"], letter, row["improve_count"] + (other["improve_count"] if other else 0),
+                     latest["flag_rate"], latest["flagged_at_analysis"], latest["last_flagged_at"]),
+                )
+                conn.execute(
+                    "DELETE FROM handwriting_letter_progress WHERE user_id = ? AND letter = ?",
+                    (row["user_id"], row["letter"]),
+                )
+
+    def record(self, user_id: int, result: dict, now: Optional[float] = None, analysis_key: Optional[str] = None) -> bool:
+        """
+        Store one analysis result and fold it into the user's aggregates.
+        Returns False, changing nothing, when the user already has an
+        analysis stored under analysis_key (the same photo again).
+        """
+        now = time.time() if now is None else now
+        day = int(now // SECONDS_PER_DAY)
+        quality = quality_score(result["handwriting_quality"])
+        confidence = float(result["confidence_score"])
+        # A letter counts once per analysis however often the model repeats it
+        letters = list(dict.fromkeys(
+            letter.strip().upper() for letter in result["letters_to_improve"] if letter.strip()
+        ))
+
+        with self._pool.transaction() as conn:
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO handwriting_analyses (user_id, created_at, handwriting_quality, quality_score, "
+                "confidence_score, letters_to_improve, result, analysis_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (user_id, now, result["handwriting_quality"], quality, confidence,
+                 json.dumps(letters), json.dumps(result), analysis_key),
+            ).rowcount
+            if not inserted:
+                return False
+            row = conn.execute("SELECT * FROM handwriting_progress WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                count, streak, longest = 1, 1, 1
+                conn.execute(
+                    "INSERT INTO handwriting_progress (user_id, analysis_count, quality_count, quality_sum, "
+                    "quality_recent, confidence_sum, confidence_recent, current_streak, longest_streak, "
+                    "last_day, first_at, last_at) VALUES (?, 1, ?, ?, ?, ?, ?, 1, 1, ?, ?, ?)",
+                    (user_id, int(quality is not None), quality or 0.0, quality, confidence, confidence,
+                     day, now, now),
+                )
+            else:
+                count = row["analysis_count"] + 1
+                # Streaks count consecutive (UTC) days with at least one analysis
+                if day <= row["last_day"]:
+                    streak = row["current_streak"]
+                elif day == row["last_day"] + 1:
+                    streak = row["current_streak"] + 1
+                else:
+                    streak = 1
+                longest = max(row["longest_streak"], streak)
+                conn.execute(
+                    "UPDATE handwriting_progress SET analysis_count = ?, quality_count = ?, quality_sum = ?, "
+                    "quality_recent = ?, confidence_sum = ?, confidence_recent = ?, current_streak = ?, "
+                    "longest_streak = ?, last_day = ?, last_at = ? WHERE user_id = ?",
+                    (
+                        count,
+                        row["quality_count"] + (quality is not None),
+                        row["quality_sum"] + (quality or 0.0),
+                        row["quality_recent"] if quality is None else ewma(row["quality_recent"], quality),
+                        row["confidence_sum"] + confidence,
+                        ewma(row["confidence_recent"], confidence),
+                        streak,
+                        longest,
+                        max(day, row["last_day"]),
+                        max(now, row["last_at"]),
+                        user_id,
+                    ),
+                )
+
+            # Only flagged letters are written; the others decay lazily on read
+            for letter in letters:
+                previous = conn.execute(
+                    "SELECT improve_count, flag_rate, flagged_at_analysis FROM handwriting_letter_progress "
+                    "WHERE user_id = ? AND letter = ?",
+                    (user_id, letter),
+                ).fetchone()
+                improve_count, rate = 1, PROGRESS_EWMA_ALPHA
+                if previous is not None:
+                    improve_count = previous["improve_count"] + 1
+                    # The EWMA of "flagged in this analysis", decayed over the analyses that were not
+                    rate = (1 - PROGRESS_EWMA_ALPHA) * decayed_flag_rate(
+                        previous["flag_rate"], previous["flagged_at_analysis"], count - 1
+                    ) + PROGRESS_EWMA_ALPHA
+                conn.execute(
+                    "INSERT OR REPLACE INTO handwriting_letter_progress "
+                    "(user_id, letter, improve_count, flag_rate, flagged_at_analysis, last_flagged_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (user_id, letter, improve_count, rate, count, now),
+                )
+        return True
+
+    def get(self, user_id: int, now: Optional[float] = None) -> dict:
+        """
+        A user's aggregates. Costs two indexed lookups whatever the history
+        length: the per-user row and one row per distinct flagged letter.
+        """
+        now = time.time() if now is None else now
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT * FROM handwriting_progress WHERE user_id = ?", (user_id,)).fetchone()
+            letter_rows = conn.execute(
+                "SELECT letter, improve_count, flag_rate, flagged_at_analysis, last_flagged_at "
+                "FROM handwriting_letter_progress WHERE user_id = ?",
+                (user_id,),
+            ).fetchall()
+
+        if row is None:
+            return {
+                "user_id": user_id,
+                "analysis_count": 0,
+                "average_quality": None,
+                "recent_quality": None,
+                "average_confidence": None,
+                "recent_confidence": None,
+                "current_streak": 0,
+                "longest_streak": 0,
+                "first_analyzed_at": None,
+                "last_analyzed_at": None,
+                "letters_to_improve": [],
+                "letters": [],
+            }
+
+        count = row["analysis_count"]
+        letters = [
+            {
+                "letter": letter["letter"],
+                "improve_count": letter["improve_count"],
+                "recent_rate": round(
+                    decayed_flag_rate(letter["flag_rate"], letter["flagged_at_analysis"], count), 4
+                ),
+                "last_flagged_at": letter["last_flagged_at"],
+            }
+            for letter in letter_rows
+        ]
+        letters.sort(key=lambda letter: (letter["recent_rate"], letter["improve_count"]), reverse=True)
+
+        # A streak is only current if the last analysis was today or yesterday
+        today = int(now // SECONDS_PER_DAY)
+        current_streak = row["current_streak"] if today - row["last_day"] <= 1 else 0
+
+        return {
+            "user_id": user_id,
+            "analysis_count": count,
+            "average_quality": row["quality_sum"] / row["quality_count"] if row["quality_count"] else None,
+            "recent_quality": row["quality_recent"],
+            "average_confidence": row["confidence_sum"] / count,
+            "recent_confidence": row["confidence_recent"],
+            "current_streak": current_streak,
+            "longest_streak": row["longest_streak"],
+            "first_analyzed_at": row["first_at"],
+            "last_analyzed_at": row["last_at"],
+            "letters_to_improve": [
+                letter["letter"] for letter in letters if letter["recent_rate"] >= PROGRESS_LETTER_THRESHOLD
+            ][:PROGRESS_MAX_LETTERS],
+            "letters": letters,
+        }
+
+
+progress_store = ProgressStore(database)
@@ -0,0 +1,259 @@
+import hashlib
+import logging
+import math
+import os
+import textwrap
+from functools import lru_cache
+from string import Formatter
+from typing import Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:  # Optional: without it, tokens are estimated from text length
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Most tokens (prompt estimate + completion budget) one request may use
+ANALYSIS_TOKEN_BUDGET = int(os.getenv("ANALYSIS_TOKEN_BUDGET", "4000"))
+PRACTICE_TOKEN_BUDGET = int(os.getenv("PRACTICE_TOKEN_BUDGET", "1500"))
+# tiktoken encoding of the GPT-4o family
+TOKEN_ENCODING = os.getenv("TOKEN_ENCODING", "o200k_base")
+
+# Chat format overhead: tokens around each message, and priming the reply
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_REPLY = 3
+# Characters per token when tiktoken is not installed (English prose)
+CHARS_PER_TOKEN = 4
+
+_encoding = None
+_encoding_failed = False
+
+
+def get_encoding():
+    """The tiktoken encoding, loaded on first use; None when tiktoken is unavailable"""
+    global _encoding, _encoding_failed
+    if _encoding is None and tiktoken is not None and not _encoding_failed:
+        try:
+            _encoding = tiktoken.get_encoding(TOKEN_ENCODING)
+        except Exception as e:
+            # The encoding file is downloaded on first use, which fails offline
+            logger.warning("tiktoken encoding unavailable, estimating tokens from length: %s", e)
+            _encoding_failed = True
+    return _encoding
+
+
+def tokenizer_name() -> str:
+    return f"tiktoken:{TOKEN_ENCODING}" if get_encoding() is not None else f"chars/{CHARS_PER_TOKEN}"
+
+
+# User messages repeat (the same letter, level and count), so their counts are kept
+@lru_cache(maxsize=4096)
+def count_tokens(text: str) -> int:
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_image_tokens(width: int, height: int, detail: str = "high") -> int:
+    """
+    Vision input tokens for an image. Low detail is a flat 85. High detail
+    is scaled to fit 2048x2048, then so its short side is at most 768, and
+    costs 170 per 512px tile plus 85.
+    """
+    if detail == "low":
+        return 85
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+
+class PromptBudgetExceeded(ValueError):
+    """Raised when a request's estimated tokens are over its template's budget"""
+
+    def __init__(self, name: str, tokens: int, budget: int):
+        super().__init__(f"The {name} request needs about {tokens} tokens, over its budget of {budget}")
+        self.tokens = tokens
+        self.budget = budget
+
+
+class PromptTemplate:
+    """
+    A versioned prompt: a static system message and a user message template
+    filled in per request. The system message is built once and never holds
+    request parameters, so every request starts with the same bytes and
+    OpenAI's prompt caching can reuse it. key changes with the version and
+    with any edit to either text, so cached results can be keyed on it.
+    """
+
+    def __init__(self, name: str, version: int, system: str, user: str, token_budget: int):
+        self.name = name
+        self.version = version
+        self.system = textwrap.dedent(system).strip()
+        self.user = user
+        self.token_budget = token_budget
+        # Parsed once, so a template with bad syntax fails at import rather than on a request
+        self.fields = frozenset(field for _, field, _, _ in Formatter().parse(user) if field)
+        digest = hashlib.blake2b(f"{self.system}\0{self.user}".encode(), digest_size=4).hexdigest()
+        self.key = f"{name}-v{version}-{digest}"
+        self._system_tokens = None
+        self.calls = 0
+        self.estimated_prompt_tokens = 0
+        self.prompt_tokens = 0
+        self.cached_prompt_tokens = 0
+        self.completion_tokens = 0
+        self.over_budget = 0
+
+    @property
+    def system_tokens(self) -> int:
+        if self._system_tokens is None:
+            self._system_tokens = count_tokens(self.system)
+        return self._system_tokens
+
+    def render(self, **params) -> str:
+        try:
+            return self.user.format_map(params)
+        except KeyError:
+            missing = self.fields - params.keys()
+            raise ValueError(f"Prompt {self.name} needs {', '.join(sorted(missing))}") from None
+
+    def messages(self, user_text: str, images: Optional[List[dict]] = None) -> List[dict]:
+        """Chat messages for a rendered user text, with image_url content parts after it"""
+        content = user_text if not images else [{"type": "text", "text": user_text}, *images]
+        return [
+            {"role": "system", "content": self.system},
+            {"role": "user", "content": content},
+        ]
+
+    def estimate(self, user_text: str, image_tokens: int = 0) -> int:
+        """Prompt tokens of a request, counted locally before the call"""
+        return self.system_tokens + count_tokens(user_text) + image_tokens + 2 * TOKENS_PER_MESSAGE + TOKENS_PER_REPLY
+
+    def check_budget(self, prompt_tokens: int, max_tokens: int) -> int:
+        """The request's worst-case total (prompt + completion budget); raises when over the budget"""
+        total = prompt_tokens + max_tokens
+        if total > self.token_budget:
+            self.over_budget += 1
+            raise PromptBudgetExceeded(self.name, total, self.token_budget)
+        return total
+
+    def record(self, estimated_prompt_tokens: int, usage) -> None:
+        """Record the usage OpenAI returned for a call estimated at estimated_prompt_tokens"""
+        if usage is None:
+            return
+        self.calls += 1
+        self.estimated_prompt_tokens += estimated_prompt_tokens
+        self.prompt_tokens += getattr(usage, "prompt_tokens", 0) or 0
+        self.completion_tokens += getattr(usage, "completion_tokens", 0) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.cached_prompt_tokens += getattr(details, "cached_tokens", 0) or 0
+
+    def stats(self) -> dict:
+        calls = self.calls
+        return {
+            "key": self.key,
+            "version": self.version,
+            "system_tokens": self.system_tokens,
+            "token_budget": self.token_budget,
+            "calls": calls,
+            "over_budget": self.over_budget,
+            "avg_estimated_prompt_tokens": round(self.estimated_prompt_tokens / calls, 1) if calls else None,
+            "avg_prompt_tokens": round(self.prompt_tokens / calls, 1) if calls else None,
+            "avg_completion_tokens": round(self.completion_tokens / calls, 1) if calls else None,
+            # Share of prompt tokens served from OpenAI's prompt cache
+            "cached_prompt_share": round(self.cached_prompt_tokens / self.prompt_tokens, 4) if self.prompt_tokens else None,
+            # Actual / estimated prompt tokens; far from 1 means the estimates charge the wrong amount
+            "estimate_ratio": round(self.prompt_tokens / self.estimated_prompt_tokens, 3) if self.estimated_prompt_tokens else None,
+        }
+
+
+class PromptRegistry:
+    """The prompt templates in use, by name"""
+
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, template: PromptTemplate) -> PromptTemplate:
+        if template.name in self._templates:
+            raise ValueError(f"Prompt {template.name} is already registered")
+        self._templates[template.name] = template
+        return template
+
+    def get(self, name: str) -> PromptTemplate:
+        return self._templates[name]
+
+    def stats(self) -> dict:
+        return {
+            "tokenizer": tokenizer_name(),
+            "prompts": {name: template.stats() for name, template in self._templates.items()},
+        }
+
+
+prompt_registry = PromptRegistry()
+
+# Bump the version whenever parsing of the output changes too, so cached results are not reused
+ANALYSIS_PROMPT = prompt_registry.register(PromptTemplate(
+    name="analysis",
+    version=3,
+    system="""
+    You are a handwriting analysis expert. Analyze the handwritten text in the image and provide a structured response in the following format:
+
+    DETECTED_LETTERS: [List all letters found in the image, separated by commas]
+    QUALITY: [Excellent/Good/Fair/Needs Improvement]
+    CONFIDENCE: [0.0-1.0 score]
+    SUGGESTIONS: [List 3-5 specific improvement suggestions]
+    LETTERS_TO_IMPROVE: [List specific letters that need improvement, separated by commas]
+    ANALYSIS: [Detailed analysis of handwriting quality, spacing, consistency, and readability]
+
+    Focus on:
+    - Letter formation and clarity
+    - Spacing between letters and words
+    - Consistency of handwriting style
+    - Readability and neatness
+
+    For LETTERS_TO_IMPROVE, identify specific letters that:
+    - Have poor formation or are hard to read
+    - Are inconsistent in size or style
+    - Have spacing or alignment issues
+    - Could benefit from practice
+
+    Provide constructive, encouraging feedback suitable for learning.
+    """,
+    user="Please analyze this handwritten text and provide detailed feedback on the handwriting quality, detected letters, and suggestions for improvement.",
+    token_budget=ANALYSIS_TOKEN_BUDGET,
+))
+
+# The letter, difficulty and count only appear in the user message, so the system message is the same for every request
+PRACTICE_PROMPT = prompt_registry.register(PromptTemplate(
+    name="practice",
+    version=2,
+    system="""
+    You are a handwriting practice expert. Generate the requested number of practice sentences that contain the requested target letter very frequently.
+
+    Requirements:
+    - Each sentence should contain the target letter at least 3-5 times
+    - Sentences should be natural, meaningful, and engaging
+    - Vary the difficulty based on the requested level
+    - Make sentences appropriate for handwriting practice
+    - Include both uppercase and lowercase versions of the target letter when possible
+
+    Difficulty levels:
+    - beginner: Simple, short sentences with basic vocabulary
+    - intermediate: Medium-length sentences with varied vocabulary
+    - advanced: Longer, more complex sentences with sophisticated vocabulary
+
+    Format your response as:
+    SENTENCES:
+    [One sentence per line, as many as requested]
+
+    TIPS:
+    [Tip 1]
+    [Tip 2]
+    [Tip 3]
+    """,
+    user="Generate {sentence_count} practice sentences for the letter '{target_letter}' at {difficulty} difficulty level.",
+    token_budget=PRACTICE_TOKEN_BUDGET,
+))
@@ -0,0 +1,486 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional, Sequence, Tuple
+import openai
+from fastapi.concurrency import run_in_threadpool
+from app.db import WEB_CONCURRENCY, ConnectionPool, data_path
+
+# Upstream concurrency governor, shared by every OpenAI-backed route.
+# In flight and queued calls are totals, split evenly across worker processes.
+UPSTREAM_MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "16"))
+# Calls allowed to wait for an in-flight slot; beyond this they are rejected at once
+UPSTREAM_MAX_QUEUE = int(os.getenv("UPSTREAM_MAX_QUEUE", "64"))
+UPSTREAM_MAX_WAIT = float(os.getenv("UPSTREAM_MAX_WAIT", "10"))
+# Retry-After used when an upstream 429 does not say how long to wait
+UPSTREAM_RETRY_AFTER = float(os.getenv("UPSTREAM_RETRY_AFTER", "5"))
+# Users whose buckets are tracked; the least recently seen are forgotten first
+RATE_LIMIT_MAX_USERS = int(os.getenv("RATE_LIMIT_MAX_USERS", "10000"))
+# Where the buckets live: "memory" (this process) or "sqlite" (shared by all workers)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "sqlite" if WEB_CONCURRENCY > 1 else "memory")
+RATE_LIMIT_PATH = os.getenv("RATE_LIMIT_PATH", data_path("rate_limits.db"))
+
+# (bucket key, per-minute budget, amount)
+Charge = Tuple[str, float, float]
+
+
+@dataclass
+class RouteLimits:
+    """Per-minute request and token budgets for one route (0 disables a bucket)"""
+    user_requests: float
+    user_tokens: float
+    global_requests: float
+    global_tokens: float
+
+    @classmethod
+    def from_env(cls, route: str, **defaults) -> "RouteLimits":
+        """Read RATE_LIMIT_<ROUTE>_USER_RPM / _USER_TPM / _GLOBAL_RPM / _GLOBAL_TPM"""
+        prefix = f"RATE_LIMIT_{route.upper()}_"
+        names = {
+            "user_requests": "USER_RPM",
+            "user_tokens": "USER_TPM",
+            "global_requests": "GLOBAL_RPM",
+            "global_tokens": "GLOBAL_TPM",
+        }
+        return cls(**{field: float(os.getenv(prefix + name, str(defaults[field]))) for field, name in names.items()})
+
+
+ROUTE_LIMITS = {
+    "analyze": RouteLimits.from_env(
+        "analyze", user_requests=20, user_tokens=60_000, global_requests=500, global_tokens=450_000
+    ),
+    "practice": RouteLimits.from_env(
+        "practice", user_requests=30, user_tokens=30_000, global_requests=500, global_tokens=150_000
+    ),
+}
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a call is over a budget; retry_after is in seconds"""
+
+    def __init__(self, message: str, retry_after: float, reason: str):
+        super().__init__(message)
+        self.retry_after = max(retry_after, 0.0)
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    Classic token bucket refilled continuously at per_minute / 60 per second.
+    Holds at most one minute of budget, so a burst can spend a whole minute at once.
+    """
+
+    def __init__(self, per_minute: float, tokens: Optional[float] = None, updated: Optional[float] = None):
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self.tokens = per_minute if tokens is None else tokens
+        self.updated = time.monotonic() if updated is None else updated
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until amount is available (0 if it is now)"""
+        self.refill(now)
+        # A single call larger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        return 0.0 if self.tokens >= amount else (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= amount
+
+    def give_back(self, amount: float):
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def adjust(self, amount: float, now: float):
+        """Give back (positive) or take (negative) tokens after a call"""
+        self.refill(now)
+        if amount >= 0:
+            self.give_back(amount)
+        else:
+            self.take(-amount)
+
+
+def take_all(buckets: Sequence[TokenBucket], charges: Sequence[Charge], now: float) -> List[float]:
+    """
+    Take each charge from its bucket if every bucket can pay now.
+    Returns the wait for each bucket; nothing is taken if any wait is non-zero.
+    """
+    waits = [bucket.wait_time(amount, now) for bucket, (_, _, amount) in zip(buckets, charges)]
+    if not any(waits):
+        for bucket, (_, _, amount) in zip(buckets, charges):
+            bucket.take(amount)
+    return waits
+
+
+class MemoryBucketStore:
+    """Token buckets held in this process; budgets are per worker"""
+
+    name = "memory"
+    blocking = False
+
+    def __init__(self, max_buckets: int):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._blocked_until = 0.0
+
+    def _bucket(self, key: str, per_minute: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(per_minute)
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def take(self, charges: Sequence[Charge]) -> List[float]:
+        buckets = [self._bucket(key, per_minute) for key, per_minute, _ in charges]
+        return take_all(buckets, charges, time.monotonic())
+
+    def adjust(self, charges: Sequence[Charge]):
+        now = time.monotonic()
+        for key, per_minute, amount in charges:
+            self._bucket(key, per_minute).adjust(amount, now)
+
+    def block(self, seconds: float):
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def blocked_for(self) -> float:
+        return max(self._blocked_until - time.monotonic(), 0.0)
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+
+class SQLiteBucketStore:
+    """
+    Token buckets shared by every worker process through one SQLite file.
+    Each admission reads and updates its buckets in a single write
+    transaction, so workers never spend the same budget twice. Wall-clock
+    time is used because monotonic clocks are not shared between processes.
+    A bucket idle for a minute is full again, which is the same as having
+    no row, so idle rows are pruned now and then. Calls can wait on
+    another worker's write lock, so the limiter makes them off the event loop.
+    """
+
+    name = "sqlite"
+    blocking = True
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str):
+        self._pool = ConnectionPool(path, size=2)
+        with self._pool.connection() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+                    key TEXT PRIMARY KEY,
+                    tokens REAL NOT NULL,
+                    updated REAL NOT NULL
+                ) WITHOUT ROWID
+                """
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_blocks (name TEXT PRIMARY KEY, until REAL NOT NULL) WITHOUT ROWID"
+            )
+        self._writes = 0
+
+    def _load(self, conn, charges: Sequence[Charge], now: float) -> List[TokenBucket]:
+        keys = [key for key, _, _ in charges]
+        placeholders = ",".join("?" * len(keys))
+        rows = {
+            row["key"]: (row["tokens"], row["updated"])
+            for row in conn.execute(
+                f"SELECT key, tokens, updated FROM rate_limit_buckets WHERE key IN ({placeholders})", keys
+            )
+        }
+        return [TokenBucket(per_minute, *rows.get(key, (None, now))) for key, per_minute, _ in charges]
+
+    def _save(self, conn, charges: Sequence[Charge], buckets: Sequence[TokenBucket], now: float):
+        conn.executemany(
+            "INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)",
+            [(key, bucket.tokens, bucket.updated) for (key, _, _), bucket in zip(charges, buckets)],
+        )
+        self._writes += 1
+        if self._writes % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM rate_limit_buckets WHERE updated < ?", (now - 60,))
+
+    def take(self, charges: Sequence[Charge]) -> List[float]:
+        if not charges:
+            return []
+        now = time.time()
+        with self._pool.transaction() as conn:
+            buckets = self._load(conn, charges, now)
+            waits = take_all(buckets, charges, now)
+            if not any(waits):
+                self._save(conn, charges, buckets, now)
+        return waits
+
+    def adjust(self, charges: Sequence[Charge]):
+        if not charges:
+            return
+        now = time.time()
+        with self._pool.transaction() as conn:
+            buckets = self._load(conn, charges, now)
+            for bucket, (_, _, amount) in zip(buckets, charges):
+                bucket.adjust(amount, now)
+            self._save(conn, charges, buckets, now)
+
+    def block(self, seconds: float):
+        with self._pool.connection() as conn:
+            conn.execute(
+                """
+                INSERT INTO rate_limit_blocks (name, until) VALUES ('upstream', ?)
+                ON CONFLICT(name) DO UPDATE SET until = MAX(until, excluded.until)
+                """,
+                (time.time() + seconds,),
+            )
+
+    def blocked_for(self) -> float:
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT until FROM rate_limit_blocks WHERE name = 'upstream'").fetchone()
+        return max(row["until"] - time.time(), 0.0) if row else 0.0
+
+    def size(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM rate_limit_buckets").fetchone()[0]
+
+
+def create_bucket_store(max_users: int = RATE_LIMIT_MAX_USERS):
+    """Build the bucket store for the configured backend"""
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBucketStore(RATE_LIMIT_PATH)
+    # Two buckets (requests, tokens) per tracked user and route
+    return MemoryBucketStore(2 * max_users)
+
+
+class UpstreamLease:
+    """An admitted upstream call: holds an in-flight slot until released"""
+
+    def __init__(self, limiter: "UpstreamLimiter", token_charges: List[Charge], tokens: float):
+        self._limiter = limiter
+        self._token_charges = token_charges
+        self.tokens = tokens
+        self.started = time.monotonic()
+        self.released = False
+
+    async def settle(self, usage):
+        """Correct the token buckets from the estimate to the tokens the call really used"""
+        total = getattr(usage, "total_tokens", None)
+        if not total or not self._token_charges:
+            return
+        await self._limiter._call_store(
+            self._limiter.store.adjust,
+            [(key, per_minute, self.tokens - total) for key, per_minute, _ in self._token_charges],
+        )
+        self.tokens = total
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._limiter._release(time.monotonic() - self.started)
+
+    def __del__(self):
+        # A stream whose client left before it started never reaches its finally block
+        self.release()
+
+
+class UpstreamLimiter:
+    """
+    Admission control in front of OpenAI. A call must fit the per-user and
+    global request and token buckets of its route, or it is rejected at once
+    with how long to wait. Admitted calls then take one of a fixed number of
+    in-flight slots. When all slots are busy, up to max_queue calls wait up
+    to max_wait seconds; anything beyond that is rejected immediately rather
+    than piling up. An upstream 429 pauses all admissions for its Retry-After.
+    Buckets and the 429 pause live in the store (shared by all workers with
+    SQLite); in-flight slots are per process.
+    """
+
+    def __init__(
+        self,
+        limits: Dict[str, RouteLimits],
+        max_in_flight: int = UPSTREAM_MAX_IN_FLIGHT,
+        max_queue: int = UPSTREAM_MAX_QUEUE,
+        max_wait: float = UPSTREAM_MAX_WAIT,
+        max_users: int = RATE_LIMIT_MAX_USERS,
+        store=None,
+    ):
+        self.limits = limits
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.store = store if store is not None else MemoryBucketStore(2 * max_users)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = {}
+        self.upstream_rate_limited = 0
+        self._average_call_seconds = None
+
+    def _charges(
+        self, route: str, user_id: Optional[int], tokens: float, shared: bool = True
+    ) -> Tuple[List[Charge], List[Charge]]:
+        """
+        (request charges, token charges) for a call; background calls have no user.
+        shared=False leaves out the global budgets (see admit_user).
+        """
+        limit = self.limits[route]
+        scopes = [("global", limit.global_requests, limit.global_tokens)] if shared else []
+        if user_id is not None:
+            scopes.append((f"user:{user_id}", limit.user_requests, limit.user_tokens))
+        requests = [(f"{route}:{scope}:requests", per_minute, 1) for scope, per_minute, _ in scopes if per_minute]
+        token_charges = [(f"{route}:{scope}:tokens", per_minute, tokens) for scope, _, per_minute in scopes if per_minute]
+        return requests, token_charges
+
+    def _reject(self, message: str, retry_after: float, reason: str) -> RateLimitExceeded:
+        self.rejected[reason] = self.rejected.get(reason, 0) + 1
+        return RateLimitExceeded(message, retry_after, reason)
+
+    def _queue_retry_after(self) -> float:
+        """Rough time for the queue ahead to drain through the in-flight slots"""
+        per_call = self._average_call_seconds or 1.0
+        return per_call * (self.waiting + 1) / self.max_in_flight
+
+    async def acquire(self, route: str, user_id: Optional[int], tokens: float) -> UpstreamLease:
+        """Admit one upstream call or raise RateLimitExceeded. Release the lease when the call ends."""
+        blocked_for = await self._call_store(self.store.blocked_for)
+        if blocked_for > 0:
+            raise self._reject("OpenAI is rate limiting requests, please retry shortly", blocked_for, "upstream")
+
+        request_charges, token_charges = self._charges(route, user_id, tokens)
+        charges = request_charges + token_charges
+        await self._take(charges)
+
+        if self._slots.locked():
+            if self.waiting >= self.max_queue:
+                await self._refund(charges)
+                raise self._reject("Server is busy, please retry shortly", self._queue_retry_after(), "queue_full")
+            self.waiting += 1
+            self.queued += 1
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                await self._refund(charges)
+                raise self._reject("Server is busy, please retry shortly", self._queue_retry_after(), "queue_timeout")
+            except BaseException:
+                # Cancelled while queued (the client went away): the call never happens
+                await self._refund(charges)
+                raise
+            finally:
+                self.waiting -= 1
+        else:
+            await self._slots.acquire()
+
+        self.in_flight += 1
+        self.admitted += 1
+        return UpstreamLease(self, token_charges, tokens)
+
+    async def admit_user(self, route: str, user_id: Optional[int], tokens: float) -> List[Charge]:
+        """
+        Take one caller's own budgets for a call it shares with other callers
+        (coalesced identical requests). The shared call is then acquired with
+        no user, against the global budgets only, so whoever starts it decides
+        nothing for the others. Raises RateLimitExceeded; returns the charges
+        for refund() when the shared call is rejected.
+        """
+        request_charges, token_charges = self._charges(route, user_id, tokens, shared=False)
+        charges = request_charges + token_charges
+        await self._take(charges)
+        return charges
+
+    async def refund(self, charges: List[Charge]):
+        """Give back charges taken for a call that was never made"""
+        await self._refund(charges)
+
+    async def _take(self, charges: List[Charge]):
+        waits = await self._call_store(self.store.take, charges)
+        if any(waits):
+            # Name the tightest budget; user buckets come after the global ones
+            index = max(range(len(waits)), key=waits.__getitem__)
+            key = charges[index][0]
+            scope = key.split(":")[1]
+            kind = key.rsplit(":", 1)[1]
+            raise self._reject(
+                "Too many handwriting requests, please retry shortly", waits[index], f"{scope}_{kind}"
+            )
+
+    async def _call_store(self, method, *args):
+        """Call a store method, in the thread pool if it can block on another worker's lock"""
+        if self.store.blocking:
+            return await run_in_threadpool(method, *args)
+        return method(*args)
+
+    async def _refund(self, charges: List[Charge]):
+        await self._call_store(self.store.adjust, charges)
+
+    def _release(self, seconds: float):
+        self.in_flight -= 1
+        self._slots.release()
+        average = self._average_call_seconds
+        self._average_call_seconds = seconds if average is None else average + 0.1 * (seconds - average)
+
+    async def upstream_limited(self, error: openai.RateLimitError) -> RateLimitExceeded:
+        """
+        Turn an upstream 429 into RateLimitExceeded and stop admitting calls
+        until its Retry-After has passed, instead of sending more into it.
+        """
+        self.upstream_rate_limited += 1
+        headers = error.response.headers if getattr(error, "response", None) is not None else {}
+        retry_after = UPSTREAM_RETRY_AFTER
+        try:
+            if "retry-after-ms" in headers:
+                retry_after = float(headers["retry-after-ms"]) / 1000
+            elif "retry-after" in headers:
+                retry_after = float(headers["retry-after"])
+        except ValueError:
+            pass
+        await self._call_store(self.store.block, retry_after)
+        return self._reject("OpenAI is rate limiting requests, please retry shortly", retry_after, "upstream")
+
+    @asynccontextmanager
+    async def limit(self, route: str, user_id: Optional[int], tokens: float):
+        """Hold an upstream lease around a call; upstream 429s come out as RateLimitExceeded"""
+        lease = await self.acquire(route, user_id, tokens)
+        try:
+            yield lease
+        except openai.RateLimitError as e:
+            raise await self.upstream_limited(e) from e
+        finally:
+            lease.release()
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_in_flight": self.max_in_flight,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": dict(self.rejected),
+            "upstream_rate_limited": self.upstream_rate_limited,
+            "average_call_seconds": self._average_call_seconds,
+            "store": self.store.name,
+            "tracked_buckets": self.store.size(),
+            "limits_per_minute": {route: asdict(limit) for route, limit in self.limits.items()},
+        }
+
+
+def retry_after_header(retry_after: float) -> str:
+    return str(max(1, math.ceil(retry_after)))
+
+
+# Per-process share of the in-flight and queue totals
+upstream_limiter = UpstreamLimiter(
+    ROUTE_LIMITS,
+    max_in_flight=max(1, math.ceil(UPSTREAM_MAX_IN_FLIGHT / WEB_CONCURRENCY)),
+    max_queue=math.ceil(UPSTREAM_MAX_QUEUE / WEB_CONCURRENCY),
+    store=create_bucket_store(),
+)
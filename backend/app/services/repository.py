@@ -0,0 +1,281 @@
+import os
+import time
+from typing import List, Optional
+from app.db import ConnectionPool, data_path, split_statements
+from app.services.letter_search import SEARCH_MAX_CANDIDATES, SearchQuery, document_frequencies, rank
+
+# Application database for users and letters
+LETTERBUDDY_DB_PATH = os.getenv("LETTERBUDDY_DB_PATH", data_path("letterbuddy.db"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    email TEXT NOT NULL UNIQUE,
+    first_name TEXT NOT NULL,
+    last_name TEXT NOT NULL,
+    is_active INTEGER NOT NULL DEFAULT 1
+);
+CREATE TABLE IF NOT EXISTS letters (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    title TEXT NOT NULL,
+    content TEXT NOT NULL,
+    recipient TEXT NOT NULL,
+    letter_type TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+-- A user's letters in id order, for lookups and keyset pagination
+CREATE INDEX IF NOT EXISTS letters_user_id ON letters (user_id, id);
+-- Bumped by every change to a user's letters; their list ETags are built from it.
+-- Counters start at random values so a recreated database does not reuse old ETags.
+CREATE TABLE IF NOT EXISTS letter_versions (
+    user_id INTEGER PRIMARY KEY,
+    version INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS letter_versions_insert AFTER INSERT ON letters BEGIN
+    INSERT INTO letter_versions (user_id, version) VALUES (new.user_id, abs(random() % 1000000000))
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS letter_versions_update AFTER UPDATE ON letters BEGIN
+    INSERT INTO letter_versions (user_id, version) VALUES (old.user_id, abs(random() % 1000000000))
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+    INSERT INTO letter_versions (user_id, version) VALUES (new.user_id, abs(random() % 1000000000))
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS letter_versions_delete AFTER DELETE ON letters BEGIN
+    INSERT INTO letter_versions (user_id, version) VALUES (old.user_id, abs(random() % 1000000000))
+    ON CONFLICT (user_id) DO UPDATE SET version = version + 1;
+END;
+-- Number of letters (the BM25 corpus size), kept by triggers so search never counts the table.
+-- Its single row is seeded from COUNT(*) by init_schema.
+CREATE TABLE IF NOT EXISTS letter_count (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    total INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS letter_count_insert AFTER INSERT ON letters BEGIN
+    UPDATE letter_count SET total = total + 1;
+END;
+CREATE TRIGGER IF NOT EXISTS letter_count_delete AFTER DELETE ON letters BEGIN
+    UPDATE letter_count SET total = total - 1;
+END;
+"""
+
+# Full-text index over titles and content. It stores no text of its own
+# (content=''); triggers feed it every change to letters. The tags column
+# holds owner/type/status tokens so filters are posting-list intersections
+# inside the index instead of scans over every matching letter. Prefixes
+# up to six characters have their own index entries (see letter_search).
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE letters_fts USING fts5 (
+    title, content, tags,
+    content='',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3 4 5 6'
+);
+CREATE TRIGGER letters_fts_insert AFTER INSERT ON letters BEGIN
+    INSERT INTO letters_fts (rowid, title, content, tags)
+    VALUES (new.id, new.title, new.content, {new_tags});
+END;
+CREATE TRIGGER letters_fts_delete AFTER DELETE ON letters BEGIN
+    INSERT INTO letters_fts (letters_fts, rowid, title, content, tags)
+    VALUES ('delete', old.id, old.title, old.content, {old_tags});
+END;
+CREATE TRIGGER letters_fts_update AFTER UPDATE ON letters BEGIN
+    INSERT INTO letters_fts (letters_fts, rowid, title, content, tags)
+    VALUES ('delete', old.id, old.title, old.content, {old_tags});
+    INSERT INTO letters_fts (rowid, title, content, tags)
+    VALUES (new.id, new.title, new.content, {new_tags});
+END;
+"""
+
+
+def search_tags_sql(row: str) -> str:
+    """SQL for a letter's filter tokens, e.g. 'u1 tthankyou ssent' (the tokenizer splits on '_')"""
+    return (
+        f"'u' || {row}.user_id || ' t' || replace({row}.letter_type, '_', '') "
+        f"|| ' s' || replace({row}.status, '_', '')"
+    )
+
+
+def search_tag(prefix: str, value) -> str:
+    return f'tags:"{prefix}{str(value).replace("_", "")}"'
+
+
+# Demo user the routes act as until authentication exists
+DEMO_USER = {
+    "id": 1,
+    "email": "demo@example.com",
+    "first_name": "Demo",
+    "last_name": "User",
+    "is_active": True,
+}
+
+DEMO_LETTER = {
+    "id": 1,
+    "title": "Thank You Letter",
+    "content": "Dear John, Thank you for your help...",
+    "recipient": "John Doe",
+    "letter_type": "thank_you",
+    "status": "sent",
+    "user_id": 1,
+}
+
+LETTER_COLUMNS = "id, user_id, title, content, recipient, letter_type, status, created_at"
+SEARCH_COLUMNS = ", ".join(f"letters.{column}" for column in LETTER_COLUMNS.split(", "))
+USER_COLUMNS = "id, email, first_name, last_name, is_active"
+
+
+def init_schema(pool: ConnectionPool):
+    """Create tables and seed the demo user and letter on a fresh database"""
+    with pool.connection() as conn:
+        conn.executescript(SCHEMA)
+
+    # Until the row exists the triggers update nothing, so letters written before it are counted here
+    with pool.transaction() as conn:
+        conn.execute("INSERT OR IGNORE INTO letter_count (id, total) SELECT 1, COUNT(*) FROM letters")
+
+    # Databases created before search existed are indexed once, here
+    with pool.transaction() as conn:
+        has_search = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'letters_fts'"
+        ).fetchone()
+        if not has_search:
+            script = SEARCH_SCHEMA.format(new_tags=search_tags_sql("new"), old_tags=search_tags_sql("old"))
+            for statement in split_statements(script):
+                conn.execute(statement)
+            conn.execute(
+                "INSERT INTO letters_fts (rowid, title, content, tags) "
+                f"SELECT id, title, content, {search_tags_sql('letters')} FROM letters"
+            )
+
+    with pool.transaction() as conn:
+        conn.execute(
+            "INSERT OR IGNORE INTO users (id, email, first_name, last_name, is_active) "
+            "VALUES (:id, :email, :first_name, :last_name, :is_active)",
+            DEMO_USER,
+        )
+        conn.execute(
+            f"INSERT OR IGNORE INTO letters ({LETTER_COLUMNS}) "
+            "VALUES (:id, :user_id, :title, :content, :recipient, :letter_type, :status, 0)",
+            DEMO_LETTER,
+        )
+
+
+class LetterRepository:
+    """Letters stored in SQLite, looked up by id or by user in id order"""
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+
+    def create(self, user_id: int, title: str, content: str, recipient: str, letter_type: str, status: str) -> dict:
+        """Insert a letter; SQLite allocates the id inside the write transaction"""
+        with self._pool.transaction() as conn:
+            row = conn.execute(
+                "INSERT INTO letters (user_id, title, content, recipient, letter_type, status, created_at) "
+                f"VALUES (?, ?, ?, ?, ?, ?, ?) RETURNING {LETTER_COLUMNS}",
+                (user_id, title, content, recipient, letter_type, status, time.time()),
+            ).fetchone()
+        return dict(row)
+
+    def get(self, letter_id: int) -> Optional[dict]:
+        with self._pool.connection() as conn:
+            row = conn.execute(f"SELECT {LETTER_COLUMNS} FROM letters WHERE id = ?", (letter_id,)).fetchone()
+        return dict(row) if row else None
+
+    def version(self, user_id: int) -> int:
+        """Changes whenever any of the user's letters is created, updated or deleted"""
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT version FROM letter_versions WHERE user_id = ?", (user_id,)).fetchone()
+        return row["version"] if row else 0
+
+    def list_for_user(self, user_id: int, after_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+        """
+        One page of a user's letters in id order. Pass the last id of the
+        previous page as after_id: the index seeks straight to it, so every
+        page costs the same however deep it is.
+        """
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {LETTER_COLUMNS} FROM letters WHERE user_id = ? AND id > ? ORDER BY id LIMIT ?",
+                (user_id, after_id or 0, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def search(
+        self,
+        user_id: int,
+        query: str,
+        letter_type: Optional[str] = None,
+        status: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> List[dict]:
+        """
+        A user's letters matching every word of the query (the last word as a
+        prefix, so results follow typing), best title/content matches first.
+
+        The index only finds candidates: the newest SEARCH_MAX_CANDIDATES
+        matches, an index seek that stays cheap for any collection size.
+        BM25 scoring runs over those in Python with cached document
+        frequencies, because FTS5's bm25() walks every posting list of
+        common words. Returns [] when the query has no searchable words.
+        """
+        parsed = SearchQuery.parse(query)
+        if parsed is None:
+            return []
+        filters = [search_tag("u", user_id)]
+        if letter_type:
+            filters.append(search_tag("t", letter_type))
+        if status:
+            filters.append(search_tag("s", status))
+        expression = " AND ".join(filters) + " AND " + parsed.match_expression()
+
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {SEARCH_COLUMNS} FROM letters_fts JOIN letters ON letters.id = letters_fts.rowid "
+                "WHERE letters_fts MATCH ? ORDER BY letters_fts.rowid DESC LIMIT ?",
+                (expression, SEARCH_MAX_CANDIDATES),
+            ).fetchall()
+            if not rows:
+                return []
+            total_letters = conn.execute("SELECT total FROM letter_count").fetchone()[0]
+            frequencies = {key: document_frequencies.get(conn, key) for key in parsed.phrase_keys()}
+
+        ranked = rank(parsed, [dict(row) for row in rows], total_letters, frequencies)
+        return ranked[offset : offset + limit]
+
+
+class UserRepository:
+    """Users stored in SQLite"""
+
+    def __init__(self, pool: ConnectionPool):
+        self._pool = pool
+
+    def create(self, email: str, first_name: str, last_name: str) -> dict:
+        with self._pool.transaction() as conn:
+            row = conn.execute(
+                f"INSERT INTO users (email, first_name, last_name) VALUES (?, ?, ?) RETURNING {USER_COLUMNS}",
+                (email, first_name, last_name),
+            ).fetchone()
+        return dict(row)
+
+    def get(self, user_id: int) -> Optional[dict]:
+        with self._pool.connection() as conn:
+            row = conn.execute(f"SELECT {USER_COLUMNS} FROM users WHERE id = ?", (user_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, after_id: Optional[int] = None, limit: int = 50) -> List[dict]:
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT {USER_COLUMNS} FROM users WHERE id > ? ORDER BY id LIMIT ?",
+                (after_id or 0, limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+database = ConnectionPool(LETTERBUDDY_DB_PATH, DB_POOL_SIZE)
+init_schema(database)
+letter_repository = LetterRepository(database)
+user_repository = UserRepository(database)
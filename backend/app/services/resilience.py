@@ -0,0 +1,265 @@
+import asyncio
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional, TypeVar
+import openai
+
+# Retries for transient upstream failures (timeouts, dropped connections, 5xx)
+UPSTREAM_MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "2"))
+UPSTREAM_RETRY_BASE_DELAY = float(os.getenv("UPSTREAM_RETRY_BASE_DELAY", "0.5"))
+UPSTREAM_RETRY_MAX_DELAY = float(os.getenv("UPSTREAM_RETRY_MAX_DELAY", "4"))
+# Hedging: send a second identical request once the first is slower than the recent p95
+UPSTREAM_HEDGE_ENABLED = os.getenv("UPSTREAM_HEDGE_ENABLED", "false").lower() == "true"
+UPSTREAM_HEDGE_PERCENTILE = float(os.getenv("UPSTREAM_HEDGE_PERCENTILE", "0.95"))
+# Latencies needed before hedging starts, and the share of calls that may be hedged
+UPSTREAM_HEDGE_MIN_SAMPLES = int(os.getenv("UPSTREAM_HEDGE_MIN_SAMPLES", "20"))
+UPSTREAM_HEDGE_MAX_RATIO = float(os.getenv("UPSTREAM_HEDGE_MAX_RATIO", "0.1"))
+# Circuit breaker: open after this many failed attempts in a row, probe again after the cooldown
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", "30"))
+
+LATENCY_WINDOW = 200
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Failures worth another attempt: the same request may well succeed a moment later.
+# Rate limits are left to the limiter, and 4xx errors would fail again.
+RETRYABLE_ERRORS = (openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)
+
+T = TypeVar("T")
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling upstream while its circuit breaker is open"""
+
+    def __init__(self, route: str, retry_after: float):
+        super().__init__(f"The handwriting service is temporarily unavailable ({route})")
+        self.route = route
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Closed: calls pass and consecutive failures are counted.
+    Open: calls fail fast until the cooldown has passed.
+    Half-open: one probe call is let through; success closes the breaker,
+    failure opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+
+    def retry_after(self) -> float:
+        return max(self.opened_at + self.cooldown - time.monotonic(), 0.0)
+
+    def allow(self) -> bool:
+        if self.state == OPEN and self.retry_after() == 0:
+            self.state = HALF_OPEN
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        self.state = CLOSED
+        self.failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self._probing = False
+
+    def record_ignored(self):
+        """A call that ended without telling us anything about upstream health"""
+        self._probing = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 1) if self.state == OPEN else 0.0,
+        }
+
+
+class RouteCalls:
+    """Per-route breaker, recent latencies and counters"""
+
+    def __init__(self):
+        self.breaker = CircuitBreaker()
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.calls = 0
+        self.retries = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedges_won = 0
+        self.fallbacks = 0
+
+
+class UpstreamResilience:
+    """
+    Retries, hedging and circuit breaking around upstream model calls.
+    Each call is a zero-argument coroutine factory, so it can be sent
+    again for a retry or a hedge.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = UPSTREAM_MAX_RETRIES,
+        base_delay: float = UPSTREAM_RETRY_BASE_DELAY,
+        max_delay: float = UPSTREAM_RETRY_MAX_DELAY,
+        hedge_enabled: bool = UPSTREAM_HEDGE_ENABLED,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_enabled = hedge_enabled
+        self._routes: Dict[str, RouteCalls] = {}
+
+    def route(self, name: str) -> RouteCalls:
+        if name not in self._routes:
+            self._routes[name] = RouteCalls()
+        return self._routes[name]
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter: a random delay up to the capped exponential step"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def hedge_delay(self, calls: RouteCalls) -> Optional[float]:
+        """Latency percentile after which a hedge is sent, or None when hedging should not happen"""
+        if not self.hedge_enabled or len(calls.latencies) < UPSTREAM_HEDGE_MIN_SAMPLES:
+            return None
+        if calls.hedges >= UPSTREAM_HEDGE_MAX_RATIO * calls.calls:
+            return None
+        ordered = sorted(calls.latencies)
+        return ordered[min(int(len(ordered) * UPSTREAM_HEDGE_PERCENTILE), len(ordered) - 1)]
+
+    async def call(
+        self,
+        route: str,
+        make_call: Callable[[], Awaitable[T]],
+        hedge: bool = True,
+        deadline: Optional[float] = None,
+    ) -> T:
+        """
+        Run an upstream call. Transient failures are retried with jittered
+        exponential backoff while the deadline (seconds) allows; once the
+        breaker is open this raises CircuitOpenError without calling upstream.
+        """
+        calls = self.route(route)
+        if not calls.breaker.allow():
+            raise CircuitOpenError(route, calls.breaker.retry_after())
+
+        calls.calls += 1
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.monotonic()
+            try:
+                if hedge:
+                    result = await self._hedged(calls, make_call)
+                else:
+                    result = await make_call()
+            except RETRYABLE_ERRORS:
+                calls.failures += 1
+                calls.breaker.record_failure()
+                delay = self.backoff(attempt)
+                out_of_time = deadline is not None and time.monotonic() - started + delay > deadline
+                if attempt >= self.max_retries or out_of_time or calls.breaker.state == OPEN:
+                    raise
+                attempt += 1
+                calls.retries += 1
+                await asyncio.sleep(delay)
+                # Another caller's failure may have opened the breaker while we slept
+                if calls.breaker.state == OPEN:
+                    raise CircuitOpenError(route, calls.breaker.retry_after())
+                continue
+            except BaseException:
+                calls.breaker.record_ignored()
+                raise
+            calls.latencies.append(time.monotonic() - attempt_started)
+            calls.breaker.record_success()
+            return result
+
+    async def _hedged(self, calls: RouteCalls, make_call: Callable[[], Awaitable[T]]) -> T:
+        """
+        Send the call, and if it has not answered by the recent p95 latency,
+        send it once more and take whichever finishes first successfully.
+        """
+        delay = self.hedge_delay(calls)
+        if delay is None:
+            return await make_call()
+
+        first = asyncio.ensure_future(make_call())
+        tasks = [first]
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done:
+                return first.result()
+
+            calls.hedges += 1
+            tasks.append(asyncio.ensure_future(make_call()))
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            calls.hedges_won += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            # The losing request (or both, if our caller went away) is abandoned
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def record_fallback(self, route: str):
+        self.route(route).fallbacks += 1
+
+    def stats(self) -> dict:
+        def percentile(latencies, fraction):
+            if not latencies:
+                return None
+            ordered = sorted(latencies)
+            return round(ordered[min(int(len(ordered) * fraction), len(ordered) - 1)], 3)
+
+        return {
+            name: {
+                "breaker": calls.breaker.stats(),
+                "calls": calls.calls,
+                "retries": calls.retries,
+                "failed_attempts": calls.failures,
+                "hedges": calls.hedges,
+                "hedges_won": calls.hedges_won,
+                "fallbacks": calls.fallbacks,
+                "p50_seconds": percentile(calls.latencies, 0.5),
+                "p95_seconds": percentile(calls.latencies, 0.95),
+            }
+            for name, calls in self._routes.items()
+        }
+
+
+upstream_resilience = UpstreamResilience()
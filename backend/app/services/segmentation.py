@@ -0,0 +1,256 @@
+import io
+import math
+import os
+from dataclasses import dataclass, asdict
+from typing import List, Sequence, Tuple, Union
+import numpy as np
+from PIL import Image, ImageOps
+from app.services.image_preprocessing import ImagePreprocessingError
+from app.services.image_quality import (
+    BLANK_IMAGE_MESSAGE,
+    QUALITY_GATE_ENABLED,
+    ImageQualityError,
+    QualityReport,
+    assess_image,
+    check_dimensions,
+)
+
+# Segmentation settings for local handwriting measurements
+SEGMENTATION_MAX_DIMENSION = int(os.getenv("SEGMENTATION_MAX_DIMENSION", "1024"))
+# Blank rows inside a line of text that do not split it (e.g. the gap under an i-dot)
+SEGMENTATION_LINE_GAP = int(os.getenv("SEGMENTATION_LINE_GAP", "3"))
+SEGMENTATION_MIN_LINE_HEIGHT = int(os.getenv("SEGMENTATION_MIN_LINE_HEIGHT", "6"))
+# Components with fewer ink pixels are treated as specks of noise
+SEGMENTATION_MIN_GLYPH_PIXELS = int(os.getenv("SEGMENTATION_MIN_GLYPH_PIXELS", "12"))
+# Gaps wider than this fraction of the letter height separate words, not letters
+SEGMENTATION_WORD_GAP_RATIO = float(os.getenv("SEGMENTATION_WORD_GAP_RATIO", "0.6"))
+
+
+@dataclass
+class HandwritingMetrics:
+    """Page-level statistics over all segmented glyphs (ratios are relative to letter height)"""
+    width: int
+    height: int
+    line_count: int
+    glyph_count: int
+    letter_height: float  # median glyph height in pixels of the working image
+    height_variation: float  # coefficient of variation of glyph heights
+    slant_degrees: float  # median slant, positive leans right
+    slant_variation: float  # standard deviation of slant in degrees
+    baseline_deviation: float  # median distance of glyph bottoms from the line baseline
+    letter_spacing: float  # median gap between letters
+    spacing_variation: float  # standard deviation of gaps between letters
+    word_spacing: float  # median gap between words
+
+    def to_dict(self):
+        # NaN (not enough glyphs to measure) is not valid JSON
+        return {k: (None if isinstance(v, float) and math.isnan(v) else v) for k, v in asdict(self).items()}
+
+
+def load_grayscale(image_data: bytes) -> Image.Image:
+    """
+    Decode an upload into a grayscale image capped at SEGMENTATION_MAX_DIMENSION,
+    applying the same quality gate as the vision routes.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_data))
+    except Exception as e:
+        raise ImagePreprocessingError(f"Could not read image: {str(e)}")
+
+    if QUALITY_GATE_ENABLED:
+        problems = check_dimensions(image.width, image.height)
+        if problems:
+            raise ImageQualityError(
+                QualityReport(width=image.width, height=image.height, problems=problems)
+            )
+
+    try:
+        # JPEG can decode straight to a smaller scale, which skips most of the IDCT work
+        image.draft("L", (SEGMENTATION_MAX_DIMENSION, SEGMENTATION_MAX_DIMENSION))
+        image = ImageOps.exif_transpose(image).convert("L")
+    except Exception as e:
+        raise ImagePreprocessingError(f"Could not read image: {str(e)}")
+
+    if QUALITY_GATE_ENABLED:
+        report = assess_image(image)
+        if not report.passed:
+            raise ImageQualityError(report)
+
+    image.thumbnail((SEGMENTATION_MAX_DIMENSION, SEGMENTATION_MAX_DIMENSION), Image.BILINEAR)
+    return image
+
+
+def stack_images(images: Sequence[Image.Image]) -> np.ndarray:
+    """Pad grayscale images with white into one (N, H, W) uint8 array"""
+    height = max(image.height for image in images)
+    width = max(image.width for image in images)
+    batch = np.full((len(images), height, width), 255, dtype=np.uint8)
+    for i, image in enumerate(images):
+        batch[i, : image.height, : image.width] = np.asarray(image, dtype=np.uint8)
+    return batch
+
+
+def otsu_thresholds(hist: np.ndarray) -> np.ndarray:
+    """Otsu threshold per histogram row: the level maximizing between-class variance"""
+    hist = hist.astype(np.float64)
+    levels = np.arange(256, dtype=np.float64)
+    weight_dark = np.cumsum(hist, axis=1)
+    mass_dark = np.cumsum(hist * levels, axis=1)
+    weight_light = weight_dark[:, -1:] - weight_dark
+    mean_dark = mass_dark / np.maximum(weight_dark, 1)
+    mean_light = (mass_dark[:, -1:] - mass_dark) / np.maximum(weight_light, 1)
+    between = weight_dark * weight_light * (mean_dark - mean_light) ** 2
+    return between.argmax(axis=1)
+
+
+def find_runs(mask: np.ndarray, max_gap: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Start (inclusive) and end (exclusive) indices of runs of True in a 1-D mask.
+    Runs separated by at most max_gap False entries are merged.
+    """
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    starts, ends = edges[0::2], edges[1::2]
+    if max_gap and len(starts) > 1:
+        keep = (starts[1:] - ends[:-1]) > max_gap
+        starts = np.concatenate((starts[:1], starts[1:][keep]))
+        ends = np.concatenate((ends[:-1][keep], ends[-1:]))
+    return starts, ends
+
+
+def measure_line(band: np.ndarray):
+    """
+    Segment one line of text into glyphs by its vertical projection profile.
+    Returns per-glyph heights, slants (degrees), bottoms and the gaps between glyphs,
+    with all per-glyph sums done by np.add.reduceat over the column profile.
+    """
+    rows, columns = band.shape
+    column_ink = band.sum(axis=0)
+    starts, ends = find_runs(column_ink > 0)
+    if not len(starts):
+        return None
+
+    weights = band.astype(np.float32)
+    ys = np.arange(rows, dtype=np.float32)
+    xs = np.arange(columns, dtype=np.float32)
+    column_y = ys @ weights
+    column_y2 = (ys * ys) @ weights
+
+    # Ink moments per glyph (gap columns between starts hold no ink, so they add nothing)
+    n = np.add.reduceat(column_ink, starts).astype(np.float64)
+    sum_y = np.add.reduceat(column_y, starts)
+    sum_y2 = np.add.reduceat(column_y2, starts)
+    sum_x = np.add.reduceat(column_ink * xs, starts)
+    sum_xy = np.add.reduceat(column_y * xs, starts)
+
+    has_ink = column_ink > 0
+    top = np.where(has_ink, band.argmax(axis=0), rows)
+    bottom = np.where(has_ink, rows - 1 - band[::-1].argmax(axis=0), -1)
+    glyph_top = np.minimum.reduceat(top, starts)
+    glyph_bottom = np.maximum.reduceat(bottom, starts)
+    heights = glyph_bottom - glyph_top + 1
+
+    keep = (n >= SEGMENTATION_MIN_GLYPH_PIXELS) & (heights >= 3)
+    if not keep.any():
+        return None
+    n, sum_y, sum_y2, sum_x, sum_xy = n[keep], sum_y[keep], sum_y2[keep], sum_x[keep], sum_xy[keep]
+    heights, glyph_bottom = heights[keep], glyph_bottom[keep]
+    starts, ends = starts[keep], ends[keep]
+
+    # Slant from the regression of x on y over each glyph's ink; y grows downwards
+    mean_y = sum_y / n
+    var_y = np.maximum(sum_y2 / n - mean_y * mean_y, 1e-6)
+    cov_xy = sum_xy / n - (sum_x / n) * mean_y
+    slants = np.degrees(np.arctan(-cov_xy / var_y))
+
+    gaps = starts[1:] - ends[:-1]
+    return heights, slants, glyph_bottom, gaps
+
+
+def measure_page(ink: np.ndarray, width: int, height: int) -> HandwritingMetrics:
+    """Split a binarized page into lines by its row profile and aggregate glyph metrics"""
+    line_starts, line_ends = find_runs(ink.any(axis=1), max_gap=SEGMENTATION_LINE_GAP)
+    heights, slants, offsets, letter_gaps, word_gaps = [], [], [], [], []
+    line_count = 0
+    for start, end in zip(line_starts, line_ends):
+        if end - start < SEGMENTATION_MIN_LINE_HEIGHT:
+            continue
+        line = measure_line(ink[start:end])
+        if line is None:
+            continue
+        line_heights, line_slants, bottoms, gaps = line
+        line_count += 1
+        line_height = float(np.median(line_heights))
+        baseline = np.median(bottoms)
+        heights.append(line_heights)
+        slants.append(line_slants)
+        offsets.append(np.abs(bottoms - baseline) / line_height)
+        is_word_gap = gaps > SEGMENTATION_WORD_GAP_RATIO * line_height
+        letter_gaps.append(gaps[~is_word_gap] / line_height)
+        word_gaps.append(gaps[is_word_gap] / line_height)
+
+    if not line_count:
+        raise ImageQualityError(QualityReport(width=width, height=height, problems=[BLANK_IMAGE_MESSAGE]))
+
+    heights = np.concatenate(heights).astype(np.float64)
+    slants = np.concatenate(slants)
+    offsets = np.concatenate(offsets)
+    letter_gaps = np.concatenate(letter_gaps).astype(np.float64)
+    word_gaps = np.concatenate(word_gaps).astype(np.float64)
+
+    def median(values):
+        return float(np.median(values)) if len(values) else float("nan")
+
+    def variation(values):
+        return float(values.std() / values.mean()) if len(values) > 1 and values.mean() else float("nan")
+
+    return HandwritingMetrics(
+        width=width,
+        height=height,
+        line_count=line_count,
+        glyph_count=len(heights),
+        letter_height=median(heights),
+        height_variation=variation(heights),
+        slant_degrees=median(slants),
+        slant_variation=float(slants.std()) if len(slants) > 1 else float("nan"),
+        baseline_deviation=median(offsets),
+        letter_spacing=median(letter_gaps),
+        # Absolute spread: gaps of one or two pixels would make a relative one explode
+        spacing_variation=float(letter_gaps.std()) if len(letter_gaps) > 1 else float("nan"),
+        word_spacing=median(word_gaps),
+    )
+
+
+def measure_each(images: Sequence[Image.Image]) -> List[Union[HandwritingMetrics, ImageQualityError]]:
+    """
+    Measure a batch of grayscale images. Otsu thresholds and binarization run
+    once over the stacked (N, H, W) array; only the per-line glyph statistics
+    are computed image by image. An image with no measurable writing gives
+    its ImageQualityError in place of metrics, so it does not sink the batch.
+    """
+    if not images:
+        return []
+    # Pillow's C histogram is cheaper than a bincount over the padded batch
+    hist = np.array([image.histogram() for image in images])
+    ink = stack_images(images) <= otsu_thresholds(hist)[:, None, None]
+    results = []
+    for i, image in enumerate(images):
+        try:
+            results.append(measure_page(ink[i, : image.height, : image.width], image.width, image.height))
+        except ImageQualityError as e:
+            results.append(e)
+    return results
+
+
+def measure_batch(images: Sequence[Image.Image]) -> List[HandwritingMetrics]:
+    """Measure a batch of grayscale images, raising the first ImageQualityError"""
+    results = measure_each(images)
+    for result in results:
+        if isinstance(result, ImageQualityError):
+            raise result
+    return results
+
+
+def measure_image(image_data: bytes) -> HandwritingMetrics:
+    """Decode an upload and measure its handwriting"""
+    return measure_batch([load_grayscale(image_data)])[0]
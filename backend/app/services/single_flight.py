@@ -0,0 +1,150 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Coalesces identical concurrent calls: the first caller for a key starts
+    the work, callers arriving while it runs wait for the same result (or
+    exception) instead of starting their own. The key is forgotten as soon
+    as the call finishes, so this never serves stale results; caching is
+    left to the caches.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Task] = {}
+        self._channels: Dict[Hashable, "Broadcast"] = {}
+        self.calls = 0
+        self.executed = 0
+        self.shared = 0
+        self.max_waiters = 0
+        self._waiters: Dict[Hashable, int] = {}
+
+    async def do(self, key: Hashable, coro_fn: Callable[[], Awaitable[T]]) -> T:
+        """Run coro_fn() once for all concurrent callers with the same key"""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = self.start(key, coro_fn)
+        else:
+            self.calls += 1
+            self._share(key)
+        return await asyncio.shield(task)
+
+    def start(self, key: Hashable, coro_fn: Callable[[], Awaitable[T]], channel: "Broadcast" = None) -> asyncio.Task:
+        """
+        Start coro_fn() as the call for key (none may be in flight). Callers
+        with the same key share its result through do() or join(), and its
+        channel, if any, through follow().
+        """
+        self.calls += 1
+        self.executed += 1
+        # A task rather than a plain await, so one caller going away
+        # does not cancel the call for everyone else waiting on it
+        task = asyncio.ensure_future(coro_fn())
+        self._in_flight[key] = task
+        self._waiters[key] = 1
+        if channel is not None:
+            self._channels[key] = channel
+        task.add_done_callback(lambda _: self._forget(key, task))
+        return task
+
+    def follow(self, key: Hashable) -> Optional["Broadcast"]:
+        """The channel of a call in flight for key; None when there is none or it has no channel"""
+        channel = self._channels.get(key)
+        if channel is not None:
+            self.calls += 1
+            self._share(key)
+        return channel
+
+    def _share(self, key: Hashable):
+        self.shared += 1
+        self._waiters[key] += 1
+        self.max_waiters = max(self.max_waiters, self._waiters[key])
+
+    async def join(self, key: Hashable) -> Optional[T]:
+        """Wait for a call already in flight for key; None when there is none"""
+        task = self._in_flight.get(key)
+        if task is None:
+            return None
+        self.calls += 1
+        self._share(key)
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task):
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+            del self._waiters[key]
+            self._channels.pop(key, None)
+        # Nobody may be left to await it; do not let the error go unretrieved
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "executed": self.executed,
+            "saved": self.shared,
+            "in_flight": len(self._in_flight),
+            "max_waiters": self.max_waiters,
+        }
+
+
+class Broadcast:
+    """
+    Messages a shared call produces as it runs (streamed fields), for every
+    caller following it. Each follower gets all of them from the start, so
+    callers that join late miss nothing. ready resolves once the call has
+    started, or carries the error that stopped it from starting; result is
+    set when it closes after succeeding.
+    """
+
+    def __init__(self):
+        self.messages: List[Any] = []
+        self.ready = asyncio.get_running_loop().create_future()
+        self.result = None
+        self.closed = False
+        self._changed = asyncio.Event()
+
+    def open(self):
+        if not self.ready.done():
+            self.ready.set_result(None)
+
+    def fail(self, error: BaseException):
+        if not self.ready.done():
+            self.ready.set_exception(error)
+            # Retrieved here so an error nobody followed is not reported as unhandled
+            self.ready.exception()
+        self.close()
+
+    def publish(self, message: Any):
+        self.messages.append(message)
+        self._wake()
+
+    def close(self, result: Any = None):
+        if self.closed:
+            return
+        self.result = result
+        self.closed = True
+        self._wake()
+
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        sent = 0
+        while True:
+            while sent < len(self.messages):
+                yield self.messages[sent]
+                sent += 1
+            if self.closed:
+                return
+            await self._changed.wait()
+
+
+# Vision analyses keyed by the analysis cache key (prompt version + image hash)
+analysis_flights = SingleFlight()
+# Practice sentence generation keyed by letter, difficulty and sentence count
+practice_flights = SingleFlight()
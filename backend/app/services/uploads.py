@@ -0,0 +1,109 @@
+import asyncio
+import binascii
+import os
+import threading
+from typing import Optional, Sequence, Tuple
+from fastapi import UploadFile
+
+# Upload limits for image routes
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+# Whole request body for single-image routes: one file plus multipart framing
+UPLOAD_MAX_REQUEST_BYTES = int(os.getenv("UPLOAD_MAX_REQUEST_BYTES", str(UPLOAD_MAX_BYTES + 1024 * 1024)))
+# Raw uploads decoded at once; each can hold the file plus its decoded pixels
+UPLOAD_CONCURRENCY = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+
+# Bytes read to identify a file format
+SNIFF_BYTES = 16
+
+IMAGE_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif", "image/bmp", "image/tiff")
+ZIP_TYPE = "application/zip"
+
+# Raw base64 input per encoding step; a multiple of 3 so chunks encode without padding
+BASE64_CHUNK_BYTES = 3 * 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload is over the size limit"""
+
+
+class UnsupportedUploadError(ValueError):
+    """Raised when an upload's contents are not an accepted format"""
+
+
+def sniff_type(header: bytes) -> Optional[str]:
+    """Identify a file from its leading magic bytes, ignoring the declared content type"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    if header[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if header.startswith(b"BM"):
+        return "image/bmp"
+    if header[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image/tiff"
+    if header[4:8] == b"ftyp" and header[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    if header.startswith(b"PK\x03\x04"):
+        return ZIP_TYPE
+    return None
+
+
+async def read_upload(
+    upload: UploadFile,
+    max_bytes: int = UPLOAD_MAX_BYTES,
+    accept: Sequence[str] = IMAGE_TYPES,
+) -> Tuple[bytes, str]:
+    """
+    Read an upload after checking its size and real format.
+    Returns (data, sniffed content type). Never holds more than max_bytes + 1 bytes.
+    """
+    # Starlette already knows the size of the spooled file, so oversized uploads cost nothing
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLargeError(f"File is too large (max {max_bytes // (1024 * 1024)} MB)")
+
+    content_type = sniff_type(await upload.read(SNIFF_BYTES))
+    if content_type not in accept:
+        if content_type == "image/heic":
+            raise UnsupportedUploadError("HEIC photos are not supported. Please upload a JPEG or PNG image")
+        raise UnsupportedUploadError("File must be a JPEG, PNG, WebP, GIF, BMP or TIFF image")
+
+    await upload.seek(0)
+    data = await upload.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise UploadTooLargeError(f"File is too large (max {max_bytes // (1024 * 1024)} MB)")
+    return data, content_type
+
+
+_buffers = threading.local()
+
+
+def encode_data_url(data: bytes, mime_type: str) -> str:
+    """
+    Build a base64 data URL for an image. Encodes chunk by chunk into a
+    per-thread buffer that is reused across requests, so the only new
+    allocation is the returned string.
+    """
+    prefix = f"data:{mime_type};base64,".encode("ascii")
+    size = len(prefix) + 4 * ((len(data) + 2) // 3)
+
+    buffer = getattr(_buffers, "data_url", None)
+    if buffer is None or len(buffer) < size:
+        buffer = bytearray(size)
+        _buffers.data_url = buffer
+
+    view = memoryview(buffer)
+    view[: len(prefix)] = prefix
+    position = len(prefix)
+    source = memoryview(data)
+    for start in range(0, len(source), BASE64_CHUNK_BYTES):
+        encoded = binascii.b2a_base64(source[start : start + BASE64_CHUNK_BYTES], newline=False)
+        view[position : position + len(encoded)] = encoded
+        position += len(encoded)
+    return str(view[:size], "ascii")
+
+
+# Shared by all image routes: bounds how many raw uploads are being decoded at once
+upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
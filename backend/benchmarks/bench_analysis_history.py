@@ -0,0 +1,162 @@
+"""
+Columnar analysis history vs a list of HandwritingAnalysisResponse objects.
+
+Builds --records analyses spread over --users users and --days days, held
+both as (user_id, created_at, HandwritingAnalysisResponse) tuples and in
+AnalysisHistory's NumPy columns, then compares memory (RSS growth while
+building) and the time of the queries behind GET /handwriting/history/stats:
+  - totals: letter counts, quality distribution, averages over everything
+  - by day: the same per day over the last 30 days
+  - by user: the same per user
+  - one user: a user's totals and rolling 7-day averages
+
+Usage (from backend/):
+    python -m benchmarks.bench_analysis_history --records 1000000
+"""
+import argparse
+import gc
+import os
+import time
+from collections import Counter, defaultdict
+import numpy as np
+
+from app.routes.handwriting import HandwritingAnalysisResponse
+from app.services.analysis_history import LETTERS, QUALITY_LABELS, AnalysisHistory
+from app.services.progress import SECONDS_PER_DAY, quality_score
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def sample_columns(records: int, users: int, days: int, seed: int = 7) -> dict:
+    rng = np.random.default_rng(seed)
+    now = int(time.time())
+    # Each analysis flags each letter with probability 0.06 (about 1.5 letters)
+    flagged = rng.random((records, len(LETTERS))) < 0.06
+    return {
+        "user_id": rng.integers(1, users + 1, records).astype(np.uint32),
+        "created_at": np.sort(rng.integers(now - days * SECONDS_PER_DAY, now, records)).astype(np.uint32),
+        "letters": (flagged * (1 << np.arange(len(LETTERS), dtype=np.uint32))).sum(axis=1).astype(np.uint32),
+        "quality": rng.choice(len(QUALITY_LABELS) - 1, records, p=[0.1, 0.4, 0.3, 0.2]).astype(np.uint8),
+        "confidence": rng.uniform(0.4, 0.98, records).astype(np.float32),
+    }
+
+
+def build_objects(columns: dict) -> list:
+    suggestions = ["Practice letter formation", "Work on consistent spacing", "Focus on readability"]
+    records = []
+    for user_id, created_at, mask, quality, confidence in zip(
+        columns["user_id"].tolist(), columns["created_at"].tolist(), columns["letters"].tolist(),
+        columns["quality"].tolist(), columns["confidence"].tolist(),
+    ):
+        records.append((user_id, created_at, HandwritingAnalysisResponse(
+            detected_letters=list("HELLO"),
+            handwriting_quality=QUALITY_LABELS[quality],
+            suggestions=list(suggestions),
+            confidence_score=confidence,
+            analysis="Clear, readable handwriting.",
+            letters_to_improve=[letter for bit, letter in enumerate(LETTERS) if mask >> bit & 1],
+        )))
+    return records
+
+
+def summarize_objects(results) -> dict:
+    letters, qualities = Counter(), Counter()
+    confidence, scores, scored = 0.0, 0.0, 0
+    for result in results:
+        letters.update(result.letters_to_improve)
+        qualities[result.handwriting_quality] += 1
+        confidence += result.confidence_score
+        score = quality_score(result.handwriting_quality)
+        if score is not None:
+            scores += score
+            scored += 1
+    return {
+        "analysis_count": len(results),
+        "average_confidence": confidence / len(results) if results else None,
+        "average_quality": scores / scored if scored else None,
+        "quality_counts": dict(qualities),
+        "letter_counts": dict(letters),
+    }
+
+
+def naive_stats(records, user_id=None, since=None, group_by=None, window_days=7) -> dict:
+    """The same statistics from the object list, one Python pass per query"""
+    selected = [
+        record for record in records
+        if (user_id is None or record[0] == user_id) and (since is None or record[1] >= since)
+    ]
+    result = summarize_objects([analysis for _, _, analysis in selected])
+    if group_by is not None:
+        groups = defaultdict(list)
+        for uid, created_at, analysis in selected:
+            groups[created_at // SECONDS_PER_DAY if group_by == "day" else uid].append(analysis)
+        result["groups"] = [summarize_objects(analyses) for _, analyses in sorted(groups.items())]
+    if user_id is not None:
+        daily = defaultdict(list)
+        for _, created_at, analysis in selected:
+            daily[created_at // SECONDS_PER_DAY].append(analysis.confidence_score)
+        result["rolling"] = [
+            sum(sum(daily.get(day - back, [])) for back in range(window_days))
+            for day in sorted(daily)
+        ]
+    return result
+
+
+def timed(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    columns = sample_columns(args.records, args.users, args.days)
+
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    history = AnalysisHistory(pool=None)
+    history.append(**columns)
+    columnar_build = time.perf_counter() - start
+    columnar_rss = rss_bytes() - before
+
+    gc.collect()
+    before = rss_bytes()
+    start = time.perf_counter()
+    records = build_objects(columns)
+    objects_build = time.perf_counter() - start
+    objects_rss = rss_bytes() - before
+
+    print(f"{args.records} analyses, {args.users} users, {args.days} days")
+    print(f"{'':10} {'build':>9} {'memory':>10}")
+    print(f"{'objects':10} {objects_build:8.2f}s {objects_rss / 2**20:7.0f} MB")
+    print(f"{'columnar':10} {columnar_build:8.2f}s {columnar_rss / 2**20:7.0f} MB  ({history.nbytes / 2**20:.1f} MB of columns)")
+
+    since = time.time() - 30 * SECONDS_PER_DAY
+    queries = (
+        ("totals", {}),
+        ("by day", {"since": since, "group_by": "day"}),
+        ("by user", {"group_by": "user"}),
+        ("one user", {"user_id": 1}),
+    )
+    print(f"{'query':10} {'objects':>10} {'columnar':>10} {'speedup':>8}")
+    for label, query in queries:
+        naive = timed(lambda: naive_stats(records, **query), 1)
+        columnar = timed(lambda: history.stats(**query), args.repeat)
+        print(f"{label:10} {naive * 1000:8.1f}ms {columnar * 1000:8.1f}ms {naive / columnar:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
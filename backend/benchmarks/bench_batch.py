@@ -0,0 +1,83 @@
+"""
+Throughput benchmark for /handwriting/analyze/batch.
+
+Sends the same number of images with different upstream concurrency limits
+and reports wall time and time to first streamed result. Throughput should
+grow with the limit, not with the number of files.
+
+Usage (from backend/):
+    python -m benchmarks.bench_batch --images 24 --latency 0.5 --limits 1 4 8
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import time
+import httpx
+from PIL import Image, ImageDraw
+
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+def sample_image(label: str):
+    """Distinct PNG per label so the analysis cache never short-circuits a call"""
+    image = Image.new("L", (400, 200), 255)
+    draw = ImageDraw.Draw(image)
+    draw.text((20, 80), label, fill=0)
+    draw.line((20, 120, 380, 120), fill=0, width=3)
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+async def run_batch(run_id: int, images: int):
+    files = [
+        ("images", (f"{i}.png", sample_image(f"run {run_id} sheet {i}"), "image/png"))
+        for i in range(images)
+    ]
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=300) as client:
+        start = time.perf_counter()
+        first = None
+        results = 0
+        async with client.stream("POST", "/handwriting/analyze/batch", files=files) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                if first is None:
+                    first = time.perf_counter() - start
+                assert json.loads(line)["status"] == "ok"
+                results += 1
+        return time.perf_counter() - start, first, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--limits", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+
+    serve_in_thread(create_app(args.latency), UPSTREAM_PORT)
+
+    from main import app
+    from app.routes import handwriting
+    serve_in_thread(app, API_PORT)
+
+    print(f"{'limit':>6} {'wall':>8} {'first':>8} {'images/s':>9}")
+    for run_id, limit in enumerate(args.limits):
+        handwriting.BATCH_CONCURRENCY = limit
+        wall, first, results = asyncio.run(run_batch(run_id, args.images))
+        print(f"{limit:>6} {wall:>7.2f}s {first:>7.2f}s {results / wall:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
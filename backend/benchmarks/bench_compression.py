@@ -0,0 +1,106 @@
+"""
+Bytes on the wire and CPU of a polling dashboard session, with and without
+compression and conditional requests.
+
+A session polls --polls times:
+  - GET /handwriting/demo
+  - GET /letters/ (two pages of 50 of the user's --letters letters)
+  - GET /handwriting/jobs/{id} for a finished analysis job
+  - GET /handwriting/progress
+and adds one letter halfway through, so one letters poll is a real change.
+Clients, run against the app in-process (no sockets):
+  - plain: no Accept-Encoding, ETags ignored (the behaviour before this)
+  - gzip / br: compressed responses, ETags ignored
+  - gzip + etag / br + etag: compressed, and each poll sends the last ETag
+    back in If-None-Match
+Reports response body bytes, 304s and CPU time (client and server) per session.
+
+Usage (from backend/):
+    python -m benchmarks.bench_compression --letters 100 --polls 30
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+import httpx
+
+
+async def session(app, polls: int, job_id: str, encoding, conditional: bool):
+    headers = {"Accept-Encoding": encoding or "identity"}
+    etags = {}
+    body_bytes = not_modified = requests = 0
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def get(url: str, **params):
+            nonlocal body_bytes, not_modified, requests
+            key = (url, tuple(sorted(params.items())))
+            request_headers = dict(headers)
+            if conditional and key in etags:
+                request_headers["If-None-Match"] = etags[key]
+            response = await client.get(url, params=params, headers=request_headers)
+            requests += 1
+            body_bytes += response.num_bytes_downloaded
+            not_modified += response.status_code == 304
+            if "etag" in response.headers:
+                etags[key] = response.headers["etag"]
+            return response
+
+        start = time.process_time()
+        for poll in range(polls):
+            if poll == polls // 2:
+                await client.post("/letters/", json={
+                    "title": "Halfway", "content": "A new letter", "recipient": "Grandma", "letter_type": "personal",
+                })
+            await get("/handwriting/demo")
+            first = await get("/letters/", user_id=1, limit=50)
+            await get("/letters/", user_id=1, limit=50, after=first.headers.get("x-next-cursor", "0"))
+            await get(f"/handwriting/jobs/{job_id}")
+            await get("/handwriting/progress", user_id=1)
+        cpu = time.process_time() - start
+    return requests, body_bytes, not_modified, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--letters", type=int, default=100)
+    parser.add_argument("--polls", type=int, default=30)
+    args = parser.parse_args()
+
+    os.environ["LETTERBUDDY_DATA_DIR"] = tempfile.mkdtemp()
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    from main import app
+    from app.routes.handwriting import DEMO_ANALYSIS
+    from app.services.http_cache import supported_encodings
+    from app.services.job_queue import job_queue
+    from app.services.progress import progress_store
+    from app.services.repository import letter_repository
+
+    content = (
+        "Dear Grandma, thank you so much for the lovely sweater you knitted for my birthday. "
+        "It is warm and soft and I wear it every day to school. "
+    ) * 4
+    for i in range(args.letters):
+        letter_repository.create(1, f"Letter {i}", content, "Grandma", "thank_you", "draft")
+    for _ in range(20):
+        progress_store.record(1, DEMO_ANALYSIS.model_dump())
+    job = job_queue.submit(b"image")
+    job_queue.claim()
+    job_queue.complete(job["id"], DEMO_ANALYSIS.model_dump())
+
+    clients = [("plain", None, False)]
+    for encoding in supported_encodings()[::-1]:
+        clients += [(encoding, encoding, False), (f"{encoding} + etag", encoding, True)]
+
+    print(f"{args.polls} polls of 5 requests, {args.letters} letters")
+    print(f"{'client':12} {'body bytes':>11} {'per request':>12} {'304s':>5} {'CPU/session':>12}")
+    for label, encoding, conditional in clients:
+        # Warm up, then keep the best of three for CPU
+        runs = [asyncio.run(session(app, args.polls, job["id"], encoding, conditional)) for _ in range(4)][1:]
+        requests, body_bytes, not_modified, _ = runs[0]
+        cpu = min(run[3] for run in runs)
+        print(f"{label:12} {body_bytes:11d} {body_bytes / requests:12.0f} {not_modified:5d} {cpu * 1000:10.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
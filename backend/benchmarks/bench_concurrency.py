@@ -0,0 +1,84 @@
+"""
+Concurrency benchmark for the OpenAI-backed handwriting routes.
+
+Starts the fake upstream and the API on local ports, fires N concurrent
+/handwriting/analyze requests and probes /health while they are in flight.
+With a non-blocking client the batch finishes in roughly one upstream
+latency instead of N of them, and /health stays fast.
+
+Usage (from backend/):
+    python -m benchmarks.bench_concurrency --requests 20 --latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import time
+import httpx
+
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+async def run(requests: int):
+    # Distinct images, so identical requests are not coalesced into one upstream call
+    images = [sample_image(f"concurrency {i}") for i in range(requests)]
+    base_url = f"http://127.0.0.1:{API_PORT}"
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        async def analyze(image: bytes):
+            start = time.perf_counter()
+            response = await client.post(
+                "/handwriting/analyze",
+                files={"image": ("sample.png", image, "image/png")},
+            )
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        async def probe_health():
+            await asyncio.sleep(0.2)
+            start = time.perf_counter()
+            response = await client.get("/health")
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        start = time.perf_counter()
+        health_task = asyncio.create_task(probe_health())
+        latencies = await asyncio.gather(*(analyze(image) for image in images))
+        wall = time.perf_counter() - start
+        health = await health_task
+
+    return wall, latencies, health
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    os.environ.setdefault("OPENAI_MAX_CONNECTIONS", str(max(args.requests, 20)))
+
+    serve_in_thread(create_app(args.latency), UPSTREAM_PORT)
+
+    # Import after the environment points at the fake upstream
+    from main import app
+    serve_in_thread(app, API_PORT)
+
+    wall, latencies, health = asyncio.run(run(args.requests))
+
+    serial = args.requests * args.latency
+    print(f"requests:          {args.requests}")
+    print(f"upstream latency:  {args.latency:.2f}s")
+    print(f"wall time:         {wall:.2f}s (serial would be ~{serial:.2f}s)")
+    print(f"overlap factor:    {serial / wall:.1f}x")
+    print(f"max request time:  {max(latencies):.2f}s")
+    print(f"/health under load: {health * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
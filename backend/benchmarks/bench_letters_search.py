@@ -0,0 +1,76 @@
+"""
+Latency of GET /letters/search queries against the FTS5 index at scale.
+
+Fills a scratch database with N letters (search index kept in sync by the
+insert trigger), then times searches for a typical user and for one
+heavy user who owns a large share of all letters: rare and common words,
+short prefixes, multi-word queries and type/status filters. A LIKE scan over
+the same user's letters is timed for comparison.
+
+Usage (from backend/):
+    python -m benchmarks.bench_letters_search --letters 1000000 --users 10000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from app.db import ConnectionPool
+from app.services.repository import LetterRepository, init_schema
+from benchmarks.bench_letters_store import WORDS, fill, report, timed
+
+QUERIES = [
+    ("rare word", WORDS[-1], {}),
+    ("common word", "birthday", {}),
+    ("two-letter prefix", "ba", {}),
+    ("long prefix", "birthd", {}),
+    ("three words", "thank you friend", {}),
+    ("common word + type filter", "party", {"letter_type": "thank_you"}),
+    ("common word + status filter", "dear", {"status": "sent"}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--letters", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--heavy-share", type=float, default=0.05, help="share of letters owned by user 1")
+    parser.add_argument("--samples", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool(os.path.join(directory, "bench.db"), size=4)
+        init_schema(pool)
+        repository = LetterRepository(pool)
+
+        start = time.perf_counter()
+        fill(pool, args.letters, args.users)
+        # Hand a share of all letters to user 1 to model a heavy user
+        with pool.transaction() as conn:
+            conn.execute(
+                "UPDATE letters SET user_id = 1 WHERE id % ? = 0", (round(1 / args.heavy_share),)
+            )
+            heavy = conn.execute("SELECT COUNT(*) FROM letters WHERE user_id = 1").fetchone()[0]
+        print(f"filled and indexed {args.letters} letters in {time.perf_counter() - start:.1f}s "
+              f"(heavy user owns {heavy})")
+
+        rng = random.Random(2)
+        for owner, pick_user in (("typical user", lambda: rng.randint(2, args.users)), ("heavy user", lambda: 1)):
+            print(f"-- {owner}")
+            for label, query, filters in QUERIES:
+                report(label, timed(lambda: repository.search(pick_user(), query, limit=20, **filters), args.samples))
+
+        with pool.connection() as conn:
+            report("LIKE scan, heavy user (baseline)", timed(
+                lambda: conn.execute(
+                    "SELECT id FROM letters WHERE user_id = 1 AND (title LIKE ? OR content LIKE ?)",
+                    ("%birthday%", "%birthday%"),
+                ).fetchall(),
+                max(args.samples // 10, 5),
+            ))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Lookup and insert latency of the SQLite letters repository at scale.
+
+Fills a scratch database with N letters spread over many users, then times
+get-by-id, keyset pages of one user's letters (first page and deep pages),
+and single inserts, against a linear scan of an in-memory list like the old
+demo_letters route used. Also runs parallel lookups across the pool.
+
+Usage (from backend/):
+    python -m benchmarks.bench_letters_store --letters 1000000 --users 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.db import ConnectionPool
+from app.services.repository import LetterRepository, init_schema
+
+LETTER_TYPES = ["personal", "business", "thank_you", "apology"]
+STATUSES = ["draft", "sent", "archived"]
+
+# Common letter words plus a long tail of synthetic ones, drawn with Zipf-like
+# weights so search terms range from very common to rare
+COMMON_WORDS = (
+    "dear thank you for the lovely afternoon birthday party meeting sorry about "
+    "visit family garden school project weekend holiday gift friend help letter"
+).split()
+WORDS = COMMON_WORDS + [f"{a}{b}{c}" for a in "bcdfgklmnprst" for b in "aeiou" for c in "lmnrst"]
+WORD_WEIGHTS = [1 / (rank + 1) for rank in range(len(WORDS))]
+
+
+def letter_text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, WORD_WEIGHTS, k=words))
+
+
+def fill(pool: ConnectionPool, letters: int, users: int):
+    rng = random.Random(0)
+    batch = 50_000
+    with pool.transaction() as conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO users (id, email, first_name, last_name) VALUES (?, ?, 'Bench', 'User')",
+            ((user_id, f"user{user_id}@example.com") for user_id in range(2, users + 1)),
+        )
+    for start in range(0, letters, batch):
+        rows = [
+            (
+                rng.randint(1, users),
+                letter_text(rng, 3).capitalize(),
+                letter_text(rng, 40),
+                "Friend",
+                rng.choice(LETTER_TYPES),
+                rng.choice(STATUSES),
+                time.time(),
+            )
+            for i in range(start, min(start + batch, letters))
+        ]
+        with pool.transaction() as conn:
+            conn.executemany(
+                "INSERT INTO letters (user_id, title, content, recipient, letter_type, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+
+def timed(fn, count: int):
+    """Per-call latencies in microseconds"""
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def report(label: str, samples):
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p99 = samples[int(len(samples) * 0.99) - 1]
+    print(f"{label:34} p50 {p50:9.1f} us   p99 {p99:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--letters", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--samples", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool(os.path.join(directory, "bench.db"), size=4)
+        init_schema(pool)
+        repository = LetterRepository(pool)
+
+        start = time.perf_counter()
+        fill(pool, args.letters, args.users)
+        print(f"filled {args.letters} letters for {args.users} users in {time.perf_counter() - start:.1f}s")
+
+        rng = random.Random(1)
+        max_id = args.letters
+        report("get by id", timed(lambda: repository.get(rng.randint(1, max_id)), args.samples))
+        report("first page (50) of a user", timed(
+            lambda: repository.list_for_user(rng.randint(1, args.users), None, 50), args.samples
+        ))
+        report("deep page (50) after id N/2", timed(
+            lambda: repository.list_for_user(rng.randint(1, args.users), max_id // 2, 50), args.samples
+        ))
+        report("insert (own transaction)", timed(
+            lambda: repository.create(rng.randint(1, args.users), "Bench", "Body", "Friend", "personal", "draft"),
+            args.samples,
+        ))
+
+        with ThreadPoolExecutor(max_workers=pool.size) as executor:
+            lookups = args.samples * 4
+            start = time.perf_counter()
+            list(executor.map(lambda _: repository.get(rng.randint(1, max_id)), range(lookups)))
+            elapsed = time.perf_counter() - start
+        print(f"{'parallel get by id (' + str(pool.size) + ' threads)':34} {lookups / elapsed:9.0f} lookups/s")
+
+        # The old demo route: scan a list of dicts for the id
+        demo_letters = [{"id": i, "user_id": i % args.users} for i in range(1, args.letters + 1)]
+
+        def scan():
+            letter_id = rng.randint(1, max_id)
+            for letter in demo_letters:
+                if letter["id"] == letter_id:
+                    return letter
+
+        report("list scan by id (old demo route)", timed(scan, max(args.samples // 100, 10)))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
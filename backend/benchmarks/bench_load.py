@@ -0,0 +1,363 @@
+"""
+Load profiles against the production launcher, with JSON baselines to catch regressions.
+
+Starts the fake OpenAI upstream in this process and `python start.py` in a
+fresh data directory, runs one or more profiles and reports p50/p95/p99
+latency, throughput, status codes and the server's peak RSS:
+  - classroom_burst: --students analyses posted at once, --waves times,
+    --pause seconds apart (add --stream to use /handwriting/analyze/stream)
+  - steady_practice: --rate practice sentence requests per second for
+    --duration seconds, random letters and difficulties
+  - letters_crud: --concurrency clients creating, listing, reading and
+    searching letters for --duration seconds
+
+Each result is compared with benchmarks/baselines/<profile>.json when it
+exists; latency or throughput worse than --tolerance makes the run exit 1.
+The first run of a profile, or any run with --save, becomes the baseline.
+Baselines depend on the machine, so compare runs from the same one.
+
+Usage (from backend/):
+    python -m benchmarks.bench_load --profiles classroom_burst steady_practice letters_crud
+    python -m benchmarks.bench_load --profiles classroom_burst --latency 2 --jitter 0.5 --save
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import string
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(BACKEND_DIR, "benchmarks", "baselines")
+
+WORDS = "dear friend thank you for the lovely letter about your summer garden trip school music".split()
+
+
+class Recorder:
+    """Latency and status of every request in a profile"""
+
+    def __init__(self):
+        self.latencies = []
+        self.statuses = {}
+        self.started = time.perf_counter()
+        self.finished = None
+
+    def add(self, status: int, seconds: float):
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if 200 <= status < 300:
+            self.latencies.append(seconds)
+
+    async def timed(self, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+            status = response.status_code
+        except httpx.HTTPError:
+            status = 0
+        self.add(status, time.perf_counter() - start)
+        return status
+
+    def stop(self):
+        self.finished = time.perf_counter()
+
+
+def percentile(ordered, fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not ordered:
+        return 0.0
+    return ordered[min(max(int(len(ordered) * fraction + 0.5) - 1, 0), len(ordered) - 1)]
+
+
+class RssSampler:
+    """Peak resident memory of the server and its worker processes, sampled from /proc"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _pids(self):
+        pids, pending = [], [self.pid]
+        while pending:
+            pid = pending.pop()
+            pids.append(pid)
+            try:
+                with open(f"/proc/{pid}/task/{pid}/children") as f:
+                    pending.extend(int(child) for child in f.read().split())
+            except OSError:
+                pass
+        return pids
+
+    def sample(self) -> int:
+        total = 0
+        for pid in self._pids():
+            try:
+                with open(f"/proc/{pid}/status") as f:
+                    for line in f:
+                        if line.startswith("VmRSS:"):
+                            total += int(line.split()[1]) * 1024
+            except OSError:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+async def classroom_burst(client: httpx.AsyncClient, args, recorder: Recorder):
+    path = "/handwriting/analyze/stream" if args.stream else "/handwriting/analyze"
+    run = random.random()
+    for wave in range(args.waves):
+        if wave:
+            await asyncio.sleep(args.pause)
+        images = [sample_image(f"{run} wave {wave} student {student}") for student in range(args.students)]
+        await asyncio.gather(*(
+            recorder.timed(client.post(
+                path,
+                files={"image": ("sheet.png", image, "image/png")},
+                data={"user_id": str(student + 1)},
+            ))
+            for student, image in enumerate(images)
+        ))
+
+
+async def steady_practice(client: httpx.AsyncClient, args, recorder: Recorder):
+    # Open loop: requests go out on schedule however slowly earlier ones return
+    tasks = []
+    interval = 1 / args.rate
+    start = time.perf_counter()
+    for i in range(int(args.rate * args.duration)):
+        await asyncio.sleep(max(0.0, start + i * interval - time.perf_counter()))
+        body = {
+            "target_letter": random.choice(string.ascii_uppercase),
+            "difficulty": random.choice(["beginner", "intermediate", "advanced"]),
+            "sentence_count": 5,
+            "user_id": random.randint(1, 50),
+        }
+        tasks.append(asyncio.ensure_future(recorder.timed(client.post("/handwriting/practice-sentences", json=body))))
+    await asyncio.gather(*tasks)
+
+
+async def letters_crud(client: httpx.AsyncClient, args, recorder: Recorder):
+    def new_letter():
+        return {
+            "title": " ".join(random.choices(WORDS, k=3)),
+            "content": " ".join(random.choices(WORDS, k=60)),
+            "recipient": "Grandma",
+            "letter_type": random.choice(["personal", "business", "thank_you", "apology"]),
+        }
+
+    ids = []
+    for _ in range(50):
+        ids.append((await client.post("/letters/", json=new_letter())).json()["id"])
+
+    deadline = time.perf_counter() + args.duration
+
+    async def user():
+        while time.perf_counter() < deadline:
+            roll = random.random()
+            if roll < 0.2:
+                start = time.perf_counter()
+                response = await client.post("/letters/", json=new_letter())
+                recorder.add(response.status_code, time.perf_counter() - start)
+                if response.status_code == 200:
+                    ids.append(response.json()["id"])
+            elif roll < 0.6:
+                await recorder.timed(client.get("/letters/", params={"limit": 50}))
+            elif roll < 0.85:
+                await recorder.timed(client.get(f"/letters/{random.choice(ids)}"))
+            else:
+                await recorder.timed(client.get("/letters/search", params={"q": random.choice(WORDS)[:4]}))
+
+    await asyncio.gather(*(user() for _ in range(args.concurrency)))
+
+
+PROFILES = {
+    "classroom_burst": classroom_burst,
+    "steady_practice": steady_practice,
+    "letters_crud": letters_crud,
+}
+
+
+def start_api(args):
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(args.workers),
+        "PORT": str(API_PORT),
+        "LETTERBUDDY_DATA_DIR": tempfile.mkdtemp(),
+        "OPENAI_API_KEY": "test",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{UPSTREAM_PORT}/v1",
+        "LOG_LEVEL": "info",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "start.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    ready = 0
+    while ready < args.workers:
+        line = process.stderr.readline()
+        if not line:
+            raise RuntimeError("Server exited during startup")
+        ready += "Application startup complete" in line
+    # Keep draining the log so workers never block on a full pipe
+    threading.Thread(target=process.stderr.read, daemon=True).start()
+    return process
+
+
+def summarize(profile: str, recorder: Recorder, peak_rss: int, params: dict) -> dict:
+    ordered = sorted(recorder.latencies)
+    wall = recorder.finished - recorder.started
+    total = sum(recorder.statuses.values())
+    return {
+        "profile": profile,
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "git_commit": git_commit(),
+        "params": params,
+        "requests": total,
+        "ok": len(ordered),
+        "statuses": {str(status): count for status, count in sorted(recorder.statuses.items())},
+        "wall_seconds": round(wall, 3),
+        "throughput_rps": round(len(ordered) / wall, 2) if wall else 0.0,
+        "latency_ms": {
+            name: round(percentile(ordered, fraction) * 1000, 1)
+            for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99), ("max", 1.0))
+        },
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 1),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Print current vs baseline; returns the metrics that regressed beyond the tolerance"""
+    regressions = []
+    rows = [(f"latency {name}", result["latency_ms"][name], baseline["latency_ms"][name], "ms", True)
+            for name in ("p50", "p95", "p99")]
+    rows.append(("throughput", result["throughput_rps"], baseline["throughput_rps"], "req/s", False))
+    rows.append(("peak RSS", result["peak_rss_mb"], baseline["peak_rss_mb"], "MB", True))
+    print(f"   vs baseline from {baseline['recorded_at']} ({baseline.get('git_commit')}):")
+    for label, current, previous, unit, lower_is_better in rows:
+        change = (current - previous) / previous if previous else 0.0
+        worse = change > tolerance if lower_is_better else change < -tolerance
+        # Only latency and throughput fail a run; RSS is reported for context
+        if worse and label != "peak RSS":
+            regressions.append(label)
+        flag = "  REGRESSION" if worse and label != "peak RSS" else ""
+        print(f"     {label:12} {previous:9.1f} -> {current:9.1f} {unit:5} ({change:+.1%}){flag}")
+    return regressions
+
+
+def report(result: dict):
+    latency = result["latency_ms"]
+    print(
+        f"-- {result['profile']}: {result['requests']} requests, {result['ok']} ok {result['statuses']}\n"
+        f"   {result['throughput_rps']:.1f} req/s  p50 {latency['p50']:.1f} ms  p95 {latency['p95']:.1f} ms  "
+        f"p99 {latency['p99']:.1f} ms  max {latency['max']:.1f} ms  peak RSS {result['peak_rss_mb']:.1f} MB"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", nargs="+", choices=list(PROFILES), default=list(PROFILES))
+    parser.add_argument("--workers", type=int, default=1)
+    # Fake upstream
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    # Profiles
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--waves", type=int, default=3)
+    parser.add_argument("--pause", type=float, default=5.0)
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--rate", type=float, default=5.0)
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    # Baselines
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative change before a regression")
+    parser.add_argument("--save", action="store_true", help="store this run as the new baseline")
+    args = parser.parse_args()
+
+    upstream = create_app(args.latency, None, args.error_rate, args.slow_rate, args.slow_latency, args.jitter)
+    serve_in_thread(upstream, UPSTREAM_PORT)
+    params = {key: value for key, value in vars(args).items() if key not in ("profiles", "save", "tolerance")}
+
+    regressions = {}
+    for profile in args.profiles:
+        # A fresh server per profile, so memory and caches do not carry over
+        process = start_api(args)
+        try:
+            with RssSampler(process.pid) as rss:
+                async def run():
+                    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=120) as client:
+                        recorder = Recorder()
+                        await PROFILES[profile](client, args, recorder)
+                        recorder.stop()
+                        return recorder
+
+                recorder = asyncio.run(run())
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+        result = summarize(profile, recorder, rss.peak, params)
+        report(result)
+
+        path = os.path.join(BASELINE_DIR, f"{profile}.json")
+        baseline = None
+        if os.path.exists(path):
+            with open(path) as f:
+                baseline = json.load(f)
+            if baseline.get("params") != params:
+                print("   baseline was recorded with different parameters; compare with care")
+            regressed = compare(result, baseline, args.tolerance)
+            if regressed:
+                regressions[profile] = regressed
+        if baseline is None or args.save:
+            os.makedirs(BASELINE_DIR, exist_ok=True)
+            with open(path, "w") as f:
+                json.dump(result, f, indent=2)
+                f.write("\n")
+            print(f"   saved baseline {os.path.relpath(path, BACKEND_DIR)}")
+
+    if regressions:
+        print("Regressions: " + "; ".join(f"{profile}: {', '.join(names)}" for profile, names in regressions.items()))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Cost of the metrics middleware and instrumentation.
+
+Drives the real app in-process (no sockets) with --requests GET /health
+calls, with metrics recording off and on, and reports the per-request
+difference. Then times Histogram.observe() on its own and a /metrics
+render with every route and stage series populated.
+
+Usage (from backend/):
+    python -m benchmarks.bench_metrics --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+
+async def drive(app, path: str, requests: int) -> float:
+    """Call the ASGI app directly; returns seconds per request"""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": b"", "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    from main import app
+    from app.services import metrics
+
+    async def run():
+        # Warm up routing and the middleware stack
+        await drive(app, "/health", 500)
+        results = {}
+        for enabled in (False, True, False, True):
+            metrics.METRICS_ENABLED = enabled
+            seconds = await drive(app, "/health", args.requests)
+            results[enabled] = min(results.get(enabled, seconds), seconds)
+        return results
+
+    results = asyncio.run(run())
+    off, on = results[False], results[True]
+    print(f"GET /health, metrics off: {off * 1e6:7.1f} us/request")
+    print(f"GET /health, metrics on:  {on * 1e6:7.1f} us/request  ({(on - off) * 1e6:+.1f} us)")
+
+    histogram = metrics.Histogram("bench_seconds", "bench", ("stage",))
+    start = time.perf_counter()
+    for i in range(args.requests * 10):
+        histogram.observe(0.0123, "preprocess")
+    per_observe = (time.perf_counter() - start) / (args.requests * 10)
+    print(f"Histogram.observe():      {per_observe * 1e9:7.0f} ns")
+
+    for path in ("/letters/", "/letters/search", "/handwriting/progress", "/handwriting/upstream/stats"):
+        for status in ("200", "404", "500"):
+            metrics.http_requests.inc("GET", path, status)
+            metrics.http_request_seconds.observe(0.01, "GET", path)
+    for stage in ("upload_read", "preprocess", "base64", "upstream_admission", "upstream", "parse"):
+        metrics.stage_seconds.observe(0.01, stage)
+    start = time.perf_counter()
+    body = metrics.registry.render()
+    print(f"/metrics render:          {(time.perf_counter() - start) * 1e3:7.2f} ms ({len(body.splitlines())} lines)")
+
+
+if __name__ == "__main__":
+    main()
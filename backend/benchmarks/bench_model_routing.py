@@ -0,0 +1,132 @@
+"""
+Model routing vs sending everything to the large model.
+
+Runs the same mixed workload twice, with routing off and on:
+  - analyze: --requests uploads, a third each of small clean sheets,
+    large clean sheets and blurry, low-contrast photos;
+  - practice: one request per letter at beginner and at advanced level.
+The fake upstream answers the large model in --large-latency seconds and
+the small one in --small-latency, and --low-confidence of the small
+model's analyses come back with a low confidence (and are escalated).
+Reports request latency, upstream calls, prompt tokens and the per-choice
+outcomes recorded by the router.
+
+Usage (from backend/):
+    python -m benchmarks.bench_model_routing --requests 60 --concurrency 8
+"""
+import argparse
+import asyncio
+import io
+import os
+import statistics
+import tempfile
+import time
+import httpx
+from PIL import Image, ImageDraw, ImageFilter
+
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+def sheet(label: str, size, ink: int = 0, paper: int = 255, blur: float = 0.0) -> bytes:
+    """A lined sheet of handwriting-like text, distinct per label"""
+    image = Image.new("L", size, paper)
+    draw = ImageDraw.Draw(image)
+    for y in range(40, size[1] - 20, 40):
+        draw.text((20, y), f"{label} the quick brown fox", fill=ink)
+        draw.line((20, y + 15, size[0] - 20, y + 15), fill=ink, width=3)
+    if blur:
+        image = image.filter(ImageFilter.GaussianBlur(blur))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def workload(label: str, requests: int):
+    kinds = (
+        ("small clean", dict(size=(400, 200))),
+        ("large clean", dict(size=(1600, 1200))),
+        ("unclear", dict(size=(1600, 1200), ink=80, paper=190, blur=1.2)),
+    )
+    return [sheet(f"{label} {i}", **kinds[i % 3][1]) for i in range(requests)]
+
+
+async def run(images, concurrency: int):
+    letters = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    practice = [(letter, difficulty) for letter in letters for difficulty in ("beginner", "advanced")]
+    slots = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=120) as client:
+        async def send(request):
+            async with slots:
+                start = time.perf_counter()
+                if isinstance(request, bytes):
+                    response = await client.post("/handwriting/analyze", files={"image": ("sheet.png", request, "image/png")})
+                else:
+                    letter, difficulty = request
+                    response = await client.post(
+                        "/handwriting/practice-sentences",
+                        json={"target_letter": letter, "difficulty": difficulty, "sentence_count": 5},
+                    )
+                response.raise_for_status()
+                return time.perf_counter() - start
+
+        analyze = await asyncio.gather(*(send(image) for image in images))
+        practice = await asyncio.gather(*(send(request) for request in practice))
+        return analyze, practice
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--large-latency", type=float, default=1.0)
+    parser.add_argument("--small-latency", type=float, default=0.4)
+    parser.add_argument("--low-confidence", type=float, default=0.2)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+    for route in ("ANALYZE", "PRACTICE"):
+        for budget in ("USER_RPM", "USER_TPM", "GLOBAL_RPM", "GLOBAL_TPM"):
+            os.environ.setdefault(f"RATE_LIMIT_{route}_{budget}", "0")
+
+    # Import after the environment points at the fake upstream
+    from main import app
+    from app.routes import handwriting
+    from app.services.model_router import OPENAI_MODEL_LARGE, OPENAI_MODEL_SMALL, ModelRouter
+    from app.services.practice_corpus import PracticeCorpus
+
+    upstream = create_app(args.large_latency)
+    upstream.state.model_latency = {OPENAI_MODEL_LARGE: args.large_latency, OPENAI_MODEL_SMALL: args.small_latency}
+    upstream.state.low_confidence = {OPENAI_MODEL_SMALL: args.low_confidence}
+    serve_in_thread(upstream, UPSTREAM_PORT)
+    serve_in_thread(app, API_PORT)
+
+    for label, enabled in (("routing off", False), ("routing on", True)):
+        handwriting.model_router = router = ModelRouter(enabled=enabled)
+        # A fresh, empty practice pool so practice requests reach the upstream
+        handwriting.practice_corpus = PracticeCorpus(os.path.join(tempfile.mkdtemp(), "practice.db"))
+        calls_before = upstream.state.calls
+        analyze, practice = asyncio.run(run(workload(label, args.requests), args.concurrency))
+
+        decisions = router.stats()["decisions"]
+        prompt_tokens = sum(d["avg_prompt_tokens"] * d["calls"] for d in decisions)
+        escalated = sum(d["escalated"] for d in decisions)
+        print(f"-- {label}: {upstream.state.calls - calls_before} upstream calls, "
+              f"{prompt_tokens:.0f} prompt tokens, {escalated} escalations")
+        for route, latencies in (("analyze", analyze), ("practice", practice)):
+            latencies = sorted(latencies)
+            print(f"   {route:9} p50 {statistics.median(latencies):5.2f}s  "
+                  f"p95 {latencies[int(len(latencies) * 0.95) - 1]:5.2f}s")
+        for d in decisions:
+            print(f"   {d['route']:9} {d['model']:12} {d['detail'] or '-':5} {d['reason']:26} "
+                  f"calls {d['calls']:3d}  escalated {d['escalated']:3d}  "
+                  f"prompt {d['avg_prompt_tokens']:6.1f}  p50 {d['p50_seconds']:5.2f}s")
+
+
+if __name__ == "__main__":
+    main()
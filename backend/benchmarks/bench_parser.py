@@ -0,0 +1,130 @@
+"""
+Benchmark of the completion parser over recorded model outputs.
+
+Times the single-pass parser in app/services/completion_parser.py against the
+previous split-based parsing code, on every completion in
+benchmarks/completions/ (including malformed, truncated and JSON ones), and
+prints what the parser extracted so regressions are easy to spot.
+
+Usage (from backend/):
+    python -m benchmarks.bench_parser --repeat 2000
+"""
+import argparse
+import glob
+import os
+import timeit
+
+from app.services.analysis_stream import AnalysisStreamParser
+from app.services.completion_parser import parse_analysis, parse_practice
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "completions")
+
+
+def legacy_parse_analysis(analysis_text):
+    """The parsing code analyze_handwriting used before the parser module"""
+    detected_letters = []
+    handwriting_quality = "Good"
+    suggestions = []
+    confidence_score = 0.85
+    letters_to_improve = []
+    if "DETECTED_LETTERS:" in analysis_text:
+        letters_section = analysis_text.split("DETECTED_LETTERS:")[1].split("\n")[0]
+        for char in letters_section:
+            if char.isalpha():
+                detected_letters.append(char.upper())
+        detected_letters = sorted(list(set(detected_letters)))
+    if "QUALITY:" in analysis_text:
+        quality_section = analysis_text.split("QUALITY:")[1].split("\n")[0].strip()
+        if quality_section in ["Excellent", "Good", "Fair", "Needs Improvement"]:
+            handwriting_quality = quality_section
+    if "CONFIDENCE:" in analysis_text:
+        try:
+            confidence_section = analysis_text.split("CONFIDENCE:")[1].split("\n")[0].strip()
+            confidence_score = float(confidence_section)
+        except ValueError:
+            confidence_score = 0.85
+    if "SUGGESTIONS:" in analysis_text:
+        suggestions_section = analysis_text.split("SUGGESTIONS:")[1].split("LETTERS_TO_IMPROVE:")[0] if "LETTERS_TO_IMPROVE:" in analysis_text else analysis_text.split("SUGGESTIONS:")[1]
+        suggestions_text = suggestions_section.strip()
+        if suggestions_text:
+            raw_suggestions = [s.strip() for s in suggestions_text.split('\n') if s.strip()]
+            for suggestion in raw_suggestions:
+                clean_suggestion = suggestion.lstrip('- *0123456789. ')
+                if clean_suggestion and len(clean_suggestion) > 10:
+                    suggestions.append(clean_suggestion)
+    if "LETTERS_TO_IMPROVE:" in analysis_text:
+        letters_to_improve_section = analysis_text.split("LETTERS_TO_IMPROVE:")[1].split("\n")[0].strip()
+        if letters_to_improve_section:
+            letters_to_improve = [l.upper() for l in letters_to_improve_section.split(',') if l.strip()]
+            letters_to_improve = sorted(list(set(letters_to_improve)))
+    return detected_letters, handwriting_quality, suggestions, confidence_score, letters_to_improve
+
+
+def legacy_parse_practice(content):
+    """The parsing code generate_practice_sentences used before the parser module"""
+    sentences = []
+    if "SENTENCES:" in content:
+        sentences_section = content.split("SENTENCES:")[1].split("TIPS:")[0].strip()
+        sentences = [s.strip() for s in sentences_section.split('\n') if s.strip() and not s.startswith('[') and not s.startswith('-')]
+    practice_tips = []
+    if "TIPS:" in content:
+        tips_section = content.split("TIPS:")[1].strip()
+        practice_tips = [tip.strip() for tip in tips_section.split('\n') if tip.strip() and not tip.startswith('[') and not tip.startswith('-')]
+    return sentences, practice_tips
+
+
+def stream_parse(text, chunk_size=8):
+    """Feed a completion through the streaming parser in small chunks"""
+    parser = AnalysisStreamParser()
+    for start in range(0, len(text), chunk_size):
+        parser.feed(text[start:start + chunk_size])
+    parser.finish()
+    return parser.completion
+
+
+def load_corpus():
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.txt"))):
+        with open(path, encoding="utf-8") as f:
+            corpus[os.path.basename(path)] = f.read()
+    # Synthetic worst case: a very long ANALYSIS section, to show how cost grows with length
+    corpus["analysis_long x10 (synthetic)"] = corpus["analysis_long.txt"] + corpus["analysis_long.txt"].split("ANALYSIS:", 1)[1] * 9
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--quiet", action="store_true", help="Only print timings")
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    print(f"{'completion':<34} {'legacy µs':>10} {'parser µs':>10} {'stream µs':>10}")
+    for name, text in corpus.items():
+        is_analysis = name.startswith("analysis")
+        legacy = legacy_parse_analysis if is_analysis else legacy_parse_practice
+        current = parse_analysis if is_analysis else parse_practice
+
+        legacy_us = timeit.timeit(lambda: legacy(text), number=args.repeat) / args.repeat * 1e6
+        current_us = timeit.timeit(lambda: current(text), number=args.repeat) / args.repeat * 1e6
+        stream_column = ""
+        if is_analysis:
+            stream_us = timeit.timeit(lambda: stream_parse(text), number=args.repeat) / args.repeat * 1e6
+            stream_column = f"{stream_us:>10.1f}"
+        print(f"{name:<34} {legacy_us:>10.1f} {current_us:>10.1f} {stream_column}")
+
+    if args.quiet:
+        return
+
+    print()
+    for name, text in corpus.items():
+        result = parse_analysis(text) if name.startswith("analysis") else parse_practice(text)
+        print(f"{name}: {result}")
+        if name.startswith("analysis") and not result.structured:
+            streamed = stream_parse(text)
+            if streamed != result:
+                print(f"  streaming parser differs: {streamed}")
+
+
+if __name__ == "__main__":
+    main()
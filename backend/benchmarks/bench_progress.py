@@ -0,0 +1,85 @@
+"""
+Write and read latency of the handwriting progress store as history grows.
+
+Records analyses for one user in a scratch database, one per simulated
+hour, and at each history length times GET /handwriting/progress's
+aggregate lookup next to recomputing the same numbers from the stored
+history, which is what a read-time implementation would have to do.
+
+Usage (from backend/):
+    python -m benchmarks.bench_progress --history 100 1000 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+
+from app.db import ConnectionPool
+from app.services.progress import ProgressStore
+from benchmarks.bench_letters_store import report, timed
+
+QUALITIES = ["Excellent", "Good", "Fair", "Needs Improvement"]
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def sample_result(rng: random.Random) -> dict:
+    return {
+        "detected_letters": list(LETTERS),
+        "handwriting_quality": rng.choice(QUALITIES),
+        "suggestions": ["Practice letter formation"],
+        "confidence_score": round(rng.uniform(0.5, 0.95), 2),
+        "analysis": "Bench analysis " * 20,
+        "letters_to_improve": rng.sample(LETTERS, rng.randint(0, 4)),
+    }
+
+
+def recompute(pool: ConnectionPool, user_id: int) -> dict:
+    """The read-time alternative: scan the user's history on every request"""
+    counts = {}
+    with pool.connection() as conn:
+        rows = conn.execute(
+            "SELECT quality_score, confidence_score, letters_to_improve FROM handwriting_analyses "
+            "WHERE user_id = ? ORDER BY id",
+            (user_id,),
+        ).fetchall()
+    for row in rows:
+        for letter in json.loads(row["letters_to_improve"]):
+            counts[letter] = counts.get(letter, 0) + 1
+    qualities = [row["quality_score"] for row in rows if row["quality_score"] is not None]
+    return {
+        "analysis_count": len(rows),
+        "average_quality": sum(qualities) / len(qualities),
+        "average_confidence": sum(row["confidence_score"] for row in rows) / len(rows),
+        "letters": counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--samples", type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory() as directory:
+        pool = ConnectionPool(os.path.join(directory, "bench.db"), size=2)
+        store = ProgressStore(pool)
+        recorded = 0
+        for history in sorted(args.history):
+            while recorded < history:
+                store.record(1, sample_result(rng), now=recorded * 3600.0)
+                recorded += 1
+            print(f"-- {history} analyses")
+            report("record (own transaction)", timed(
+                lambda: store.record(2, sample_result(rng), now=recorded * 3600.0), args.samples
+            ))
+            report("progress (aggregates)", timed(lambda: store.get(1, now=recorded * 3600.0), args.samples))
+            report("progress (recomputed from history)", timed(
+                lambda: recompute(pool, 1), max(args.samples * 100 // history, 5)
+            ))
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Prompt templates: prefix stability, render cost and token estimates.
+
+For every letter A-Z at every difficulty, builds the practice messages:
+  - old: the per-request f-string system prompt this replaced, with the
+    letter, count and difficulty inside it
+  - new: PRACTICE_PROMPT, a fixed system message and a rendered user message
+and reports how many distinct system messages there are and the longest
+prefix shared by all requests. That prefix is what OpenAI's prompt cache can
+reuse. It also reports the time to build the messages (and, for new, count
+their tokens), and each template's local token estimate next to the usage
+the fake upstream reports. The fake counts 4 characters per token, so the
+two only differ by tokenizer when tiktoken is installed; in production,
+GET /handwriting/prompts compares estimates with OpenAI's usage.
+
+Usage (from backend/):
+    python -m benchmarks.bench_prompts --repeat 20000
+"""
+import argparse
+import os
+import time
+from string import ascii_uppercase
+
+from benchmarks.fake_openai import prompt_usage
+from app.services.prompts import ANALYSIS_PROMPT, PRACTICE_PROMPT, count_tokens, estimate_image_tokens, tokenizer_name
+
+DIFFICULTIES = ("beginner", "intermediate", "advanced")
+
+
+def old_practice_messages(target_letter: str, difficulty: str, sentence_count: int):
+    system_prompt = f"""
+    You are a handwriting practice expert. Generate {sentence_count} practice sentences that contain the letter '{target_letter}' very frequently.
+
+    Requirements:
+    - Each sentence should contain the letter '{target_letter}' at least 3-5 times
+    - Sentences should be natural, meaningful, and engaging
+    - Vary the difficulty based on the requested level: {difficulty}
+    - Make sentences appropriate for handwriting practice
+    - Include both uppercase and lowercase versions of '{target_letter}' when possible
+
+    Difficulty levels:
+    - beginner: Simple, short sentences with basic vocabulary
+    - intermediate: Medium-length sentences with varied vocabulary
+    - advanced: Longer, more complex sentences with sophisticated vocabulary
+
+    Format your response as:
+    SENTENCES:
+    [Sentence 1]
+    [Sentence 2]
+    [Sentence 3]
+    [Sentence 4]
+    [Sentence 5]
+
+    TIPS:
+    [Tip 1]
+    [Tip 2]
+    [Tip 3]
+    """
+    user_message = f"Generate {sentence_count} practice sentences for the letter '{target_letter}' at {difficulty} difficulty level."
+    return [{"role": "system", "content": system_prompt}, {"role": "user", "content": user_message}]
+
+
+def new_practice_messages(target_letter: str, difficulty: str, sentence_count: int):
+    user_message = PRACTICE_PROMPT.render(
+        sentence_count=sentence_count, target_letter=target_letter, difficulty=difficulty
+    )
+    PRACTICE_PROMPT.estimate(user_message)
+    return PRACTICE_PROMPT.messages(user_message)
+
+
+def serialized(messages) -> str:
+    """The request text in order, as the upstream tokenizes it"""
+    return "".join(f"{message['role']}\n{message['content']}\n" for message in messages)
+
+
+def shared_prefix(texts) -> int:
+    return len(os.path.commonprefix(list(texts)))
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(ascii_uppercase[i % 26], DIFFICULTIES[i % 3], 5)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20000)
+    args = parser.parse_args()
+
+    requests = [(letter, difficulty, 5) for letter in ascii_uppercase for difficulty in DIFFICULTIES]
+    print(f"{len(requests)} practice requests (26 letters x 3 levels), tokens counted with {tokenizer_name()}")
+    print(f"{'':4} {'system prompts':>15} {'shared prefix':>22} {'build':>9}")
+    for label, build in (("old", old_practice_messages), ("new", new_practice_messages)):
+        built = [build(*request) for request in requests]
+        systems = {messages[0]["content"] for messages in built}
+        prefix = shared_prefix(serialized(messages) for messages in built)
+        text = serialized(built[0])[:prefix]
+        per_call = timed(build, args.repeat)
+        print(f"{label:4} {len(systems):15d} {prefix:8d} chars {count_tokens(text):5d} tok {per_call * 1e6:7.2f}us")
+
+    # Local estimates against the fake upstream's usage (same rules as its responses)
+    print(f"{'prompt':14} {'key':>22} {'estimate':>9} {'upstream':>9}")
+    user_message = PRACTICE_PROMPT.render(sentence_count=5, target_letter="S", difficulty="beginner")
+    estimate = PRACTICE_PROMPT.estimate(user_message)
+    actual, _ = prompt_usage(PRACTICE_PROMPT.messages(user_message), set())
+    print(f"{'practice':14} {PRACTICE_PROMPT.key:>22} {estimate:9d} {actual:9d}")
+    for detail, size in (("low", (512, 384)), ("high", (1024, 768))):
+        image = {"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,", "detail": detail}}
+        estimate = ANALYSIS_PROMPT.estimate(ANALYSIS_PROMPT.render(), estimate_image_tokens(*size, detail))
+        actual, _ = prompt_usage(ANALYSIS_PROMPT.messages(ANALYSIS_PROMPT.render(), images=[image]), set())
+        print(f"{'analysis/' + detail:14} {ANALYSIS_PROMPT.key:>22} {estimate:9d} {actual:9d}")
+
+
+if __name__ == "__main__":
+    main()
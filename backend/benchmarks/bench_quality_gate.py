@@ -0,0 +1,86 @@
+"""
+CPU cost of the local image quality gate.
+
+Builds synthetic handwriting photos (clean, blurry, blank, dark) at several
+resolutions, and reports the verdict and the time per image for the gate
+alone (assess_image on a decoded grayscale image) and for the full
+preprocess_image call it runs inside. The gate should cost a small fraction
+of preprocessing and nothing compared with a vision API round trip.
+
+Usage (from backend/):
+    python -m benchmarks.bench_quality_gate --repeat 50
+"""
+import argparse
+import io
+import time
+from PIL import Image, ImageDraw, ImageFilter
+
+from app.services.image_preprocessing import preprocess_image
+from app.services.image_quality import ImageQualityError, assess_image
+
+SIZES = [(640, 480), (1600, 1200), (4032, 3024)]
+
+
+def handwriting_page(width: int, height: int, lines: int = 6) -> Image.Image:
+    image = Image.new("L", (width, height), 235)
+    draw = ImageDraw.Draw(image)
+    step = height // (lines + 2)
+    for i in range(lines):
+        y = step * (i + 1)
+        # Wavy strokes stand in for cursive writing
+        points = [(x, y + (x // 7 % 9) * step // 30) for x in range(width // 10, width * 9 // 10, 6)]
+        draw.line(points, fill=30, width=max(width // 400, 2))
+    return image
+
+
+def samples(width: int, height: int):
+    page = handwriting_page(width, height)
+    return {
+        "clean": page,
+        "blurry": page.filter(ImageFilter.GaussianBlur(width / 250)),
+        "blank": Image.new("L", (width, height), 235),
+        "dark": Image.new("L", (width, height), 25),
+    }
+
+
+def encode(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.convert("RGB").save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def time_per_call(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run_preprocess(data: bytes):
+    try:
+        preprocess_image(data)
+    except ImageQualityError:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    print(f"{'size':>10} {'image':>7} {'verdict':>8} {'sharpness':>10} {'gate us':>10} {'preprocess us':>14}")
+    for width, height in SIZES:
+        for name, image in samples(width, height).items():
+            report = assess_image(image)
+            data = encode(image)
+            gate_us = time_per_call(lambda: assess_image(image), args.repeat)
+            preprocess_us = time_per_call(lambda: run_preprocess(data), max(args.repeat // 5, 1))
+            verdict = "pass" if report.passed else "reject"
+            print(
+                f"{width}x{height:<5} {name:>7} {verdict:>8} {report.sharpness:>10.1f} "
+                f"{gate_us:>10.0f} {preprocess_us:>14.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Classroom burst against a rate-limited upstream, with and without the limiter.
+
+The fake upstream answers 429 beyond --upstream-limit concurrent calls.
+A class of --students users each post --per-student analyses at once:
+  - ungoverned: in-flight cap and budgets effectively off, so the burst
+    runs into the upstream's own limit (those calls come back as 429s,
+    after the SDK's own retries);
+  - governed: at most --upstream-limit calls in flight, --queue waiting,
+    the rest rejected at once with 429 + Retry-After.
+Reports status counts, upstream 429s and how fast each outcome returned.
+
+Usage (from backend/):
+    python -m benchmarks.bench_rate_limit --students 30 --per-student 2 --upstream-limit 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import httpx
+
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+async def burst(run: str, students: int, per_student: int):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=120) as client:
+        async def analyze(student: int, attempt: int):
+            image = sample_image(f"{run} student {student} sheet {attempt}")
+            start = time.perf_counter()
+            response = await client.post(
+                "/handwriting/analyze",
+                files={"image": ("sheet.png", image, "image/png")},
+                data={"user_id": str(student + 1)},
+            )
+            return response.status_code, response.headers.get("retry-after"), time.perf_counter() - start
+
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(analyze(student, attempt) for student in range(students) for attempt in range(per_student))
+        )
+        return results, time.perf_counter() - start
+
+
+def report(label: str, results, wall: float, upstream_429s: int, limiter_stats: dict):
+    print(f"-- {label}: {len(results)} requests in {wall:.2f}s, upstream 429s: {upstream_429s}")
+    for status in sorted({status for status, _, _ in results}):
+        times = [seconds for code, _, seconds in results if code == status]
+        retry_after = {value for code, value, _ in results if code == status and value}
+        extra = f"  Retry-After {sorted(retry_after)}" if retry_after else ""
+        print(f"   {status}: {len(times):3d}  median {statistics.median(times):6.2f}s  max {max(times):6.2f}s{extra}")
+    print(f"   limiter: admitted {limiter_stats['admitted']}, queued {limiter_stats['queued']}, "
+          f"rejected {limiter_stats['rejected']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--students", type=int, default=30)
+    parser.add_argument("--per-student", type=int, default=2)
+    parser.add_argument("--upstream-limit", type=int, default=8)
+    parser.add_argument("--queue", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+    os.environ.setdefault("OPENAI_MAX_CONNECTIONS", "200")
+
+    upstream = create_app(args.latency, max_in_flight=args.upstream_limit)
+    serve_in_thread(upstream, UPSTREAM_PORT)
+
+    # Import after the environment points at the fake upstream
+    from main import app
+    from app.routes import handwriting
+    from app.services.rate_limiter import RouteLimits, UpstreamLimiter
+    serve_in_thread(app, API_PORT)
+
+    unlimited = RouteLimits(user_requests=0, user_tokens=0, global_requests=0, global_tokens=0)
+    runs = [
+        ("ungoverned", UpstreamLimiter({"analyze": unlimited, "practice": unlimited}, max_in_flight=10_000)),
+        ("governed", UpstreamLimiter(
+            {"analyze": unlimited, "practice": unlimited},
+            max_in_flight=args.upstream_limit,
+            max_queue=args.queue,
+        )),
+    ]
+    for label, limiter in runs:
+        handwriting.upstream_limiter = limiter
+        upstream.state.rate_limited = 0
+        results, wall = asyncio.run(burst(label, args.students, args.per_student))
+        report(label, results, wall, upstream.state.rate_limited, limiter.stats())
+        # Let the upstream's Retry-After window pass before the next run
+        time.sleep(1.5)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Retries, hedging and the circuit breaker against a misbehaving fake upstream.
+
+Three scenarios, each with the resilience layer off and on:
+  - flaky: --error-rate of upstream calls fail with a 500. Without retries
+    those become failed analyses; with jittered retries almost all succeed.
+  - slow tail: --slow-rate of calls take --slow-latency. Hedging sends a
+    second request after the recent p95 and cuts the tail.
+  - outage: every call fails. Without a breaker each request pays for its
+    retries; with it, requests fail fast to the local measured analysis.
+Requests are sequential per client and run --concurrency at a time.
+
+Usage (from backend/):
+    python -m benchmarks.bench_resilience --requests 300 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+import httpx
+
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+async def run(label: str, requests: int, concurrency: int):
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+    results = []
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=120) as client:
+        async def worker():
+            while not queue.empty():
+                i = queue.get_nowait()
+                start = time.perf_counter()
+                response = await client.post(
+                    "/handwriting/analyze",
+                    files={"image": ("sheet.png", sample_image(f"{label} {i}"), "image/png")},
+                )
+                source = response.json().get("source") if response.status_code == 200 else None
+                results.append((response.status_code, source, time.perf_counter() - start))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return results
+
+
+def report(label: str, results, stats: dict):
+    latencies = sorted(seconds for _, _, seconds in results)
+    model = sum(1 for status, source, _ in results if status == 200 and source == "model")
+    local = sum(1 for status, source, _ in results if status == 200 and source == "local")
+    failed = len(results) - model - local
+    p99 = latencies[max(int(len(latencies) * 0.99) - 1, 0)]
+    analyze = stats.get("analyze", {})
+    print(
+        f"{label:28} model {model:4d}  local {local:4d}  failed {failed:4d}  "
+        f"p50 {statistics.median(latencies):5.2f}s  p99 {p99:5.2f}s  "
+        f"retries {analyze.get('retries', 0):3d}  hedges {analyze.get('hedges', 0):3d} "
+        f"(won {analyze.get('hedges_won', 0)})  breaker opened {analyze.get('breaker', {}).get('times_opened', 0)}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--error-rate", type=float, default=0.2)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+    # Keep the limiter out of the way: this benchmark is about upstream failures
+    for budget in ("USER_RPM", "USER_TPM", "GLOBAL_RPM", "GLOBAL_TPM"):
+        os.environ.setdefault(f"RATE_LIMIT_ANALYZE_{budget}", "0")
+
+    upstream = create_app(args.latency)
+    serve_in_thread(upstream, UPSTREAM_PORT)
+
+    # Import after the environment points at the fake upstream
+    from main import app
+    from app.routes import handwriting
+    from app.services.resilience import CircuitBreaker, UpstreamResilience
+    serve_in_thread(app, API_PORT)
+
+    never_open = 10 ** 9
+    scenarios = [
+        ("flaky", {"error_rate": args.error_rate, "slow_rate": 0.0}, [
+            ("no retries", UpstreamResilience(max_retries=0), never_open),
+            ("retries", UpstreamResilience(), never_open),
+        ]),
+        ("slow tail", {"error_rate": 0.0, "slow_rate": args.slow_rate}, [
+            ("no hedging", UpstreamResilience(hedge_enabled=False), never_open),
+            ("hedging after p95", UpstreamResilience(hedge_enabled=True), never_open),
+        ]),
+        ("outage", {"error_rate": 1.0, "slow_rate": 0.0}, [
+            ("retries, no breaker", UpstreamResilience(), never_open),
+            ("retries + breaker", UpstreamResilience(), None),
+        ]),
+    ]
+    for scenario, upstream_state, variants in scenarios:
+        print(f"-- {scenario}")
+        for attribute, value in upstream_state.items():
+            setattr(upstream.state, attribute, value)
+        upstream.state.slow_latency = args.slow_latency
+        for label, resilience, threshold in variants:
+            if threshold is not None:
+                resilience.route("analyze").breaker = CircuitBreaker(failure_threshold=threshold)
+            handwriting.upstream_resilience = resilience
+            results = asyncio.run(run(f"{scenario} {label}", args.requests, args.concurrency))
+            report(label, results, resilience.stats())
+
+
+if __name__ == "__main__":
+    main()
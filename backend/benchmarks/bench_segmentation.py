@@ -0,0 +1,73 @@
+"""
+Benchmark of the local segmentation engine behind /handwriting/feedback/image.
+
+Measures synthetic handwriting pages one at a time and as a single vectorized
+batch, reporting milliseconds per image for decoding and for measurement, plus
+the metrics of the first page so changes in the output are easy to spot.
+
+Usage (from backend/):
+    python -m benchmarks.bench_segmentation --images 16 --repeat 5
+"""
+import argparse
+import io
+import random
+import time
+from PIL import Image, ImageDraw, ImageFont
+
+from app.services.segmentation import load_grayscale, measure_batch
+
+TEXT = "the quick brown fox jumps over the lazy dog"
+
+
+def handwriting_page(seed: int, width: int = 1600, height: int = 1200) -> bytes:
+    """JPEG page of jittered letters, different per seed"""
+    rng = random.Random(seed)
+    font = ImageFont.load_default(size=56)
+    image = Image.new("L", (width, height), 235)
+    draw = ImageDraw.Draw(image)
+    for line in range(5):
+        x = 80
+        for char in TEXT[: rng.randint(20, len(TEXT))]:
+            y = 120 + line * 200 + rng.randint(-6, 6)
+            draw.text((x, y), char, fill=rng.randint(10, 60), font=font)
+            x += draw.textlength(char, font=font) + rng.randint(2, 10)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=85)
+    return buffer.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", type=int, default=16)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    uploads = [handwriting_page(seed) for seed in range(args.images)]
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        images = [load_grayscale(data) for data in uploads]
+    decode_ms = (time.perf_counter() - start) / (args.repeat * args.images) * 1000
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for image in images:
+            measure_batch([image])
+    single_ms = (time.perf_counter() - start) / (args.repeat * args.images) * 1000
+
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        metrics = measure_batch(images)
+    batch_ms = (time.perf_counter() - start) / (args.repeat * args.images) * 1000
+
+    print(f"images:             {args.images} ({images[0].width}x{images[0].height} working size)")
+    print(f"decode + gate:      {decode_ms:.2f} ms/image")
+    print(f"measure one by one: {single_ms:.2f} ms/image")
+    print(f"measure as batch:   {batch_ms:.2f} ms/image")
+    print("first page:")
+    for name, value in metrics[0].to_dict().items():
+        print(f"  {name:20} {value:.3f}" if isinstance(value, float) else f"  {name:20} {value}")
+
+
+if __name__ == "__main__":
+    main()
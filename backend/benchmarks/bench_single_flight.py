@@ -0,0 +1,112 @@
+"""
+Identical concurrent requests with and without single-flight coalescing.
+
+Two bursts of --requests requests sent at the same moment:
+  - analyze: the same sheet uploaded by everyone (a double-submitting
+    upload page, a class photographing the same worksheet);
+  - practice: the same letter, difficulty and count for a whole class.
+The analysis cache is off and the practice pool is empty, so without
+coalescing every request makes its own upstream call.
+Reports upstream calls, calls saved and request latency.
+
+Usage (from backend/):
+    python -m benchmarks.bench_single_flight --requests 30 --latency 1.0
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+import httpx
+
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+class NoCoalescing:
+    """Stand-in for SingleFlight that runs every call"""
+
+    async def do(self, key, coro_fn):
+        return await coro_fn()
+
+    async def join(self, key):
+        return None
+
+    def stats(self) -> dict:
+        return {"saved": 0}
+
+
+async def burst(requests: int, send):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=120) as client:
+        async def timed_send(i: int):
+            start = time.perf_counter()
+            response = await send(client, i)
+            response.raise_for_status()
+            return time.perf_counter() - start
+
+        return await asyncio.gather(*(timed_send(i) for i in range(requests)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+    # A fresh, empty practice pool so practice requests reach the upstream
+    os.environ["PRACTICE_CORPUS_PATH"] = os.path.join(tempfile.mkdtemp(), "practice.db")
+    for route in ("ANALYZE", "PRACTICE"):
+        for budget in ("USER_RPM", "USER_TPM", "GLOBAL_RPM", "GLOBAL_TPM"):
+            os.environ.setdefault(f"RATE_LIMIT_{route}_{budget}", "0")
+
+    upstream = create_app(args.latency)
+    serve_in_thread(upstream, UPSTREAM_PORT)
+
+    # Import after the environment points at the fake upstream
+    from main import app
+    from app.routes import handwriting
+    from app.services.single_flight import SingleFlight
+    serve_in_thread(app, API_PORT)
+
+    for label, flights in (("no coalescing", NoCoalescing), ("single-flight", SingleFlight)):
+        handwriting.analysis_flights = flights()
+        handwriting.practice_flights = flights()
+        image = sample_image(label)
+        letter = "S" if label == "single-flight" else "T"
+
+        def analyze(client, i):
+            return client.post(
+                "/handwriting/analyze",
+                files={"image": ("sheet.png", image, "image/png")},
+                data={"user_id": str(i + 1)},
+            )
+
+        def practice(client, i):
+            return client.post(
+                "/handwriting/practice-sentences",
+                json={"target_letter": letter, "difficulty": "beginner", "sentence_count": 5, "user_id": i + 1},
+            )
+
+        print(f"-- {label}")
+        for route, send, route_flights in (
+            ("analyze", analyze, handwriting.analysis_flights),
+            ("practice", practice, handwriting.practice_flights),
+        ):
+            calls_before = upstream.state.calls
+            latencies = asyncio.run(burst(args.requests, send))
+            print(
+                f"   {route:9} {args.requests} requests  upstream calls {upstream.state.calls - calls_before:3d}  "
+                f"saved {route_flights.stats()['saved']:3d}  "
+                f"median {statistics.median(latencies):5.2f}s  max {max(latencies):5.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
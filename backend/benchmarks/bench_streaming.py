@@ -0,0 +1,57 @@
+"""
+Time-to-first-result benchmark for /handwriting/analyze/stream.
+
+Compares the time until the first streamed field arrives with the time
+until the full result, against the fake upstream streaming its completion.
+
+Usage (from backend/):
+    python -m benchmarks.bench_streaming --latency 2.0
+"""
+import argparse
+import asyncio
+import os
+import time
+import httpx
+
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+async def run(label: str):
+    files = {"image": ("sample.png", sample_image(label), "image/png")}
+    timings = []
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=120) as client:
+        start = time.perf_counter()
+        async with client.stream("POST", "/handwriting/analyze/stream", files=files) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line.startswith("event:"):
+                    timings.append((line[len("event:"):].strip(), time.perf_counter() - start))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--latency", type=float, default=2.0)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+
+    serve_in_thread(create_app(args.latency), UPSTREAM_PORT)
+
+    from main import app
+    serve_in_thread(app, API_PORT)
+
+    timings = asyncio.run(run("streaming benchmark"))
+    for event, elapsed in timings:
+        print(f"{elapsed:>7.3f}s  {event}")
+    print(f"time to first field: {timings[0][1]:.3f}s, full result: {timings[-1][1]:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
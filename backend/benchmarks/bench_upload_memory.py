@@ -0,0 +1,172 @@
+"""
+Peak memory of concurrent large uploads to /handwriting/analyze.
+
+Sends N concurrent ~20 MB JPEG uploads to the real route and then to a copy
+of the previous ingestion code (whole-file read, unbounded decoding,
+base64 + f-string data URL, raw upload kept alive during the upstream call). The server runs in a separate process and reports its tracemalloc
+peak of the Python heap and its peak RSS (which only ever grows). With bounded ingestion the peak stops growing once UPLOAD_CONCURRENCY
+uploads are in flight. Also checks that an upload over the limit is rejected
+with 413 without being buffered.
+
+Usage (from backend/):
+    python -m benchmarks.bench_upload_memory --size-mb 19 --concurrency 1 4 8 16
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+import httpx
+import numpy as np
+from PIL import Image
+
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+
+
+def large_jpeg(size_mb: float) -> bytes:
+    """Noise compresses badly, so a noisy photo reaches the target size quickly"""
+    rng = np.random.default_rng(0)
+    pixels = size_mb * 1024 * 1024
+    while True:
+        height = int((pixels * 3 / 4) ** 0.5)
+        noise = rng.integers(0, 256, (height, int(pixels) // height, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(noise).save(buffer, format="JPEG", quality=95)
+        if buffer.tell() <= size_mb * 1024 * 1024:
+            return buffer.getvalue()
+        pixels *= 0.9
+
+
+def bench_router(latency: float):
+    """
+    The ingestion path /handwriting/analyze used before bounded uploads,
+    plus routes to read and reset the server's traced memory peak
+    """
+    from fastapi import APIRouter, File, UploadFile
+    from fastapi.concurrency import run_in_threadpool
+    from app.services.image_preprocessing import preprocess_image
+
+    router = APIRouter()
+
+    @router.post("/bench/legacy-analyze")
+    async def legacy_analyze(image: UploadFile = File(...)):
+        image_data = await image.read()
+        processed = await run_in_threadpool(preprocess_image, image_data)
+        image_base64 = base64.b64encode(processed.data).decode("utf-8")
+        url = f"data:{processed.mime_type};base64,{image_base64}"
+        # Stands in for the upstream call; the raw upload is still referenced
+        await asyncio.sleep(latency)
+        return {"bytes": len(image_data), "url": len(url)}
+
+    @router.post("/bench/memory/reset")
+    async def reset_memory():
+        tracemalloc.reset_peak()
+        return {}
+
+    @router.get("/bench/memory")
+    async def get_memory():
+        _, peak = tracemalloc.get_traced_memory()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        return {"heap_peak_mb": peak / (1024 * 1024), "rss_peak_mb": rss}
+
+    return router
+
+
+def serve(latency: float):
+    """Server process: fake upstream and API, with tracemalloc on"""
+    os.environ["OPENAI_API_KEY"] = "test"
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+    # Identical uploads would otherwise be answered from the cache
+    os.environ["ANALYSIS_CACHE_BACKEND"] = "none"
+    # Noise has no handwriting in it; this benchmark is about ingestion
+    os.environ["QUALITY_GATE_ENABLED"] = "false"
+    tracemalloc.start()
+
+    serve_in_thread(create_app(latency), UPSTREAM_PORT)
+
+    # Import after the environment points at the fake upstream
+    from main import app
+    app.include_router(bench_router(latency))
+    serve_in_thread(app, API_PORT)
+    while True:
+        time.sleep(3600)
+
+
+async def measure(path: str, data: bytes, concurrency: int):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=300) as client:
+        async def upload():
+            response = await client.post(path, files={"image": ("page.jpg", data, "image/jpeg")})
+            return response.status_code
+
+        await client.post("/bench/memory/reset")
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*(upload() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        memory = (await client.get("/bench/memory")).json()
+    return statuses, memory, elapsed
+
+
+async def wait_for_server():
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}") as client:
+        for _ in range(100):
+            try:
+                await client.get("/health")
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError("API server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=19)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8, 16])
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.latency)
+        return
+
+    # Run the server in its own process so client buffers are not counted
+    server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.bench_upload_memory", "--serve", "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        asyncio.run(wait_for_server())
+        from app.services.uploads import UPLOAD_CONCURRENCY, UPLOAD_MAX_BYTES
+
+        data = large_jpeg(args.size_mb)
+        print(f"upload size: {len(data) / (1024 * 1024):.1f} MB, UPLOAD_CONCURRENCY={UPLOAD_CONCURRENCY}")
+        print(f"{'route':>8} {'concurrent':>10} {'status':>7} {'heap peak MB':>13} {'RSS peak MB':>12} {'time s':>7}")
+        # Bounded first: peak RSS never goes down, so the second run only shows growth beyond it
+        for label, path in (("bounded", "/handwriting/analyze"), ("legacy", "/bench/legacy-analyze")):
+            for concurrency in args.concurrency:
+                statuses, memory, elapsed = asyncio.run(measure(path, data, concurrency))
+                status = statuses[0] if len(set(statuses)) == 1 else "mixed"
+                print(
+                    f"{label:>8} {concurrency:>10} {status:>7} {memory['heap_peak_mb']:>13.1f} "
+                    f"{memory['rss_peak_mb']:>12.0f} {elapsed:>7.2f}"
+                )
+
+        oversized = b"\xff\xd8\xff" + os.urandom(UPLOAD_MAX_BYTES + 1024 * 1024)
+        statuses, memory, elapsed = asyncio.run(measure("/handwriting/analyze", oversized, 4))
+        print(f"oversized uploads: status {statuses[0]}, heap peak {memory['heap_peak_mb']:.1f} MB, {elapsed:.2f}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Startup time and throughput of the production launcher with 1 worker vs N.
+
+For each worker count, starts `python start.py` with WEB_CONCURRENCY set
+(and a fresh data directory), times how long until every worker has
+finished starting up, then keeps --concurrency requests in flight for
+--duration seconds against:
+  - letters: GET /letters/ (SQLite read)
+  - feedback: POST /handwriting/feedback/image (CPU-bound segmentation)
+  - analyze: POST /handwriting/analyze against the fake upstream
+    (preprocessing, then an upstream wait of --latency)
+Extra workers only help CPU-bound routes when there are cores to run them on.
+
+Usage (from backend/):
+    python -m benchmarks.bench_workers --workers 1 2 4 --duration 10 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import httpx
+
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import create_app, serve_in_thread
+
+UPSTREAM_PORT = 8900
+API_PORT = 8901
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(workers: int):
+    env = {
+        **os.environ,
+        "WEB_CONCURRENCY": str(workers),
+        "PORT": str(API_PORT),
+        "LETTERBUDDY_DATA_DIR": tempfile.mkdtemp(),
+        "OPENAI_API_KEY": "test",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{UPSTREAM_PORT}/v1",
+        "LOG_LEVEL": "info",
+    }
+    for route in ("ANALYZE", "PRACTICE"):
+        for budget in ("USER_RPM", "USER_TPM", "GLOBAL_RPM", "GLOBAL_TPM"):
+            env.setdefault(f"RATE_LIMIT_{route}_{budget}", "0")
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "start.py"], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    # Ready once every worker has logged the end of its lifespan startup
+    ready = 0
+    while ready < workers:
+        line = process.stderr.readline()
+        if not line:
+            raise RuntimeError("Server exited during startup")
+        ready += "Application startup complete" in line
+    startup = time.perf_counter() - start
+    # Keep draining the log so workers never block on a full pipe
+    threading.Thread(target=process.stderr.read, daemon=True).start()
+    return process, startup
+
+
+async def load(route: str, duration: float, concurrency: int):
+    images = [sample_image(f"workers {route} {i}") for i in range(64)]
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{API_PORT}", timeout=120) as client:
+        async def send(i: int):
+            if route == "letters":
+                return await client.get("/letters/", params={"user_id": 1 + i % 100})
+            path = "/handwriting/feedback/image" if route == "feedback" else "/handwriting/analyze"
+            return await client.post(path, files={"image": ("sheet.png", images[i % len(images)], "image/png")})
+
+        latencies, errors = [], 0
+        deadline = time.perf_counter() + duration
+
+        async def worker(offset: int):
+            nonlocal errors
+            i = offset
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                response = await send(i)
+                if response.status_code == 200:
+                    latencies.append(time.perf_counter() - start)
+                else:
+                    errors += 1
+                i += concurrency
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--routes", nargs="+", default=["letters", "feedback", "analyze"])
+    args = parser.parse_args()
+
+    serve_in_thread(create_app(args.latency), UPSTREAM_PORT)
+    print(f"CPU cores: {os.cpu_count()}")
+
+    for workers in args.workers:
+        process, startup = start_server(workers)
+        try:
+            print(f"-- {workers} worker(s): ready in {startup:.2f}s")
+            for route in args.routes:
+                latencies, errors, wall = asyncio.run(load(route, args.duration, args.concurrency))
+                latencies.sort()
+                p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+                print(
+                    f"   {route:9} {len(latencies) / wall:8.1f} req/s  "
+                    f"p50 {statistics.median(latencies) * 1000 if latencies else 0:7.1f} ms  "
+                    f"p95 {p95 * 1000:7.1f} ms  errors {errors}"
+                )
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    main()
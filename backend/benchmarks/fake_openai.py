@@ -0,0 +1,235 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+Used by the benchmarks so upstream latency can be controlled without
+spending real tokens. Point the backend at it with:
+
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8900/v1
+"""
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from typing import Optional
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ANALYSIS_COMPLETION = """DETECTED_LETTERS: A, B, C, D, E
+QUALITY: Good
+CONFIDENCE: 0.82
+SUGGESTIONS:
+- Keep the loops of your lowercase letters closed
+- Leave a finger-width space between words
+- Keep all letters resting on the baseline
+LETTERS_TO_IMPROVE: A, E
+ANALYSIS: Clear, readable handwriting with mostly consistent letter size."""
+
+PRACTICE_COMPLETION = """SENTENCES:
+Sally sells seashells by the seashore.
+Sam sees six small snails sliding slowly.
+Susan sang softly on Sunday afternoon.
+Seven swans swam swiftly across the stream.
+Stella saw stars sparkle in the sky.
+
+TIPS:
+Keep the curves of the letter even
+Start each letter at the top
+Practice slowly before speeding up"""
+
+
+def prompt_usage(messages, seen: set):
+    """
+    (prompt tokens, cached prompt tokens) of a request. Text counts about 4
+    characters per token and images 85 (low detail) or 765 tokens. Like
+    OpenAI's prompt cache, the longest run of leading messages sent before
+    counts as cached once it is at least 1024 tokens, in 128-token steps.
+    """
+    tokens = 3
+    cached = 0
+    prefix = hashlib.blake2b(digest_size=16)
+    for message in messages:
+        content = message["content"]
+        tokens += 3
+        for part in content if isinstance(content, list) else [{"type": "text", "text": content}]:
+            if part["type"] == "text":
+                tokens += math.ceil(len(part["text"]) / 4)
+            else:
+                tokens += 85 if part["image_url"].get("detail") == "low" else 765
+        prefix.update(json.dumps(message, sort_keys=True).encode())
+        if prefix.hexdigest() in seen:
+            cached = tokens
+        seen.add(prefix.hexdigest())
+    if len(seen) > 100_000:
+        seen.clear()
+    return tokens, 1024 + (cached - 1024) // 128 * 128 if cached >= 1024 else 0
+
+
+def usage_body(prompt_tokens: int, cached_tokens: int, completion_tokens: int = 80) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+async def stream_completion(content: str, model: str, latency: float, usage: Optional[dict] = None):
+    """
+    Stream content word by word as chat.completion.chunk events, spread over
+    the latency, then a chunk with the usage when it is given
+    """
+    pieces = re.findall(r"\S+\s*", content)
+    delay = latency / max(len(pieces), 1)
+    for piece in pieces:
+        await asyncio.sleep(delay)
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    if usage is not None:
+        chunk = {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [],
+            "usage": usage,
+        }
+        yield f"data: {json.dumps(chunk)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def create_app(
+    latency: float = 1.0,
+    max_in_flight: Optional[int] = None,
+    error_rate: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_latency: float = 5.0,
+    jitter: float = 0.0,
+):
+    """
+    Build the fake upstream app with a fixed response latency (seconds).
+    Streaming requests spread the same latency across the streamed chunks.
+    With max_in_flight, requests beyond that many concurrent ones get a 429
+    with Retry-After, like OpenAI's rate limiter; rate_limited counts them.
+    A share error_rate of calls fails with a 500, and a share slow_rate takes
+    slow_latency instead of latency (a latency tail). Every latency is moved
+    by up to +/- jitter seconds at random. app.state.model_latency maps a
+    model name to its own latency, and app.state.low_confidence maps a model
+    name to the share of its analyses that come back with a low confidence.
+    Usage is estimated from the messages (see prompt_usage).
+    All of these live on app.state and can be changed while the server runs.
+    """
+    app = FastAPI()
+    app.state.latency = latency
+    app.state.max_in_flight = max_in_flight
+    app.state.error_rate = error_rate
+    app.state.slow_rate = slow_rate
+    app.state.slow_latency = slow_latency
+    app.state.jitter = jitter
+    app.state.model_latency = {}
+    app.state.low_confidence = {}
+    app.state.in_flight = 0
+    app.state.rate_limited = 0
+    app.state.calls = 0
+    app.state.errors = 0
+    app.state.prompt_prefixes = set()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        if app.state.max_in_flight is not None and app.state.in_flight >= app.state.max_in_flight:
+            app.state.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after": "1"},
+            )
+        app.state.calls += 1
+        if random.random() < app.state.error_rate:
+            app.state.errors += 1
+            return JSONResponse(
+                {"error": {"message": "The server had an error", "type": "server_error", "code": None}},
+                status_code=500,
+            )
+        app.state.in_flight += 1
+        try:
+            return await complete(request)
+        finally:
+            app.state.in_flight -= 1
+
+    async def complete(request: Request):
+        body = await request.json()
+
+        # Vision requests carry a list of content parts in the user message
+        is_vision = isinstance(body["messages"][-1]["content"], list)
+        model = body.get("model", "gpt-4o")
+        content = ANALYSIS_COMPLETION if is_vision else PRACTICE_COMPLETION
+        if is_vision and random.random() < app.state.low_confidence.get(model, 0.0):
+            content = content.replace("CONFIDENCE: 0.82", "CONFIDENCE: 0.41")
+        latency = app.state.model_latency.get(model, app.state.latency)
+        latency = app.state.slow_latency if random.random() < app.state.slow_rate else latency
+        latency = max(0.0, latency + random.uniform(-app.state.jitter, app.state.jitter))
+        usage = usage_body(*prompt_usage(body["messages"], app.state.prompt_prefixes))
+        if body.get("stream"):
+            include_usage = (body.get("stream_options") or {}).get("include_usage")
+            return StreamingResponse(
+                stream_completion(content, model, latency, usage if include_usage else None),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(latency)
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    return app
+
+
+def serve_in_thread(app, port: int):
+    """Run an ASGI app with uvicorn on a background thread and wait until it is up"""
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server, thread
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run the fake OpenAI upstream")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency", type=float, default=1.0)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="answer 429 beyond this many concurrent calls")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of calls answered with a 500")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="share of calls taking --slow-latency")
+    parser.add_argument("--slow-latency", type=float, default=5.0)
+    parser.add_argument("--jitter", type=float, default=0.0, help="move each latency by up to +/- this many seconds")
+    args = parser.parse_args()
+    uvicorn.run(
+        create_app(args.latency, args.max_in_flight, args.error_rate, args.slow_rate, args.slow_latency, args.jitter),
+        host="127.0.0.1",
+        port=args.port,
+    )
@@ -1,16 +1,36 @@
+from dotenv import load_dotenv
+
+# Load environment variables from .env before any module reads its settings
+load_dotenv()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
+from app.middleware import CompressionMiddleware, MetricsMiddleware, RequestSizeLimitMiddleware
 from app.routes import auth, letters, users, handwriting
-from dotenv import load_dotenv
+from app.services.job_queue import job_queue
+from app.services.metrics import registry
+from app.services.openai_client import close_openai_client
+from app.services.repository import database
+from app.services.uploads import UPLOAD_MAX_REQUEST_BYTES
 import os
 
-# Load environment variables from .env file
-load_dotenv()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Background workers for queued handwriting analysis jobs
+    await job_queue.start(handwriting.run_analysis_job)
+    yield
+    await job_queue.stop()
+    # Release the shared upstream connection pool
+    await close_openai_client()
+    database.close()
 
 app = FastAPI(
     title="LetterBuddy API",
     description="Backend API for LetterBuddy - AI-powered letter writing assistant with handwriting analysis",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS middleware - explicitly allow your Vercel domain
@@ -28,6 +48,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Reject oversized uploads while they stream in, before they are spooled
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_bytes=UPLOAD_MAX_REQUEST_BYTES,
+    path_limits={
+        "/handwriting/analyze/batch": handwriting.BATCH_MAX_REQUEST_BYTES,
+        "/handwriting/feedback/batch": handwriting.BATCH_MAX_REQUEST_BYTES,
+    },
+)
+
+# gzip/brotli for large responses; streamed ones (SSE, NDJSON) pass through
+app.add_middleware(CompressionMiddleware)
+
+# Outermost, so latency includes CORS and upload limits and rejected requests are counted too
+app.add_middleware(MetricsMiddleware)
+
 # Include routes directly
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(letters.router, prefix="/letters", tags=["letters"])
@@ -42,6 +78,11 @@ async def root():
 async def health_check():
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """Prometheus text format; counters are per worker process"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
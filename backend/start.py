@@ -1,6 +1,37 @@
+"""
+Production launcher.
+
+Runs WEB_CONCURRENCY uvicorn worker processes (default 1) on PORT, using
+uvloop and httptools when they are installed. Workers share users, letters,
+jobs, the analysis cache and rate limit budgets through the SQLite stores in
+LETTERBUDDY_DATA_DIR; see app/db.py.
+"""
+import importlib.util
 import os
 import uvicorn
 
+
+def installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run("main:app", host="0.0.0.0", port=port, reload=False)
+    workers = max(1, int(os.environ.get("WEB_CONCURRENCY", 1)))
+    # Worker processes read this at import to pick shared stores and split limits
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=port,
+        reload=False,
+        workers=workers,
+        loop="uvloop" if installed("uvloop") else "asyncio",
+        http="httptools" if installed("httptools") else "h11",
+        # Behind Railway's proxy: trust its X-Forwarded-* headers
+        proxy_headers=True,
+        forwarded_allow_ips=os.environ.get("FORWARDED_ALLOW_IPS", "*"),
+        timeout_keep_alive=int(os.environ.get("KEEP_ALIVE_TIMEOUT", 5)),
+        timeout_graceful_shutdown=int(os.environ.get("GRACEFUL_SHUTDOWN_TIMEOUT", 30)),
+        log_level=os.environ.get("LOG_LEVEL", "info"),
+    )
@@ -0,0 +1,45 @@
+import os
+import socket
+import sys
+import tempfile
+
+import pytest
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# The app opens its SQLite stores at import and builds its OpenAI client on
+# first use, so both are pointed at scratch resources before anything imports it
+UPSTREAM_PORT = free_port()
+os.environ["LETTERBUDDY_DATA_DIR"] = tempfile.mkdtemp(prefix="letterbuddy-tests-")
+os.environ["OPENAI_API_KEY"] = "test"
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{UPSTREAM_PORT}/v1"
+
+# Run from backend/ or the repository root: app/ and benchmarks/ import from backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session")
+def fake_upstream():
+    """The fake OpenAI API from benchmarks/, answering after 10ms"""
+    from benchmarks.fake_openai import create_app, serve_in_thread
+
+    upstream = create_app(latency=0.01)
+    server, thread = serve_in_thread(upstream, UPSTREAM_PORT)
+    yield upstream
+    server.should_exit = True
+    thread.join(timeout=5)
+
+
+@pytest.fixture(scope="session")
+def client(fake_upstream):
+    from fastapi.testclient import TestClient
+    from main import app
+
+    # One event loop for the whole session, as the shared OpenAI client expects
+    with TestClient(app) as test_client:
+        yield test_client
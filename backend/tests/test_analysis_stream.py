@@ -0,0 +1,93 @@
+import json
+
+from app.services.analysis_stream import AnalysisStreamParser
+from benchmarks.bench_batch import sample_image
+from benchmarks.fake_openai import ANALYSIS_COMPLETION
+
+
+def feed_all(parser: AnalysisStreamParser, deltas):
+    sections = []
+    for delta in deltas:
+        sections.extend(parser.feed(delta))
+    return sections + parser.finish()
+
+
+def sse_events(body: str):
+    events = []
+    for message in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in message.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_parser_reports_sections_as_they_complete():
+    parser = AnalysisStreamParser()
+    assert parser.feed("DETECTED_LETTERS: A, B\nQUALITY: Go") == ["DETECTED_LETTERS"]
+    assert parser.completion.detected_letters == ["A", "B"]
+    assert parser.feed("od\nSUGGESTIONS:\n- Keep letters on the baseline\n") == ["QUALITY"]
+    # A multi-line section stays open until the next header starts
+    assert parser.feed("- Leave space between words\nCONFIDENCE: 0.8\n") == ["SUGGESTIONS", "CONFIDENCE"]
+    assert parser.completion.suggestions == ["Keep letters on the baseline", "Leave space between words"]
+    assert parser.feed("ANALYSIS: Neat.") == []
+    assert parser.finish() == ["ANALYSIS"]
+    assert parser.completion.analysis == "Neat."
+
+
+def test_parser_handles_headers_split_across_deltas():
+    # Every delta boundary falls inside a header, a separator or a value
+    deltas = ["DETEC", "TED_LET", "TERS", ": A,", " E\nQUA", "LITY:", " Fair\nCONFI", "DENCE: 7", "0%\nLETTERS_TO_IMPROVE: e\n"]
+    parser = AnalysisStreamParser()
+    assert feed_all(parser, deltas) == ["DETECTED_LETTERS", "QUALITY", "CONFIDENCE", "LETTERS_TO_IMPROVE"]
+    assert parser.completion.detected_letters == ["A", "E"]
+    assert parser.completion.handwriting_quality == "Fair"
+    assert parser.completion.confidence_score == 0.7
+    assert parser.completion.letters_to_improve == ["E"]
+
+
+def test_parser_reads_values_below_their_headers():
+    text = "QUALITY:\nExcellent\nCONFIDENCE:\n\n0.93\nLETTERS_TO_IMPROVE:\nN, M\nSUGGESTIONS:\n- Keep the slant even\n"
+    parser = AnalysisStreamParser()
+    # Character by character, the worst case for buffering
+    assert feed_all(parser, list(text)) == ["QUALITY", "CONFIDENCE", "LETTERS_TO_IMPROVE", "SUGGESTIONS"]
+    assert parser.completion.handwriting_quality == "Excellent"
+    assert parser.completion.confidence_score == 0.93
+    assert parser.completion.letters_to_improve == ["M", "N"]
+    assert parser.completion.suggestions == ["Keep the slant even"]
+    assert parser.text == text
+
+
+def test_stream_endpoint_sends_fields_in_order_then_result(client):
+    files = {"image": ("sheet.png", sample_image("stream test"), "image/png")}
+    response = client.post("/handwriting/analyze/stream", files=files, data={"user_id": "7"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = sse_events(response.text)
+    assert [event for event, _ in events] == [
+        "detected_letters",
+        "handwriting_quality",
+        "confidence_score",
+        "suggestions",
+        "letters_to_improve",
+        "analysis",
+        "result",
+    ]
+    fields = dict(events)
+    result = fields["result"]
+    assert result["detected_letters"] == ["A", "B", "C", "D", "E"]
+    assert result["handwriting_quality"] == "Good"
+    assert result["confidence_score"] == 0.82
+    assert result["letters_to_improve"] == ["A", "E"]
+    assert len(result["suggestions"]) == 3
+    assert result["analysis"] == ANALYSIS_COMPLETION
+    # Each streamed field matches the final result
+    for event, data in events[:-2]:
+        assert data["value"] == result[event]
+
+
+def test_stream_endpoint_replays_cached_result(client):
+    files = {"image": ("sheet.png", sample_image("stream cache test"), "image/png")}
+    first = sse_events(client.post("/handwriting/analyze/stream", files=files).text)
+    second = sse_events(client.post("/handwriting/analyze/stream", files=files).text)
+    assert [event for event, _ in second] == [event for event, _ in first]
+    assert second[-1] == first[-1]
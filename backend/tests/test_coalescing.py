@@ -0,0 +1,75 @@
+import threading
+import time
+
+import pytest
+
+from app.services.rate_limiter import MemoryBucketStore, RouteLimits, upstream_limiter
+from benchmarks.bench_batch import sample_image
+from tests.test_analysis_stream import sse_events
+
+
+def run_together(*calls, stagger=0.05):
+    """Run each call on its own thread, started stagger seconds apart; returns their results in order"""
+    results = [None] * len(calls)
+
+    def run(index, call):
+        results[index] = call()
+
+    threads = [threading.Thread(target=run, args=(index, call)) for index, call in enumerate(calls)]
+    for thread in threads:
+        thread.start()
+        time.sleep(stagger)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+@pytest.fixture
+def slow_upstream(fake_upstream, monkeypatch):
+    """Upstream calls long enough for a second request to arrive while the first runs"""
+    monkeypatch.setattr(fake_upstream.state, "latency", 0.4)
+    return fake_upstream
+
+
+def test_concurrent_streams_of_one_image_share_an_upstream_call(client, slow_upstream):
+    files = {"image": ("sheet.png", sample_image("coalesced stream"), "image/png")}
+    calls = slow_upstream.state.calls
+    first, second = run_together(
+        lambda: client.post("/handwriting/analyze/stream", files=files, data={"user_id": "21"}),
+        lambda: client.post("/handwriting/analyze/stream", files=files, data={"user_id": "22"}),
+    )
+    assert slow_upstream.state.calls - calls == 1
+    # The follower joined mid-stream and still got every event from the start
+    assert sse_events(first.text) == sse_events(second.text)
+    assert sse_events(first.text)[-1][0] == "result"
+
+
+def test_plain_analysis_joins_a_running_stream(client, slow_upstream):
+    files = {"image": ("sheet.png", sample_image("stream then plain"), "image/png")}
+    calls = slow_upstream.state.calls
+    streamed, plain = run_together(
+        lambda: client.post("/handwriting/analyze/stream", files=files),
+        lambda: client.post("/handwriting/analyze", files=files),
+    )
+    assert slow_upstream.state.calls - calls == 1
+    assert plain.status_code == 200
+    assert plain.json() == sse_events(streamed.text)[-1][1]
+
+
+@pytest.mark.parametrize("throttled_first", [True, False])
+def test_coalesced_practice_calls_are_limited_per_caller(client, slow_upstream, monkeypatch, throttled_first):
+    limits = dict(upstream_limiter.limits)
+    limits["practice"] = RouteLimits(user_requests=1, user_tokens=0, global_requests=1000, global_tokens=0)
+    monkeypatch.setattr(upstream_limiter, "limits", limits)
+    monkeypatch.setattr(upstream_limiter, "store", MemoryBucketStore(100))
+
+    def practice(user_id):
+        # Q never fills the pool (the fake sentences have no Q), so every request is a live call
+        return lambda: client.post(
+            "/handwriting/practice-sentences", json={"target_letter": "Q", "sentence_count": 3, "user_id": user_id}
+        )
+
+    assert practice(31)().status_code == 200  # user 31's only request this minute
+    users = [31, 32] if throttled_first else [32, 31]
+    responses = run_together(*(practice(user_id) for user_id in users))
+    assert {user_id: response.status_code for user_id, response in zip(users, responses)} == {31: 429, 32: 200}
@@ -0,0 +1,196 @@
+import glob
+import os
+
+import pytest
+
+from app.services.completion_parser import parse_analysis, parse_practice
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "completions")
+
+
+def completion(name: str) -> str:
+    with open(os.path.join(CORPUS_DIR, name)) as f:
+        return f.read()
+
+
+# Expected fields per recorded analysis completion; fields not listed are not checked
+ANALYSIS_EXPECTED = {
+    "analysis_clean.txt": {
+        "detected_letters": ["A", "B", "C", "D", "E", "H", "L", "O", "W"],
+        "handwriting_quality": "Good",
+        "confidence_score": 0.82,
+        "suggestions": [
+            "Keep the loops of your lowercase letters closed",
+            "Leave a finger-width space between words",
+            "Keep all letters resting on the baseline",
+        ],
+        "letters_to_improve": ["A", "E"],
+        "structured": False,
+    },
+    "analysis_empty.txt": {
+        "detected_letters": None,
+        "handwriting_quality": None,
+        "confidence_score": None,
+        "suggestions": None,
+        "letters_to_improve": None,
+        "analysis": None,
+    },
+    "analysis_inline_suggestions.txt": {
+        "handwriting_quality": "Good",
+        "confidence_score": 0.85,
+        "letters_to_improve": ["A", "E", "R", "S"],
+    },
+    "analysis_json.txt": {
+        "detected_letters": ["N", "S", "U"],
+        "handwriting_quality": "Good",
+        "confidence_score": 0.88,
+        "suggestions": ["Keep the curves of the S symmetrical", "Join the u and n smoothly without lifting"],
+        "letters_to_improve": ["S"],
+        "analysis": "Smooth strokes with a slightly uneven S.",
+        "structured": True,
+    },
+    "analysis_json_fenced.txt": {
+        "detected_letters": ["A", "I", "N", "R"],
+        "handwriting_quality": "Fair",
+        "confidence_score": 0.6,
+        "suggestions": ["Close the loop on the lowercase a", "Keep the tail of the R straight"],
+        "letters_to_improve": ["A", "R"],
+        "analysis": "Readable, with a few malformed letters.",
+        "structured": True,
+    },
+    "analysis_long.txt": {
+        "handwriting_quality": "Good",
+        "confidence_score": 0.78,
+        "letters_to_improve": ["A", "D", "G", "K", "R"],
+    },
+    "analysis_malformed.txt": {
+        "detected_letters": None,
+        "handwriting_quality": None,
+        "confidence_score": None,
+        "suggestions": None,
+    },
+    "analysis_markdown.txt": {
+        "handwriting_quality": "Fair",
+        "confidence_score": 0.7,
+        "suggestions": [
+            'Practice closing the bowl of the lowercase "b"',
+            # A leading digit that is content, not a list number
+            "3 short practice sessions a day work better than one long one",
+            'Keep ascenders like "h" and "k" the same height',
+        ],
+        "letters_to_improve": ["B", "K", "Q"],
+        "analysis": "The writing is legible but letter heights vary, especially for ascenders.",
+    },
+    "analysis_out_of_order.txt": {
+        "detected_letters": ["D", "G", "O"],
+        "handwriting_quality": "Excellent",
+        "confidence_score": 0.9,
+        "suggestions": ["Give the descender of the g a fuller loop"],
+        "letters_to_improve": ["G"],
+        "analysis": "Very tidy writing.",
+    },
+    "analysis_percent_confidence.txt": {
+        "handwriting_quality": "Needs Improvement",
+        "confidence_score": 0.65,
+        "suggestions": ["Slow down when writing the letter z", "Use lined paper to keep letters on the baseline"],
+        "letters_to_improve": ["Y", "Z"],
+    },
+    "analysis_truncated.txt": {
+        "detected_letters": ["P", "Q", "R"],
+        "handwriting_quality": "Good",
+        "suggestions": ["Keep the bowl of the P round and closed at the ste"],
+        "letters_to_improve": None,
+        "analysis": None,
+    },
+    "analysis_values_below_headers.txt": {
+        "detected_letters": ["M", "N", "O"],
+        "handwriting_quality": "Excellent",
+        "confidence_score": 0.93,
+        "suggestions": ["Keep up the consistent slant across every word"],
+        "letters_to_improve": ["N"],
+        "analysis": "Neat and consistent writing.",
+    },
+}
+
+PRACTICE_EXPECTED = {
+    "practice_clean.txt": {
+        "sentences": [
+            "Sally sells seashells by the seashore.",
+            "Sam sees six small snails sliding slowly.",
+            "Susan sang softly on Sunday afternoon.",
+            "Seven swans swam swiftly across the stream.",
+            "Stella saw stars sparkle in the sky.",
+        ],
+        "tips": ["Keep the curves of the letter even", "Start each letter at the top", "Practice slowly before speeding up"],
+        "structured": False,
+    },
+    "practice_json.txt": {
+        "sentences": ["Tim took ten tiny turtles to town.", "The tall tree tilted toward the tent."],
+        "tips": ["Cross the t at two-thirds height"],
+        "structured": True,
+    },
+    "practice_no_headers.txt": {"sentences": [], "tips": []},
+    "practice_numbered.txt": {
+        # List numbers and bullets go, "3 busy bees" keeps its digit and the template placeholder is dropped
+        "sentences": [
+            "Bobby bought big blue balloons.",
+            "Betty baked brown bread before breakfast.",
+            "3 busy bees buzzed by the barn.",
+            "Ben's big brother bikes by the beach.",
+        ],
+        "tips": ["Keep the bowl of the b closed", "Make the ascender tall and straight"],
+    },
+}
+
+
+def test_every_recorded_completion_has_expectations():
+    recorded = {os.path.basename(path) for path in glob.glob(os.path.join(CORPUS_DIR, "*.txt"))}
+    assert recorded == set(ANALYSIS_EXPECTED) | set(PRACTICE_EXPECTED)
+
+
+@pytest.mark.parametrize("name", sorted(ANALYSIS_EXPECTED))
+def test_parse_analysis(name):
+    parsed = parse_analysis(completion(name))
+    for field, expected in ANALYSIS_EXPECTED[name].items():
+        assert getattr(parsed, field) == expected, field
+
+
+@pytest.mark.parametrize("name", sorted(PRACTICE_EXPECTED))
+def test_parse_practice(name):
+    parsed = parse_practice(completion(name))
+    for field, expected in PRACTICE_EXPECTED[name].items():
+        assert getattr(parsed, field) == expected, field
+
+
+def test_list_markers_only_strip_markers():
+    parsed = parse_analysis("SUGGESTIONS:\n1. Write slowly and carefully\n2) 10 minutes of practice every day\n- 2nd line stays on the baseline\n")
+    assert parsed.suggestions == [
+        "Write slowly and carefully",
+        "10 minutes of practice every day",
+        "2nd line stays on the baseline",
+    ]
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("0.85", 0.85),
+    ("85%", 0.85),
+    ("85", 0.85),
+    ("1", 1.0),
+    ("150", None),
+    ("high", None),
+])
+def test_confidence(value, expected):
+    assert parse_analysis(f"CONFIDENCE: {value}").confidence_score == expected
+
+
+def test_letters_to_improve_are_trimmed_and_unique():
+    parsed = parse_analysis("LETTERS_TO_IMPROVE: a,  E , 'r', e, th\n")
+    assert parsed.letters_to_improve == ["A", "E", "R"]
+
+
+def test_json_keys_take_lists_or_strings():
+    parsed = parse_analysis('{"quality": "excellent", "confidence": 92, "letters_to_improve": ["b", " d "]}')
+    assert parsed.structured
+    assert parsed.handwriting_quality == "Excellent"
+    assert parsed.confidence_score == 0.92
+    assert parsed.letters_to_improve == ["B", "D"]
@@ -0,0 +1,41 @@
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from app.middleware import CompressionMiddleware
+from app.services.http_cache import etag_matches, not_modified
+
+ETAG = '"page-v1"'
+
+
+def build_app():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, min_bytes=16)
+
+    @app.get("/page")
+    def page(request: Request):
+        if etag_matches(request.headers.get("if-none-match"), ETAG):
+            return not_modified(ETAG)
+        return Response(b"handwriting " * 200, media_type="text/plain", headers={"ETag": ETAG})
+
+    return app
+
+
+def test_not_modified_carries_the_etag_of_the_compressed_representation():
+    with TestClient(build_app()) as client:
+        first = client.get("/page", headers={"Accept-Encoding": "gzip"})
+        assert first.headers["content-encoding"] == "gzip"
+        assert first.headers["etag"] == '"page-v1-gzip"'
+
+        revalidated = client.get(
+            "/page", headers={"Accept-Encoding": "gzip", "If-None-Match": first.headers["etag"]}
+        )
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == first.headers["etag"]
+        assert "Accept-Encoding" in revalidated.headers["vary"]
+
+
+def test_not_modified_without_negotiated_encoding_keeps_the_plain_etag():
+    with TestClient(build_app()) as client:
+        revalidated = client.get("/page", headers={"Accept-Encoding": "identity", "If-None-Match": ETAG})
+        assert revalidated.status_code == 304
+        assert revalidated.headers["etag"] == ETAG
@@ -0,0 +1,69 @@
+import base64
+import io
+
+from PIL import Image
+
+from benchmarks.bench_batch import sample_image
+
+
+def blank_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("L", (400, 300), 255).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_one_bad_image_does_not_fail_the_batch(client):
+    files = [
+        ("images", ("good.png", sample_image("feedback batch"), "image/png")),
+        ("images", ("blank.png", blank_image(), "image/png")),
+        ("images", ("notes.txt", b"not an image", "text/plain")),
+    ]
+    response = client.post("/handwriting/feedback/batch", files=files)
+    assert response.status_code == 200
+    items = response.json()
+    assert [(item["index"], item["filename"], item["status"]) for item in items] == [
+        (0, "good.png", "ok"),
+        (1, "blank.png", "error"),
+        (2, "notes.txt", "error"),
+    ]
+    assert items[0]["feedback"]["measurements"]["line_count"] >= 1
+    assert items[0]["error"] is None
+    assert all(item["feedback"] is None and item["error"] for item in items[1:])
+
+
+def test_feedback_is_measured_from_the_analysed_image(client):
+    analysis = {
+        "detected_letters": ["a", "b", "c", "d", "e", "f", "g", "h", "i", "j", "k"],
+        "handwriting_quality": "Good",
+        "suggestions": [],
+        "confidence_score": 0.9,
+        "analysis": "",
+        "letters_to_improve": ["B"],
+        "image_data": base64.b64encode(sample_image("measured feedback")).decode(),
+    }
+    response = client.post("/handwriting/feedback", json=analysis)
+    assert response.status_code == 200
+    feedback = response.json()
+    assert feedback["measurements"]["glyph_count"] > 0
+    assert feedback["improvement_tips"][0] == "Practice the letters B"
+
+    # Scored from the image, not from how many letters the analysis lists
+    analysis["detected_letters"] = []
+    again = client.post("/handwriting/feedback", json=analysis).json()
+    assert again["overall_score"] == feedback["overall_score"]
+
+
+def test_feedback_rejects_bad_image_data(client):
+    analysis = {
+        "detected_letters": [],
+        "handwriting_quality": "Good",
+        "suggestions": [],
+        "confidence_score": 0.9,
+        "analysis": "",
+        "letters_to_improve": [],
+    }
+    assert client.post("/handwriting/feedback", json=analysis).status_code == 422
+    analysis["image_data"] = "not base64!"
+    assert client.post("/handwriting/feedback", json=analysis).status_code == 400
+    analysis["image_data"] = base64.b64encode(blank_image()).decode()
+    assert client.post("/handwriting/feedback", json=analysis).status_code == 422
@@ -0,0 +1,32 @@
+import json
+
+from app.routes import handwriting
+from app.services.job_queue import QUEUED
+
+
+def test_job_deleted_while_streaming_ends_with_error(client, monkeypatch):
+    job = {
+        "id": "gone",
+        "status": QUEUED,
+        "result": None,
+        "error": None,
+        "attempts": 0,
+        "created_at": 0.0,
+        "started_at": None,
+        "finished_at": None,
+    }
+    # Found when the stream opens, then removed by retention before it finishes
+    lookups = iter([job, None])
+
+    async def no_wait(job_id, timeout):
+        pass
+
+    monkeypatch.setattr(handwriting.job_queue, "get", lambda job_id: next(lookups))
+    monkeypatch.setattr(handwriting.job_queue, "wait_for_change", no_wait)
+
+    response = client.get("/handwriting/jobs/gone/events")
+    assert response.status_code == 200
+    messages = [dict(line.split(": ", 1) for line in message.split("\n")) for message in response.text.strip().split("\n\n")]
+    assert [message["event"] for message in messages] == ["status", "error"]
+    assert json.loads(messages[0]["data"])["status"] == QUEUED
+    assert json.loads(messages[1]["data"]) == {"detail": "Job not found or expired"}
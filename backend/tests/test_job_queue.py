@@ -0,0 +1,73 @@
+import asyncio
+
+from app.services import job_queue as job_queue_module
+from app.services.job_queue import COMPLETED, JobQueue, RUNNING
+
+
+async def wait_for_status(queue: JobQueue, job_id: str, status: str, timeout: float = 5.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while queue.get(job_id)["status"] != status:
+        assert asyncio.get_running_loop().time() < deadline, queue.get(job_id)
+        await asyncio.sleep(0.01)
+
+
+def test_worker_survives_a_failure_to_store_the_outcome(tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    complete = queue.complete
+    failures = []
+
+    def complete_failing_once(job_id, result):
+        if not failures:
+            failures.append(job_id)
+            raise RuntimeError("database is locked")
+        complete(job_id, result)
+
+    monkeypatch.setattr(queue, "complete", complete_failing_once)
+
+    async def handler(image_data):
+        return {"size": len(image_data)}
+
+    async def scenario():
+        await queue.start(handler, workers=1)
+        try:
+            first = queue.submit(b"one")
+            await asyncio.sleep(0.1)
+            second = queue.submit(b"two")
+            await wait_for_status(queue, second["id"], COMPLETED)
+            # The first job's outcome was lost, so it stays running until its lease expires
+            assert failures == [first["id"]]
+            assert queue.get(first["id"])["status"] == RUNNING
+        finally:
+            await queue.stop()
+
+    asyncio.run(scenario())
+
+
+def test_long_job_keeps_its_lease(tmp_path, monkeypatch):
+    monkeypatch.setattr(job_queue_module, "JOB_LEASE_SECONDS", 0.3)
+    path = str(tmp_path / "jobs.db")
+    queue = JobQueue(path)
+    # Another process sharing the queue, looking for jobs whose worker died
+    other = JobQueue(path)
+
+    seen = []
+
+    async def handler(image_data):
+        # Runs three times as long as the lease
+        for _ in range(6):
+            await asyncio.sleep(0.15)
+            other.recover()
+            seen.append(other.get(job["id"])["status"])
+        return {}
+
+    async def scenario():
+        await queue.start(handler, workers=1)
+        try:
+            await wait_for_status(queue, job["id"], COMPLETED)
+        finally:
+            await queue.stop()
+
+    job = queue.submit(b"slow")
+    asyncio.run(scenario())
+    assert seen == [RUNNING] * 6
+    assert queue.get(job["id"])["attempts"] == 1
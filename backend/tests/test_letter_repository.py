@@ -0,0 +1,39 @@
+from app.db import ConnectionPool
+from app.services.repository import LetterRepository, init_schema
+
+
+def letter_count(pool: ConnectionPool) -> int:
+    with pool.connection() as conn:
+        return conn.execute("SELECT total FROM letter_count").fetchone()[0]
+
+
+def test_letter_count_follows_inserts_and_deletes(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "letters.db"), size=1)
+    init_schema(pool)
+    letters = LetterRepository(pool)
+    created = [letters.create(1, f"Note {i}", "Dear Sam, thank you", "Sam", "thank_you", "draft") for i in range(3)]
+    assert letter_count(pool) == 4  # with the demo letter
+
+    # Deleting the newest letter frees its id for reuse, so MAX(id) would undercount from here on
+    with pool.transaction() as conn:
+        conn.execute("DELETE FROM letters WHERE id IN (?, ?)", (created[0]["id"], created[-1]["id"]))
+    letters.create(1, "Note 3", "Dear Sam, thank you again", "Sam", "thank_you", "draft")
+    with pool.connection() as conn:
+        total = conn.execute("SELECT COUNT(*) FROM letters").fetchone()[0]
+    assert letter_count(pool) == total == 3
+    assert {letter["title"] for letter in letters.search(1, "thank")} == {"Thank You Letter", "Note 1", "Note 3"}
+
+
+def test_letter_count_is_seeded_for_existing_databases(tmp_path):
+    path = str(tmp_path / "letters.db")
+    pool = ConnectionPool(path, size=1)
+    init_schema(pool)
+    LetterRepository(pool).create(1, "Note", "Dear Sam", "Sam", "thank_you", "draft")
+    # A database from before the counter existed
+    with pool.connection() as conn:
+        conn.executescript("DROP TRIGGER letter_count_insert; DROP TRIGGER letter_count_delete; DROP TABLE letter_count;")
+    pool.close()
+
+    pool = ConnectionPool(path, size=1)
+    init_schema(pool)
+    assert letter_count(pool) == 2
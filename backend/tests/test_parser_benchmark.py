@@ -0,0 +1,28 @@
+"""
+Parser timings over the recorded completions, with pytest-benchmark:
+
+    pip install pytest-benchmark
+    pytest tests/test_parser_benchmark.py --benchmark-only
+
+Skipped when pytest-benchmark is not installed. benchmarks/bench_parser.py
+also compares against the previous split-based parser.
+"""
+import glob
+import os
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+from app.services.completion_parser import parse_analysis, parse_practice
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks", "completions")
+COMPLETIONS = sorted(glob.glob(os.path.join(CORPUS_DIR, "*.txt")))
+
+
+@pytest.mark.parametrize("path", COMPLETIONS, ids=os.path.basename)
+def test_parse_speed(benchmark, path):
+    with open(path) as f:
+        text = f.read()
+    parse = parse_practice if os.path.basename(path).startswith("practice") else parse_analysis
+    benchmark(parse, text)
@@ -0,0 +1,26 @@
+import pytest
+
+from app.services.practice_corpus import PRACTICE_MAX_SENTENCES
+
+
+@pytest.mark.parametrize("sentence_count", [-1, 0, PRACTICE_MAX_SENTENCES + 1])
+def test_sentence_count_out_of_range_is_rejected(client, sentence_count):
+    response = client.post(
+        "/handwriting/practice-sentences", json={"target_letter": "S", "sentence_count": sentence_count}
+    )
+    assert response.status_code == 422
+
+
+def test_difficulty_is_case_insensitive(client):
+    for difficulty in ["Beginner", "BEGINNER ", "beginner"]:
+        response = client.post(
+            "/handwriting/practice-sentences",
+            json={"target_letter": "s", "difficulty": difficulty, "sentence_count": 3},
+        )
+        assert response.status_code == 200
+        body = response.json()
+        assert body["difficulty"] == "beginner"
+        assert len(body["sentences"]) == 3
+
+    pools = client.get("/handwriting/practice-sentences/stats").json()["pools"]
+    assert [pool for pool in pools if pool.startswith("S/")] == ["S/beginner"]
@@ -0,0 +1,33 @@
+from app.db import ConnectionPool
+from app.services.progress import ProgressStore
+
+
+def analysis(*letters):
+    return {"handwriting_quality": "good", "confidence_score": 0.8, "letters_to_improve": list(letters)}
+
+
+def test_letters_are_counted_case_insensitively(tmp_path):
+    store = ProgressStore(ConnectionPool(str(tmp_path / "progress.db"), size=1))
+    store.record(1, analysis("b", " g"), now=0.0)
+    store.record(1, analysis("B", "b"), now=60.0)
+
+    letters = {letter["letter"]: letter["improve_count"] for letter in store.get(1, now=60.0)["letters"]}
+    assert letters == {"B": 2, "G": 1}
+
+
+def test_mixed_case_letters_from_older_databases_are_merged(tmp_path):
+    pool = ConnectionPool(str(tmp_path / "progress.db"), size=1)
+    store = ProgressStore(pool)
+    store.record(1, analysis("B"), now=0.0)
+    store.record(1, analysis("C"), now=60.0)
+    # As stored before letters were upper-cased
+    with pool.transaction() as conn:
+        conn.execute(
+            "INSERT INTO handwriting_letter_progress VALUES (1, 'b', 3, 0.5, 2, 60.0), (1, 'd', 1, 0.2, 1, 0.0)"
+        )
+
+    letters = {letter["letter"]: letter for letter in ProgressStore(pool).get(1, now=60.0)["letters"]}
+    assert sorted(letters) == ["B", "C", "D"]
+    assert letters["B"]["improve_count"] == 4
+    assert letters["B"]["last_flagged_at"] == 60.0
+    assert letters["D"]["improve_count"] == 1
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.services.rate_limiter import (
+    MemoryBucketStore,
+    RateLimitExceeded,
+    RouteLimits,
+    SQLiteBucketStore,
+    UpstreamLimiter,
+)
+
+LIMITS = {"analyze": RouteLimits(user_requests=10, user_tokens=10000, global_requests=100, global_tokens=100000)}
+
+
+def bucket_levels(limiter: UpstreamLimiter) -> dict:
+    return {key: bucket.tokens for key, bucket in limiter.store._buckets.items()}
+
+
+def assert_refunded(limiter: UpstreamLimiter, before: dict):
+    """Every bucket is back at (or, having refilled meanwhile, above) its level before the call"""
+    for key, tokens in bucket_levels(limiter).items():
+        assert tokens >= before[key], key
+
+
+def test_cancelled_queued_call_is_refunded():
+    async def scenario():
+        limiter = UpstreamLimiter(LIMITS, max_in_flight=1, max_queue=4, max_wait=10, store=MemoryBucketStore(100))
+        held = await limiter.acquire("analyze", 1, 1000)
+        after_one = bucket_levels(limiter)
+
+        queued = asyncio.create_task(limiter.acquire("analyze", 1, 1000))
+        await asyncio.sleep(0.01)
+        assert limiter.waiting == 1
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+        assert limiter.waiting == 0
+        assert_refunded(limiter, after_one)
+        held.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_queue_timeout_is_refunded():
+    async def scenario():
+        limiter = UpstreamLimiter(LIMITS, max_in_flight=1, max_queue=4, max_wait=0.01, store=MemoryBucketStore(100))
+        held = await limiter.acquire("analyze", 1, 1000)
+        after_one = bucket_levels(limiter)
+        with pytest.raises(RateLimitExceeded) as error:
+            await limiter.acquire("analyze", 1, 1000)
+        assert error.value.reason == "queue_timeout"
+        assert_refunded(limiter, after_one)
+        held.release()
+
+    asyncio.run(scenario())
+
+
+def test_sqlite_store_calls_run_off_the_event_loop(tmp_path, monkeypatch):
+    store = SQLiteBucketStore(str(tmp_path / "buckets.db"))
+    loop_thread = threading.get_ident()
+    threads = []
+    take = store.take
+
+    def recording_take(charges):
+        threads.append(threading.get_ident())
+        return take(charges)
+
+    monkeypatch.setattr(store, "take", recording_take)
+
+    async def scenario():
+        limiter = UpstreamLimiter(LIMITS, max_in_flight=1, max_queue=4, max_wait=10, store=store)
+        lease = await limiter.acquire("analyze", 1, 1000)
+        lease.release()
+
+    asyncio.run(scenario())
+    assert threads and loop_thread not in threads
+
+
+
+def running_loop():
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def test_stats_route_counts_sqlite_buckets_off_the_event_loop(client, tmp_path, monkeypatch):
+    from app.services.rate_limiter import upstream_limiter
+
+    store = SQLiteBucketStore(str(tmp_path / "buckets.db"))
+    loops = []
+    size = store.size
+
+    def recording_size():
+        loops.append(running_loop())
+        return size()
+
+    monkeypatch.setattr(store, "size", recording_size)
+    monkeypatch.setattr(upstream_limiter, "store", store)
+    response = client.get("/handwriting/upstream/stats")
+    assert response.status_code == 200
+    assert response.json()["limiter"]["store"] == "sqlite"
+    assert loops == [None]
@@ -0,0 +1,36 @@
+"""
+Fill the local practice sentence pool ahead of time so
+/handwriting/practice-sentences can answer without calling OpenAI.
+
+Usage:
+    python warm_practice_corpus.py
+    python warm_practice_corpus.py --letters ABC --difficulties beginner --concurrency 2
+"""
+import argparse
+import asyncio
+import logging
+from dotenv import load_dotenv
+
+# Settings are read when the app modules are imported
+load_dotenv()
+
+from app.routes.handwriting import request_practice_sentences
+from app.services.practice_corpus import practice_corpus, warm_up, LETTERS, DIFFICULTIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Warm up the practice sentence pool")
+    parser.add_argument("--letters", default=LETTERS, help="Letters to fill, e.g. ABC")
+    parser.add_argument("--difficulties", nargs="+", default=DIFFICULTIES, choices=DIFFICULTIES)
+    parser.add_argument("--concurrency", type=int, default=4, help="Parallel OpenAI calls")
+    args = parser.parse_args()
+    # Progress per pool is logged at INFO
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    letters = [letter for letter in args.letters.upper() if letter in LETTERS]
+    asyncio.run(warm_up(practice_corpus, request_practice_sentences, letters, args.difficulties, args.concurrency))
+    print(practice_corpus.stats())
+
+
+if __name__ == "__main__":
+    main()
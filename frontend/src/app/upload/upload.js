@@ -19,6 +19,7 @@ export default function UploadPage() {
   const [isUploading, setIsUploading] = useState(false);
   const [uploadProgress, setUploadProgress] = useState(0);
   const [analysisResult, setAnalysisResult] = useState(null);
+  const [partialResult, setPartialResult] = useState({});
   const [error, setError] = useState(null);
   const fileInputRef = useRef(null);
 
@@ -86,6 +87,7 @@ export default function UploadPage() {
     setUploadProgress(0);
     setError(null);
     setAnalysisResult(null);
+    setPartialResult({});
 
 
     // Simulate upload progress
@@ -101,8 +103,10 @@ export default function UploadPage() {
 
 
     try {
-      // Call the backend handwriting analysis API using the utility
-      const result = await api.analyzeHandwriting(selectedFile);
+      // Stream the analysis so fields show up as soon as the model produces them
+      const result = await api.analyzeHandwritingStream(selectedFile, (field, value) => {
+        setPartialResult(prev => ({ ...prev, [field]: value }));
+      });
      
       clearInterval(interval);
       setUploadProgress(100);
@@ -374,6 +378,19 @@ export default function UploadPage() {
                       style={{ width: `${uploadProgress}%` }}
                     ></div>
                   </div>
+                  {(partialResult.handwriting_quality || partialResult.detected_letters) && (
+                    <div className="text-sm text-gray-600 space-y-1">
+                      {partialResult.handwriting_quality && (
+                        <p>Quality: <span className="font-medium">{partialResult.handwriting_quality}</span></p>
+                      )}
+                      {partialResult.detected_letters && (
+                        <p>Detected letters: <span className="font-medium">{partialResult.detected_letters.join(', ')}</span></p>
+                      )}
+                      {partialResult.letters_to_improve && (
+                        <p>Letters to improve: <span className="font-medium">{partialResult.letters_to_improve.join(', ')}</span></p>
+                      )}
+                    </div>
+                  )}
                   {uploadProgress === 100 && (
                     <p className="text-green-600 text-center font-medium">
                       Analysis complete!
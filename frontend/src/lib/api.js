@@ -27,6 +27,112 @@ export const api = {
     }
   },
 
+  // Streaming handwriting analysis: onField(name, value) fires as each field is ready
+  async analyzeHandwritingStream(imageFile, onField) {
+    const formData = new FormData();
+    formData.append('image', imageFile);
+
+    try {
+      const response = await fetch(`${API_BASE_URL}/handwriting/analyze/stream`, {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        throw new Error(`API Error: ${response.status} ${response.statusText}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let result = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const messages = buffer.split('\n\n');
+        buffer = messages.pop();
+
+        for (const message of messages) {
+          let event = 'message';
+          let data = '';
+          for (const line of message.split('\n')) {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) data += line.slice(5).trim();
+          }
+          if (!data) continue;
+
+          const payload = JSON.parse(data);
+          if (event === 'error') {
+            throw new Error(payload.detail);
+          }
+          if (event === 'result') {
+            result = payload;
+          } else if (onField) {
+            onField(event, payload.value);
+          }
+        }
+      }
+
+      if (!result) {
+        throw new Error('Analysis stream ended before a result was received');
+      }
+      return result;
+    } catch (error) {
+      if (error.name === 'TypeError' && error.message.includes('Failed to fetch')) {
+        throw new Error(`Network Error: Unable to connect to the analysis service. Please check your internet connection and try again. If the problem persists, the service may be temporarily unavailable.`);
+      }
+      throw error;
+    }
+  },
+
+  // Batch handwriting analysis: results arrive as NDJSON, one line per image
+  async analyzeHandwritingBatch(imageFiles, onResult) {
+    const formData = new FormData();
+    imageFiles.forEach((file) => formData.append('images', file));
+
+    try {
+      const response = await fetch(`${API_BASE_URL}/handwriting/analyze/batch`, {
+        method: 'POST',
+        body: formData,
+      });
+
+      if (!response.ok) {
+        throw new Error(`API Error: ${response.status} ${response.statusText}`);
+      }
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      const results = [];
+      let buffer = '';
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop();
+
+        for (const line of lines) {
+          if (!line.trim()) continue;
+          const item = JSON.parse(line);
+          results.push(item);
+          if (onResult) onResult(item);
+        }
+      }
+
+      return results.sort((a, b) => a.index - b.index);
+    } catch (error) {
+      if (error.name === 'TypeError' && error.message.includes('Failed to fetch')) {
+        throw new Error(`Network Error: Unable to connect to the analysis service. Please check your internet connection and try again. If the problem persists, the service may be temporarily unavailable.`);
+      }
+      throw error;
+    }
+  },
+
   // Get demo analysis
   async getDemoAnalysis() {
     try {
@@ -45,6 +151,24 @@ export const api = {
     }
   },
 
+  // Get a user's handwriting progress (counts, rolling averages, streaks, letters to improve)
+  async getProgress(userId = 1) {
+    try {
+      const response = await fetch(`${API_BASE_URL}/handwriting/progress?user_id=${encodeURIComponent(userId)}`);
+      
+      if (!response.ok) {
+        throw new Error(`API Error: ${response.status} ${response.statusText}`);
+      }
+
+      return response.json();
+    } catch (error) {
+      if (error.name === 'TypeError' && error.message.includes('Failed to fetch')) {
+        throw new Error(`Network Error: Unable to connect to the analysis service.`);
+      }
+      throw error;
+    }
+  },
+
   // Health check
   async healthCheck() {
     try {